@@ -89,6 +89,48 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Recipe listing pagination: 'page' (numbered pages) or 'cursor' (keyset, no COUNT/OFFSET)
+RECIPE_PAGINATION = config('RECIPE_PAGINATION', default='page')
+
+# Any Django cache backend works; file-based shares the cache between worker
+# processes without an external service:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/recipes-cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='recipes'),
+    }
+}
+
+# Seconds anonymous recipe_list/dashboard pages stay cached (0 disables); every
+# catalog write also invalidates them immediately
+RECIPE_RESPONSE_CACHE_TIMEOUT = config('RECIPE_RESPONSE_CACHE_TIMEOUT', default=60, cast=int)
+
+# Recipe view counting: 'exact' writes every view immediately, 'buffered'
+# batches them per process and flushes every N views / seconds and on exit
+RECIPE_VIEW_COUNT_MODE = config('RECIPE_VIEW_COUNT_MODE', default='buffered')
+RECIPE_VIEW_COUNT_FLUSH_THRESHOLD = config('RECIPE_VIEW_COUNT_FLUSH_THRESHOLD', default=100, cast=int)
+RECIPE_VIEW_COUNT_FLUSH_INTERVAL = config('RECIPE_VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=int)
+
+# Trending: a view loses half its weight every N hours; hourly view buckets
+# are kept this many days after being folded into the scores
+RECIPE_TRENDING_HALF_LIFE_HOURS = config('RECIPE_TRENDING_HALF_LIFE_HOURS', default=24, cast=float)
+RECIPE_TRENDING_RETENTION_DAYS = config('RECIPE_TRENDING_RETENTION_DAYS', default=7, cast=int)
+
+# PDF exports: rendered files are cached on disk; per process at most N
+# renders run at once (others wait up to N seconds, then get a 503) and
+# cookbooks render in worker processes, N of them kept idle for reuse
+# (0 renders in-process)
+RECIPE_PDF_CACHE_DIR = config('RECIPE_PDF_CACHE_DIR', default=str(BASE_DIR / 'pdf_cache'))
+RECIPE_PDF_MAX_CONCURRENT = config('RECIPE_PDF_MAX_CONCURRENT', default=2, cast=int)
+RECIPE_PDF_WAIT_SECONDS = config('RECIPE_PDF_WAIT_SECONDS', default=10, cast=float)
+RECIPE_PDF_WORKERS = config('RECIPE_PDF_WORKERS', default=2, cast=int)
+RECIPE_PDF_TIMEOUT = config('RECIPE_PDF_TIMEOUT', default=120, cast=float)
+
+# Image renditions are generated after upload by this many background
+# threads per process (0 generates them inline, after commit)
+RECIPE_RENDITION_WORKERS = config('RECIPE_RENDITION_WORKERS', default=2, cast=int)
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
@@ -1,10 +1,12 @@
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from recipes import media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('recipes.urls')),
@@ -24,5 +26,6 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Like static(), but content-hashed media is marked immutable
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), media.serve)]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import Category, Recipe, Ingredient, Instruction, Review, UserProfile
+from .models import Category, Recipe, RecipeTag, Ingredient, Instruction, Review, Tag, UserProfile
 
 class IngredientInline(admin.TabularInline):
     model = Ingredient
@@ -10,18 +10,38 @@ class InstructionInline(admin.TabularInline):
     model = Instruction
     extra = 1
 
+class RecipeTagInline(admin.TabularInline):
+    model = RecipeTag
+    extra = 1
+    autocomplete_fields = ['tag']
+
+class CounterFieldsAdmin(admin.ModelAdmin):
+    """Show the denormalized counters read-only and never write them back on change."""
+
+    def get_readonly_fields(self, request, obj=None):
+        return [*super().get_readonly_fields(request, obj), *self.model.counter_fields]
+
+    def save_model(self, request, obj, form, change):
+        obj.save(update_fields=obj.fields_without_counters() if change else None)
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug']
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(CounterFieldsAdmin):
     list_display = ['title', 'author', 'category', 'difficulty', 'created_at']
     list_filter = ['difficulty', 'category', 'created_at']
     search_fields = ['title', 'description']
     prepopulated_fields = {'slug': ('title',)}
-    inlines = [IngredientInline, InstructionInline]
+    inlines = [IngredientInline, InstructionInline, RecipeTagInline]
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -29,6 +49,6 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'created_at']
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(CounterFieldsAdmin):
     list_display = ['user', 'created_at']
     filter_horizontal = ['favorite_recipes']
@@ -0,0 +1,100 @@
+"""Conditional GET (ETag / Last-Modified) for the public recipe pages.
+
+Anonymous responses carry validators computed from one cheap metadata
+query, so a revalidation that matches gets a 304 without running the view:
+
+* catalog-wide pages (recipe_list, dashboard) use the CatalogVersion row,
+  which is bumped after every committed catalog write;
+* recipe_detail uses the recipe's ``updated_at`` and ``rating_count`` plus
+  the latest review ``updated_at``.
+
+Anonymous pages are sent ``Cache-Control: public, no-cache`` so browsers and
+proxies store them but always revalidate. Pages for signed-in users, or
+pages that show a flash message, are personalized: they carry no
+validators and are marked ``private, no-cache``. Every response varies on
+Cookie, because that is what decides between the two.
+"""
+import functools
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def _personalized(request):
+    return request.user.is_authenticated or bool(len(messages.get_messages(request)))
+
+
+def _memoized(metadata):
+    """Run ``metadata`` once per request; condition() asks for the ETag and Last-Modified separately."""
+    @functools.wraps(metadata)
+    def wrapper(request, *args, **kwargs):
+        if not hasattr(request, '_page_metadata'):
+            request._page_metadata = metadata(request, *args, **kwargs)
+        return request._page_metadata
+    return wrapper
+
+
+def _etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+@_memoized
+def catalog_metadata(request, *args, **kwargs):
+    from .models import CatalogVersion
+
+    version = CatalogVersion.current()
+    # The response cache keys the page body on the same read (see response_cache)
+    request._catalog_version = version.version
+    return _etag('catalog', version.version, version.updated_at.isoformat()), version.updated_at
+
+
+@_memoized
+def recipe_metadata(request, slug):
+    from .models import Recipe
+
+    row = (
+        Recipe.objects.filter(slug=slug)
+        .values('pk', 'updated_at', 'rating_count', 'favorite_count',
+                'author__username', 'author__first_name', 'author__last_name')
+        .annotate(last_review=Max('reviews__updated_at'))
+        .first()
+    )
+    if row is None:
+        return None, None
+    request.recipe_pk = row['pk']
+    last_modified = max(filter(None, [row['updated_at'], row['last_review']]))
+    # The page shows the author's name, which can change without touching the recipe
+    return _etag('recipe', row['pk'], row['updated_at'].isoformat(), row['rating_count'], row['favorite_count'],
+                 row['last_review'], row['author__username'], row['author__first_name'],
+                 row['author__last_name']), last_modified
+
+
+def conditional_page(metadata, on_not_modified=None):
+    """Serve anonymous GETs of the view conditionally, validated by ``metadata``.
+
+    ``metadata(request, *args, **kwargs)`` returns ``(etag, last_modified)``.
+    ``on_not_modified(request)`` runs when a 304 is returned instead of the view.
+    """
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: metadata(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: metadata(request, *args, **kwargs)[1],
+        )(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _personalized(request):
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                response = conditional_view(request, *args, **kwargs)
+                if response.status_code == 304 and on_not_modified is not None:
+                    on_not_modified(request)
+                patch_cache_control(response, public=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
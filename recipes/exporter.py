@@ -0,0 +1,118 @@
+"""Streaming catalog export as JSON Lines or CSV.
+
+Recipes are read in id order with ``.iterator(chunk_size=...)``. Postgres
+uses a server-side cursor for this, and SQLite fetches rows in chunks. The
+ingredients, instructions and tags of each chunk are fetched with one
+prefetch query per relation. Output is produced a line at a time, so memory
+depends on the chunk size, not on how big the catalog is.
+
+Records use the field names ``importer`` reads, so an export can be loaded
+back with ``import_recipes``. The extra fields are ignored on import.
+"""
+import csv
+import json
+from datetime import datetime, time
+
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Ingredient, Instruction, Recipe, Review
+
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+DEFAULT_CHUNK_SIZE = 500
+
+CSV_FIELDS = [
+    'id', 'slug', 'title', 'description', 'author', 'category', 'prep_time', 'cook_time', 'total_time',
+    'servings', 'difficulty', 'dietary_restriction', 'tags', 'ingredients', 'instructions',
+    'rating_avg', 'rating_count', 'view_count', 'created_at', 'updated_at',
+]
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime; naive values are in the current time zone. Raises ValueError."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'"{value}" is not an ISO date or datetime')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def changed_recipes(since=None):
+    """Recipes in id order; with ``since``, only those whose content or reviews changed at or after it."""
+    recipes = Recipe.objects.select_related('author', 'category').order_by('pk')
+    if since is not None:
+        recent_reviews = Review.objects.filter(recipe=OuterRef('pk'), updated_at__gte=since)
+        recipes = recipes.filter(Q(updated_at__gte=since) | Exists(recent_reviews))
+    return recipes.prefetch_related(
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('order', 'pk').only('recipe_id', 'quantity', 'name')),
+        Prefetch('instructions', queryset=Instruction.objects.order_by('step_number').only('recipe_id', 'description')),
+        'tags',
+    )
+
+
+def record(recipe):
+    """A recipe from ``changed_recipes()`` as a plain dict."""
+    return {
+        'id': recipe.pk,
+        'slug': recipe.slug,
+        'title': recipe.title,
+        'description': recipe.description,
+        'author': recipe.author.username,
+        'category': recipe.category.slug if recipe.category else None,
+        'prep_time': recipe.prep_time,
+        'cook_time': recipe.cook_time,
+        'total_time': recipe.total_time,
+        'servings': recipe.servings,
+        'difficulty': recipe.difficulty,
+        'dietary_restriction': recipe.dietary_restriction,
+        'tags': [tag.name for tag in recipe.tags.all()],
+        'ingredients': [{'quantity': i.quantity, 'name': i.name} for i in recipe.ingredients.all()],
+        'instructions': [step.description for step in recipe.instructions.all()],
+        'rating_avg': recipe.rating_avg,
+        'rating_count': recipe.rating_count,
+        'view_count': recipe.view_count,
+        'created_at': recipe.created_at.isoformat(),
+        'updated_at': recipe.updated_at.isoformat(),
+    }
+
+
+def records(since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one plain dict per recipe."""
+    for recipe in changed_recipes(since).iterator(chunk_size=chunk_size):
+        yield record(recipe)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=CSV_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow({
+            **row,
+            'tags': ', '.join(row['tags']),
+            'ingredients': '\n'.join(f"{i['quantity']} | {i['name']}" for i in row['ingredients']),
+            'instructions': '\n'.join(row['instructions']),
+        })
+
+
+def export_lines(fmt, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """The export as an iterator of text lines in ``fmt`` ('jsonl' or 'csv')."""
+    rows = records(since, chunk_size)
+    return csv_lines(rows) if fmt == 'csv' else jsonl_lines(rows)
@@ -0,0 +1,189 @@
+"""Facet counts for the recipe_list filter sidebar.
+
+All facets are counted from a single grouped query: recipes are grouped by
+(category, difficulty, dietary, prep-time bucket, total-time bucket, rating
+bucket), and each facet's counts are summed in Python over the groups that
+match every *other* selected filter. That way an option's count is exactly
+what the user would get by picking it, and no option leads to an empty page.
+
+The grouped rows only depend on the search query and tag filter (plus any
+time/rating value that is not one of the preset options, which is applied in
+SQL and so also narrows its own facet), so they are cached under that
+normalized signature and the catalog generation (the ``CatalogVersion`` row,
+see ``response_cache``), so any Recipe/Review/Category/tag write, made by any
+process, invalidates them.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from . import search
+from .models import Recipe
+from .response_cache import catalog_version
+
+FACET_CACHE_TIMEOUT = 300
+
+PREP_TIME_OPTIONS = [
+    (15, 'Up to 15 min'),
+    (30, 'Up to 30 min'),
+    (60, 'Up to 1 hour'),
+    (120, 'Up to 2 hours'),
+]
+TOTAL_TIME_OPTIONS = [
+    (30, 'Up to 30 min'),
+    (60, 'Up to 1 hour'),
+    (90, 'Up to 1.5 hours'),
+    (120, 'Up to 2 hours'),
+]
+RATING_OPTIONS = [
+    (3, '3+ Stars'),
+    (4, '4+ Stars'),
+    (5, '5 Stars'),
+]
+
+
+def _prep_time_filter(limit):
+    return {'prep_time__lte': limit}
+
+
+def _total_time_filter(limit):
+    return {'total_time__lte': limit}
+
+
+def _rating_filter(minimum):
+    return {'rating_avg__gte': minimum, 'rating_count__gt': 0}
+
+
+def _bucket(options, make_filter, ascending=True):
+    """Map each row to the tightest preset option it satisfies (or 0 for none)."""
+    thresholds = [value for value, _ in options]
+    if not ascending:
+        thresholds.reverse()
+    return Case(
+        *[When(then=Value(value), **make_filter(value)) for value in thresholds],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _grouped_rows(request, query, extra_filters):
+    signature = json.dumps({'q': ' '.join(query.lower().split()), **extra_filters}, sort_keys=True)
+    key = f'recipes:facets:{catalog_version(request)}:{hashlib.sha1(signature.encode()).hexdigest()}'
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    recipes = Recipe.objects.all()
+    if query:
+        recipes = recipes.filter(search.matching(query))
+    if 'tags' in extra_filters:
+        recipes = recipes.with_tags(extra_filters['tags'], match_all=extra_filters['tag_mode'] == 'all')
+    if 'prep_time' in extra_filters:
+        recipes = recipes.filter(**_prep_time_filter(extra_filters['prep_time']))
+    if 'total_time' in extra_filters:
+        recipes = recipes.filter(**_total_time_filter(extra_filters['total_time']))
+    if 'rating' in extra_filters:
+        recipes = recipes.filter(**_rating_filter(extra_filters['rating']))
+
+    rows = list(
+        recipes.order_by()
+        .annotate(
+            prep_bucket=_bucket(PREP_TIME_OPTIONS, _prep_time_filter),
+            total_bucket=_bucket(TOTAL_TIME_OPTIONS, _total_time_filter),
+            rating_bucket=_bucket(RATING_OPTIONS, _rating_filter, ascending=False),
+        )
+        .values_list('category_id', 'difficulty', 'dietary_restriction',
+                     'prep_bucket', 'total_bucket', 'rating_bucket')
+        .annotate(n=Count('pk'))
+    )
+    cache.set(key, rows, FACET_CACHE_TIMEOUT)
+    return rows
+
+
+def facet_counts(request, categories, query='', tag_ids=None, tag_mode='any', category=None,
+                 difficulty='', dietary='', prep_time=None, total_time=None, rating=None):
+    """Return ``{facet: [{'value', 'label', 'count', 'selected'}, ...]}`` for the sidebar.
+
+    ``tag_ids`` are the selected tags (matched per ``tag_mode``), ``category``
+    is the selected Category instance (or None); the time and rating
+    arguments are the selected integer limits (or None).
+    """
+    presets = {
+        'prep_time': [value for value, _ in PREP_TIME_OPTIONS],
+        'total_time': [value for value, _ in TOTAL_TIME_OPTIONS],
+        'rating': [value for value, _ in RATING_OPTIONS],
+    }
+    selected = {'prep_time': prep_time, 'total_time': total_time, 'rating': rating}
+    # Off-preset values can't be answered from the buckets; filter them in SQL
+    extra_filters = {
+        name: value for name, value in selected.items()
+        if value is not None and value not in presets[name]
+    }
+    if tag_ids is not None:
+        extra_filters['tags'] = sorted(tag_ids)
+        extra_filters['tag_mode'] = tag_mode
+    rows = _grouped_rows(request, query, extra_filters)
+
+    def within(bucket, limit, ascending=True):
+        return bucket != 0 and (bucket <= limit if ascending else bucket >= limit)
+
+    tests = {
+        'category': lambda row: category is None or row[0] == category.pk,
+        'difficulty': lambda row: not difficulty or row[1] == difficulty,
+        'dietary': lambda row: not dietary or row[2] == dietary,
+        'prep_time': lambda row: prep_time not in presets['prep_time'] or within(row[3], prep_time),
+        'total_time': lambda row: total_time not in presets['total_time'] or within(row[4], total_time),
+        'rating': lambda row: rating not in presets['rating'] or within(row[5], rating, ascending=False),
+    }
+
+    def rows_for(facet):
+        others = [test for name, test in tests.items() if name != facet]
+        return [row for row in rows if all(test(row) for test in others)]
+
+    def tally(facet, index):
+        totals = {}
+        for row in rows_for(facet):
+            totals[row[index]] = totals.get(row[index], 0) + row[6]
+        return totals
+
+    def cumulative(totals, value, ascending=True):
+        return sum(n for bucket, n in totals.items() if within(bucket, value, ascending))
+
+    def option(value, label, count, selected):
+        return {'value': value, 'label': label, 'count': count, 'selected': selected}
+
+    by_category = tally('category', 0)
+    by_difficulty = tally('difficulty', 1)
+    by_dietary = tally('dietary', 2)
+    by_prep = tally('prep_time', 3)
+    by_total = tally('total_time', 4)
+    by_rating = tally('rating', 5)
+
+    return {
+        'category': [
+            option(cat.slug, cat.name, by_category.get(cat.pk, 0), category is not None and cat.pk == category.pk)
+            for cat in categories
+        ],
+        'difficulty': [
+            option(value, label, by_difficulty.get(value, 0), value == difficulty)
+            for value, label in Recipe.DIFFICULTY_CHOICES
+        ],
+        'dietary': [
+            option(value, label, by_dietary.get(value, 0), value == dietary)
+            for value, label in Recipe.DIETARY_CHOICES if value != 'none'
+        ],
+        'prep_time': [
+            option(str(value), label, cumulative(by_prep, value), value == prep_time)
+            for value, label in PREP_TIME_OPTIONS
+        ],
+        'total_time': [
+            option(str(value), label, cumulative(by_total, value), value == total_time)
+            for value, label in TOTAL_TIME_OPTIONS
+        ],
+        'rating': [
+            option(str(value), label, cumulative(by_rating, value, ascending=False), value == rating)
+            for value, label in RATING_OPTIONS
+        ],
+    }
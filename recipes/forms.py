@@ -1,7 +1,9 @@
 
-from .models import Recipe, Ingredient, Instruction, UserProfile, Category
+from .models import Recipe, Ingredient, Instruction, UserProfile, Category, recipe_content_changed
 from django import forms
-from django.forms import inlineformset_factory
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 
@@ -14,6 +16,14 @@ class RecipeForm(forms.ModelForm):
         }),
         required=True
     )
+    tags = forms.CharField(
+        required=False,
+        help_text="Comma-separated tags",
+        widget=forms.TextInput(attrs={
+            'class': 'form-input',
+            'placeholder': 'e.g., quick, vegetarian, comfort food'
+        }),
+    )
     
     class Meta:
         model = Recipe
@@ -50,6 +60,16 @@ class RecipeForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and 'tags' not in self.initial:
+            self.initial['tags'] = ', '.join(self.instance.tags.values_list('name', flat=True))
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        from .tags import set_recipe_tags
+        set_recipe_tags(self.instance, self.cleaned_data.get('tags', ''))
+
 class IngredientForm(forms.ModelForm):
     class Meta:
         model = Ingredient
@@ -86,10 +106,114 @@ class InstructionForm(forms.ModelForm):
         }
 
 # Formsets for ingredients and instructions
+class LoadedRowField(forms.ModelChoiceField):
+    """Row id field that resolves against the formset's already-loaded rows.
+
+    The stock field runs one ``queryset.get()`` per submitted row.
+    """
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.formset._existing_object(self.formset.model._meta.pk.to_python(value))
+        except ValidationError:
+            obj = None
+        if obj is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return obj
+
+
+class BulkInlineFormSet(BaseInlineFormSet):
+    """Inline formset that writes its rows in at most three statements instead of one per row.
+
+    Submitted rows are diffed against the existing ones: untouched rows are
+    skipped, edited rows go into one bulk_update of just the changed fields,
+    new rows into one bulk_create and deleted rows into one DELETE, all in
+    one transaction. None of these send model signals, so subclasses do the
+    receivers' work once in ``after_bulk_save``.
+    """
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields[name]
+        form.fields[name] = LoadedRowField(self, field.queryset, initial=field.initial, required=False,
+                                           widget=field.widget)
+
+    def before_bulk_save(self, objects):
+        """Fill in what pre_save receivers would have set on new and changed rows."""
+
+    def after_bulk_save(self):
+        recipe_content_changed(self.instance.pk)
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+
+        self.new_objects, self.changed_objects, self.deleted_objects = [], [], []
+        fields = set()
+        for form in self.initial_forms:
+            if form.instance.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                self.deleted_objects.append(form.instance)
+            elif form.has_changed():
+                self.changed_objects.append((form.save(commit=False), form.changed_data))
+                fields.update(form.changed_data)
+        for form in self.extra_forms:
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form)):
+                obj = form.save(commit=False)
+                setattr(obj, self.fk.name, self.instance)
+                self.new_objects.append(obj)
+
+        changed = [obj for obj, _ in self.changed_objects]
+        if not (self.new_objects or changed or self.deleted_objects):
+            return []
+        self.before_bulk_save(self.new_objects + changed)
+        fields |= self.extra_update_fields(fields)
+        fields = [f.name for f in self.model._meta.concrete_fields if f.name in fields]
+        with transaction.atomic():
+            if self.deleted_objects:
+                # One DELETE without the collector: nothing references these rows,
+                # and the per-row delete receivers' work is done by after_bulk_save
+                deleted = self.model.objects.filter(**{self.fk.name: self.instance},
+                                                    pk__in=[obj.pk for obj in self.deleted_objects])
+                deleted._raw_delete(deleted.db)
+            if changed and fields:
+                self.model.objects.bulk_update(changed, fields)
+            self.model.objects.bulk_create(self.new_objects)
+            self.after_bulk_save()
+        return self.new_objects + changed
+
+    def extra_update_fields(self, changed_fields):
+        """Fields ``before_bulk_save`` sets that bulk_update must also write."""
+        return set()
+
+
+class IngredientBulkFormSet(BulkInlineFormSet):
+    def before_bulk_save(self, objects):
+        from . import pantry
+        terms = pantry.terms_for({obj.name for obj in objects})
+        for obj in objects:
+            obj.term_id = terms[obj.name]
+
+    def extra_update_fields(self, changed_fields):
+        return {'term'} if 'name' in changed_fields else set()
+
+    def after_bulk_save(self):
+        recipe_content_changed(self.instance.pk, ingredients=True)
+
+
 IngredientFormSet = inlineformset_factory(
     Recipe, 
     Ingredient,
     form=IngredientForm,
+    formset=IngredientBulkFormSet,
     extra=5,
     can_delete=True
 )
@@ -98,6 +222,7 @@ InstructionFormSet = inlineformset_factory(
     Recipe,
     Instruction,
     form=InstructionForm,
+    formset=BulkInlineFormSet,
     extra=5,
     can_delete=True
 )
@@ -163,7 +288,8 @@ class UserProfileForm(forms.ModelForm):
                 self.user.save()
 
         if commit:
-            profile.save()
+            # The follower counters move through F() updates; don't write back the form's copy
+            profile.save(update_fields=None if profile._state.adding else profile.fields_without_counters())
             # handle many-to-many if any in future
             try:
                 self.save_m2m()
@@ -0,0 +1,337 @@
+"""Streaming bulk import of recipes from JSON Lines or CSV.
+
+Rows flow through a chain of generators, so memory stays flat however large
+the input is::
+
+    read_rows -> skip already-imported rows -> batched -> parse/validate -> write_batch
+
+A JSON Lines row looks like::
+
+    {"title": "Pancakes", "description": "...", "author": "chef",
+     "category": "breakfast", "prep_time": 10, "cook_time": 15, "servings": 4,
+     "difficulty": "easy", "dietary_restriction": "vegetarian",
+     "tags": ["quick", "sweet"],
+     "ingredients": [{"quantity": "200 g", "name": "flour"}, "2 | eggs"],
+     "instructions": ["Whisk everything.", "Fry in a hot pan."]}
+
+CSV files use the same column names. There ``tags`` is comma separated, and
+``ingredients`` and ``instructions`` hold one entry per line. An ingredient
+written as text separates its quantity from its name with ``|``.
+
+Every batch is written with bulk_create in one transaction. bulk_create
+sends no model signals, so ``write_batch`` does the receivers' work itself,
+once per batch: ingredient terms, the search index, the pantry change feed,
+followers' timelines, the tag cloud and the catalog caches.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from . import pantry, search, tags, timeline
+from .models import Category, Ingredient, Instruction, Recipe, RecipeTag
+from .response_cache import bump_catalog_version
+
+FORMATS = ('jsonl', 'csv')
+DEFAULT_BATCH_SIZE = 500
+# Leave room in the 50-character SlugField for a "-<n>" suffix
+SLUG_BASE_LENGTH = 40
+# Slug prefixes per lookup query; long OR chains hit SQLite's expression depth limit
+SLUG_QUERY_CHUNK = 100
+
+_DIFFICULTIES = {value for value, _ in Recipe.DIFFICULTY_CHOICES}
+_DIETS = {value for value, _ in Recipe.DIETARY_CHOICES}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+def format_for(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(stream, fmt):
+    """Yield ``(position, raw)`` for each row; positions count from 1 and are what checkpoints store.
+
+    JSON Lines rows are yielded as unparsed text so a bad line only fails that row.
+    """
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=1)
+    else:
+        for position, line in enumerate(stream, start=1):
+            if line.strip():
+                yield position, line
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _lines(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.splitlines()
+    return [item for item in value if not isinstance(item, str) or item.strip()]
+
+
+def _int(row, field, default=None, minimum=0):
+    value = row.get(field)
+    if value in (None, ''):
+        if default is None:
+            raise RowError(f'{field} is required')
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be a whole number') from None
+    if number < minimum:
+        raise RowError(f'{field} must be at least {minimum}')
+    return number
+
+
+def _text(row, field, max_length=None):
+    value = str(row.get(field) or '').strip()
+    if not value:
+        raise RowError(f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def _ingredient(item):
+    if isinstance(item, dict):
+        quantity, name = str(item.get('quantity') or '').strip(), str(item.get('name') or '').strip()
+    else:
+        quantity, _, name = str(item).rpartition('|')
+        quantity, name = quantity.strip(), name.strip()
+    if not name:
+        raise RowError('every ingredient needs a name')
+    if len(name) > 200 or len(quantity) > 50:
+        raise RowError(f'ingredient "{name[:40]}" is too long')
+    return quantity, name
+
+
+class Lookups:
+    """Author and category ids by name, fetched a batch at a time and remembered for the run."""
+
+    def __init__(self, default_author=None, create_categories=False, dry_run=False):
+        self.default_author = default_author
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.authors = {}
+        self.categories = {}
+
+    def author_name(self, row):
+        return str(row.get('author') or self.default_author or '').strip()
+
+    def load(self, rows):
+        usernames = {self.author_name(row) for row in rows} - set(self.authors) - {''}
+        if usernames:
+            self.authors.update(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+
+        names = {}
+        for row in rows:
+            name = str(row.get('category') or '').strip()
+            if slugify(name) and slugify(name) not in self.categories:
+                names[slugify(name)] = name
+        if not names:
+            return
+        self.categories.update(Category.objects.filter(slug__in=names).values_list('slug', 'pk'))
+        missing = [slug for slug in names if slug not in self.categories]
+        if missing and self.create_categories:
+            if self.dry_run:
+                # Validated as if they existed; nothing is written
+                self.categories.update(dict.fromkeys(missing))
+            else:
+                Category.objects.bulk_create(
+                    [Category(name=names[slug][:100], slug=slug) for slug in missing], ignore_conflicts=True,
+                )
+                self.categories.update(Category.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+
+
+def parse(raw):
+    """The row as a dict; JSON Lines rows are decoded here."""
+    if isinstance(raw, dict):
+        return raw
+    try:
+        row = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise RowError(f'invalid JSON: {exc.msg}') from None
+    if not isinstance(row, dict):
+        raise RowError('expected a JSON object')
+    return row
+
+
+def validate(row, lookups):
+    """Turn one parsed row into the values ``write_batch`` needs, or raise RowError."""
+    title = _text(row, 'title', max_length=200)
+    slug = slugify(row.get('slug') or title)[:SLUG_BASE_LENGTH].strip('-')
+    if not slug:
+        raise RowError('title does not produce a usable slug')
+
+    username = lookups.author_name(row)
+    if username not in lookups.authors:
+        raise RowError(f'unknown author "{username}"' if username else 'author is required')
+
+    category_id = None
+    category = str(row.get('category') or '').strip()
+    if category:
+        if slugify(category) not in lookups.categories:
+            raise RowError(f'unknown category "{category}"')
+        category_id = lookups.categories[slugify(category)]
+
+    difficulty = str(row.get('difficulty') or '').strip().lower()
+    if difficulty not in _DIFFICULTIES:
+        raise RowError(f'difficulty must be one of {", ".join(sorted(_DIFFICULTIES))}')
+    diet = str(row.get('dietary_restriction') or 'none').strip().lower()
+    if diet not in _DIETS:
+        raise RowError(f'dietary_restriction must be one of {", ".join(sorted(_DIETS))}')
+
+    tag_names = row.get('tags') or ''
+    if not isinstance(tag_names, str):
+        tag_names = ','.join(str(name) for name in tag_names)
+
+    ingredients = [_ingredient(item) for item in _lines(row.get('ingredients'))]
+    instructions = [str(step).strip() for step in _lines(row.get('instructions'))]
+    if not ingredients:
+        raise RowError('at least one ingredient is required')
+    if not instructions:
+        raise RowError('at least one instruction is required')
+
+    return {
+        'slug': slug,
+        'recipe': {
+            'title': title,
+            'description': _text(row, 'description'),
+            'author_id': lookups.authors[username],
+            'category_id': category_id,
+            'prep_time': _int(row, 'prep_time'),
+            'cook_time': _int(row, 'cook_time'),
+            'servings': _int(row, 'servings', default=4, minimum=1),
+            'difficulty': difficulty,
+            'dietary_restriction': diet,
+        },
+        'tags': tags.parse_tags(tag_names),
+        'ingredients': ingredients,
+        'instructions': instructions,
+    }
+
+
+class SlugAllocator:
+    """Hands out unique recipe slugs the way ``add_recipe`` does (base, base-1, base-2, ...).
+
+    Taken slugs are read once per base with one query per chunk of bases, and
+    the next free suffix is remembered, so a thousand "pancakes" rows cost one
+    query instead of a thousand ``exists()`` checks.
+    """
+
+    def __init__(self):
+        self.taken = set()
+        self.loaded = set()
+        self.next_suffix = {}
+
+    def _load(self, bases):
+        bases = sorted(set(bases) - self.loaded)
+        for start in range(0, len(bases), SLUG_QUERY_CHUNK):
+            condition = Q()
+            for base in bases[start:start + SLUG_QUERY_CHUNK]:
+                condition |= Q(slug=base) | Q(slug__startswith=f'{base}-')
+            self.taken.update(Recipe.objects.filter(condition).values_list('slug', flat=True))
+        self.loaded.update(bases)
+
+    def allocate(self, bases):
+        self._load(bases)
+        slugs = []
+        for base in bases:
+            slug, suffix = base, self.next_suffix.get(base, 1)
+            if slug in self.taken:
+                while f'{base}-{suffix}' in self.taken:
+                    suffix += 1
+                slug = f'{base}-{suffix}'
+                self.next_suffix[base] = suffix + 1
+            self.taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    def forget(self, bases):
+        """Re-read these bases from the database next time (after losing a race for a slug)."""
+        self.loaded.difference_update(bases)
+        for base in bases:
+            self.next_suffix.pop(base, None)
+
+
+def write_batch(rows, slugs):
+    """Insert validated rows and everything hanging off them. Returns the new recipes."""
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(slug=slug, **row['recipe']) for row, slug in zip(rows, slugs)]
+        )
+        terms = pantry.terms_for({name for row in rows for _, name in row['ingredients']})
+        Ingredient.objects.bulk_create([
+            Ingredient(recipe=recipe, quantity=quantity, name=name, order=order, term_id=terms[name])
+            for recipe, row in zip(recipes, rows)
+            for order, (quantity, name) in enumerate(row['ingredients'])
+        ])
+        Instruction.objects.bulk_create([
+            Instruction(recipe=recipe, step_number=number, description=description)
+            for recipe, row in zip(recipes, rows)
+            for number, description in enumerate(row['instructions'], start=1)
+        ])
+        tag_names = {name for row in rows for name in row['tags']}
+        tag_ids = {tag.slug: tag.pk for tag in tags.get_or_create_tags(tag_names)}
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag_id=tag_ids[slugify(name)])
+            for recipe, row in zip(recipes, rows)
+            for name in row['tags'] if slugify(name) in tag_ids
+        ], ignore_conflicts=True)
+
+        recipe_ids = [recipe.pk for recipe in recipes]
+        search.index_recipes(recipe_ids)
+        pantry.recipes_changed(recipe_ids)
+        timeline.fan_out_many(recipes)
+        transaction.on_commit(bump_catalog_version)
+    return recipes
+
+
+def import_rows(rows, lookups, batch_size=DEFAULT_BATCH_SIZE, start_after=0, dry_run=False):
+    """Validate and (unless ``dry_run``) write ``(position, raw)`` rows a batch at a time.
+
+    Rows at or before ``start_after`` are skipped. After each batch yields
+    ``{'position', 'rows', 'imported', 'errors'}``, where ``errors`` is a
+    list of ``(position, message)``. A batch is committed before it is
+    yielded, so ``position`` is safe to checkpoint.
+    """
+    slugs = SlugAllocator()
+    pending = ((position, raw) for position, raw in rows if position > start_after)
+    for batch in batched(pending, batch_size):
+        parsed, errors = [], []
+        for position, raw in batch:
+            try:
+                parsed.append((position, parse(raw)))
+            except RowError as exc:
+                errors.append((position, str(exc)))
+        lookups.load([row for _, row in parsed])
+        valid = []
+        for position, row in parsed:
+            try:
+                valid.append(validate(row, lookups))
+            except RowError as exc:
+                errors.append((position, str(exc)))
+
+        if valid and not dry_run:
+            bases = [row['slug'] for row in valid]
+            try:
+                write_batch(valid, slugs.allocate(bases))
+            except IntegrityError:
+                # Someone else took one of our slugs since it was read; try once more
+                slugs.forget(bases)
+                write_batch(valid, slugs.allocate(bases))
+        yield {'position': batch[-1][0], 'rows': len(batch), 'imported': len(valid), 'errors': sorted(errors)}
@@ -0,0 +1,107 @@
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import media, renditions
+from recipes.models import Recipe, UserProfile
+
+
+def bounded_map(pool, func, items, window):
+    """Like ``pool.map`` but with at most ``window`` items in flight, so ``items`` is consumed lazily."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    help = 'Check that every recipe photo and avatar exists, decodes and is a sane size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Files checked in parallel')
+        parser.add_argument('--max-bytes', type=int, default=media.MAX_FILE_BYTES,
+                            help='Flag files larger than this')
+        parser.add_argument('--max-pixels', type=int, default=media.MAX_IMAGE_PIXELS,
+                            help='Flag images with more pixels than this')
+        parser.add_argument('--clear-missing', action='store_true',
+                            help='Remove references to files that no longer exist')
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Queue rendition generation for images whose renditions are missing or stale')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        totals = Counter()
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for model in (Recipe, UserProfile):
+                checked, found = self.audit(model, pool, options)
+                totals['checked'] += checked
+                totals.update({problem: len(rows) for problem, rows in found.items()})
+                if options['clear_missing'] and found['missing']:
+                    self.clear(model, found['missing'])
+                if options['regenerate'] and found['renditions']:
+                    self.regenerate(model, found['renditions'])
+
+        checked = totals.pop('checked', 0)
+        elapsed = time.monotonic() - start
+        summary = ', '.join(f'{totals[problem]} {problem}' for problem in ('missing', 'corrupt', 'oversized', 'renditions'))
+        style = self.style.WARNING if any(totals.values()) else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Checked {checked} images in {elapsed:.1f}s ({checked / max(elapsed, 1e-6):.0f}/s): {summary}'
+        ))
+
+    def audit(self, model, pool, options):
+        """Number of images checked, and {problem: [(pk, name, manifest)]} for ``model``."""
+        image_field, manifest_field, _ = renditions.TARGETS[model._meta.app_label, model._meta.model_name]
+        rows = (model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                .order_by('pk').values_list('pk', image_field, manifest_field))
+
+        def check(pk, name, manifest):
+            manifest = manifest or {}
+            derived = renditions._rendition_names(manifest) if manifest.get('source') == name else None
+            result = media.inspect(name, derived or (), options['max_bytes'], options['max_pixels'])
+            if result is None and derived is None:
+                result = ('renditions', 'not generated for this file')
+            return pk, name, manifest, result
+
+        checked, found = 0, defaultdict(list)
+        label = model._meta.model_name
+        window = max(options['workers'], 1) * 8
+        for pk, name, manifest, result in bounded_map(pool, check, rows.iterator(chunk_size=2000), window):
+            checked += 1
+            if result is None:
+                continue
+            problem, detail = result
+            found[problem].append((pk, name, manifest))
+            if problem != 'renditions':
+                self.stdout.write(f'{problem}: {label} {pk} {name} ({detail})')
+        return checked, found
+
+    def clear(self, model, rows):
+        image_field, manifest_field, _ = renditions.TARGETS[model._meta.app_label, model._meta.model_name]
+        with transaction.atomic():
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                model.objects.filter(pk__in=[pk for pk, _, _ in batch]).update(**{image_field: '', manifest_field: {}})
+            derived = {}
+            for _, name, manifest in rows:
+                if manifest.get('source') == name:
+                    derived[name] = renditions._rendition_names(manifest)
+            for name, count in Counter(name for _, name, _ in rows).items():
+                media.release(name, derived.get(name, ()), count=count)
+        self.stdout.write(f'Cleared {len(rows)} missing {model._meta.verbose_name_plural} images')
+
+    def regenerate(self, model, rows):
+        _, manifest_field, _ = renditions.TARGETS[model._meta.app_label, model._meta.model_name]
+        for start in range(0, len(rows), 500):
+            pks = [pk for pk, _, _ in rows[start:start + 500]]
+            # An empty manifest is never current, so refresh() renders again
+            model.objects.filter(pk__in=pks).update(**{manifest_field: {}})
+            for instance in model.objects.filter(pk__in=pks):
+                renditions.schedule(instance)
+        self.stdout.write(f'Queued renditions for {len(rows)} {model._meta.verbose_name_plural}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Build the item-item neighbor table behind "Recommended For You"'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute every recipe instead of only those whose favorites/reviews changed',
+        )
+        parser.add_argument('--neighbors', type=int, default=recommendations.NEIGHBORS_PER_RECIPE,
+                            help='Neighbors kept per recipe')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        result = recommendations.build(
+            full=options['full'], k=options['neighbors'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {result['recipes']} recipes, wrote {result['neighbors']} neighbor rows"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes import response_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the anonymous page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+        parser.add_argument('--invalidate', action='store_true', help='Bump the catalog generation, dropping every cached page')
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  "
+            f"hit rate: {stats['hit_rate']:.1%}  generation: {stats['generation']}"
+        )
+        if options['reset']:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
+        if options['invalidate']:
+            response_cache.bump_catalog_version()
+            self.stdout.write(self.style.SUCCESS('Catalog generation bumped'))
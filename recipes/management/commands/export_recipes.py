@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import exporter
+
+
+class Command(BaseCommand):
+    help = 'Stream the recipe catalog (with ingredients, instructions and ratings) as JSON Lines or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=exporter.FORMATS, default='jsonl')
+        parser.add_argument('--since', help='Only recipes changed (or reviewed) at or after this ISO date/datetime')
+        parser.add_argument('--output', help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=exporter.DEFAULT_CHUNK_SIZE,
+                            help='Recipes fetched (and prefetched) per database round trip')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = exporter.parse_since(options['since'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        lines = exporter.export_lines(options['format'], since=since, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        written = 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+                written += 1
+        # The CSV header is a line too
+        count = written - 1 if options['format'] == 'csv' else written
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} recipes to {options['output']}"))
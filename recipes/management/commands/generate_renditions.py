@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes import renditions
+from recipes.models import Recipe, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or stale image renditions (card/header/avatar, WebP + JPEG) for existing media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate even renditions that look current')
+        parser.add_argument('--workers', type=int, default=4, help='Images processed in parallel (1 = in this thread)')
+
+    def handle(self, *args, **options):
+        self.force = options['force']
+        for model in (Recipe, UserProfile):
+            image_field, manifest_field, _ = renditions.TARGETS[model._meta.app_label, model._meta.model_name]
+            rows = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            pks = rows.values_list('pk', flat=True).iterator(chunk_size=1000)
+            generate = lambda pk: self.generate(model, manifest_field, pk)  # noqa: E731
+            if options['workers'] > 1:
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    results = list(pool.map(self.in_thread(generate), pks))
+            else:
+                results = [generate(pk) for pk in pks]
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: {results.count(True)} generated, '
+                f'{results.count(False)} already current, {results.count(None)} failed'
+            ))
+
+    def generate(self, model, manifest_field, pk):
+        try:
+            instance = model.objects.get(pk=pk)
+            if self.force:
+                setattr(instance, manifest_field, {})
+            return renditions.refresh(instance)
+        except Exception as exc:
+            self.stderr.write(f'{model._meta.model_name} {pk}: {exc}')
+            return None
+
+    @staticmethod
+    def in_thread(func):
+        def run(*args):
+            try:
+                return func(*args)
+            finally:
+                # Worker threads get their own connection; don't leak it
+                connection.close()
+        return run
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import importer
+
+
+class Command(BaseCommand):
+    help = 'Bulk import recipes from a JSON Lines or CSV file (see recipes/importer.py for the row format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="JSON Lines or CSV file, or - for standard input")
+        parser.add_argument('--format', choices=importer.FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE,
+                            help='Rows written per transaction')
+        parser.add_argument('--author', help='Username for rows without an author')
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create categories that do not exist yet instead of rejecting the row')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without writing anything')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last committed row; an existing checkpoint resumes the import')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        source = options['source']
+        fmt = options['format'] or importer.format_for(source)
+        checkpoint = options['checkpoint']
+        dry_run = options['dry_run']
+
+        start_after = 0
+        if checkpoint and not options['restart'] and os.path.exists(checkpoint):
+            start_after = self._read_checkpoint(checkpoint, source)
+            self.stdout.write(f'Resuming after row {start_after}')
+
+        lookups = importer.Lookups(
+            default_author=options['author'],
+            create_categories=options['create_categories'],
+            dry_run=dry_run,
+        )
+        stream = sys.stdin if source == '-' else open(source, newline='', encoding='utf-8')
+        rows = imported = failed = 0
+        started = time.monotonic()
+        try:
+            batches = importer.import_rows(
+                importer.read_rows(stream, fmt), lookups,
+                batch_size=options['batch_size'], start_after=start_after, dry_run=dry_run,
+            )
+            for batch in batches:
+                rows += batch['rows']
+                imported += batch['imported']
+                failed += len(batch['errors'])
+                for position, message in batch['errors']:
+                    self.stderr.write(f'row {position}: {message}')
+                if checkpoint and not dry_run:
+                    self._write_checkpoint(checkpoint, source, batch['position'])
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{rows} rows, {imported} valid, {failed} rejected ({rows / max(elapsed, 1e-6):.0f} rows/s)')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        verb = 'Validated' if dry_run else 'Imported'
+        summary = f'{verb} {imported} of {rows} rows in {elapsed:.1f}s'
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary}; {failed} rows rejected'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def _read_checkpoint(self, path, source):
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read checkpoint {path}: {exc}')
+        if state.get('source') != os.path.abspath(source) and source != '-':
+            raise CommandError(f'Checkpoint {path} belongs to {state.get("source")}; use --restart to start over')
+        return state.get('position', 0)
+
+    def _write_checkpoint(self, path, source, position):
+        # Write then rename, so a crash mid-write never leaves a torn checkpoint
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.abspath(source) if source != '-' else '-', 'position': position}, f)
+        os.replace(tmp, path)
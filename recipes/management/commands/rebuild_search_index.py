@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all recipes'
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'This database backend has no full-text index; searches fall back to substring matching.'
+            ))
+            return
+
+        with transaction.atomic():
+            count = search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} recipes'))
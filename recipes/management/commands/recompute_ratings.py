@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import Recipe, Review, empty_rating_histogram
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the stored rating aggregates on every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        histograms = {}
+        rows = Review.objects.values('recipe_id', 'rating').annotate(n=Count('id')).order_by()
+        for row in rows.iterator():
+            if 1 <= row['rating'] <= 5:
+                histograms.setdefault(row['recipe_id'], empty_rating_histogram())[row['rating'] - 1] = row['n']
+
+        checked = 0
+        drifted = []
+        recipes = Recipe.objects.only('id', 'rating_avg', 'rating_count', 'rating_histogram')
+        for recipe in recipes.iterator(chunk_size=batch_size):
+            checked += 1
+            histogram = histograms.get(recipe.pk, empty_rating_histogram())
+            count = sum(histogram)
+            avg = sum(star * n for star, n in enumerate(histogram, start=1)) / count if count else 0
+            if (recipe.rating_count, recipe.rating_histogram) != (count, histogram) or abs(recipe.rating_avg - avg) > 1e-9:
+                recipe.rating_avg, recipe.rating_count, recipe.rating_histogram = avg, count, histogram
+                drifted.append(recipe)
+
+        if not dry_run:
+            with transaction.atomic():
+                Recipe.objects.bulk_update(
+                    drifted, ['rating_avg', 'rating_count', 'rating_histogram'], batch_size=batch_size
+                )
+
+        verb = 'would update' if dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} recipes, {verb} {len(drifted)}'))
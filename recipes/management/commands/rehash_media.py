@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import media, renditions
+from recipes.models import Recipe, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Move existing recipe photos and avatars to content-hashed names, merging duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Files hashed and copied in parallel')
+        parser.add_argument('--keep-originals', action='store_true',
+                            help='Leave the old files (and their renditions) in place')
+
+    def handle(self, *args, **options):
+        moved = {}
+        obsolete = set()
+        for model in (Recipe, UserProfile):
+            image_field, manifest_field, _ = renditions.TARGETS[model._meta.app_label, model._meta.model_name]
+            rows = (model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                    .values_list(image_field, manifest_field))
+            names = set()
+            for name, manifest in rows.iterator(chunk_size=2000):
+                if not media.is_hashed(name):
+                    names.add(name)
+                    if (manifest or {}).get('source') == name:
+                        obsolete.update(renditions._rendition_names(manifest))
+            names -= set(moved)
+
+            with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+                for old, new in zip(names, pool.map(self.rehash, names)):
+                    if new is not None:
+                        moved[old] = new
+
+            with transaction.atomic():
+                for old, new in moved.items():
+                    model.objects.filter(**{image_field: old}).update(**{image_field: new})
+
+        in_use = media.recount()
+        if not options['keep_originals']:
+            for name in set(moved) | obsolete:
+                media.content_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {len(moved)} files to {len(set(moved.values()))} hashed names; {in_use} distinct files in use. '
+            'Run generate_renditions to rebuild renditions for the new names.'
+        ))
+
+    def rehash(self, name):
+        storage = media.content_storage
+        if not storage.exists(name):
+            self.stderr.write(f'missing: {name}')
+            return None
+        with storage.open(name, 'rb') as f:
+            return storage.save(name, f)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes import trending
+
+
+class Command(BaseCommand):
+    help = 'Fold new recipe views into the decayed trending scores and compact old view buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute every score from the retained buckets (e.g. after changing the half-life)',
+        )
+
+    def handle(self, *args, **options):
+        result = trending.refresh(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {result['folded']} views into {result['scored']} recipes; "
+            f"compacted {result['compacted']} old buckets"
+        ))
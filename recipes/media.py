@@ -0,0 +1,175 @@
+"""Content-addressed storage for recipe photos and avatars.
+
+``ContentAddressedStorage`` names every upload after the SHA-256 of its
+bytes (``recipes/3f/3f2a...e9.jpg``). Identical uploads therefore share one
+file. A name never changes meaning either, so media can be served with
+``Cache-Control: immutable``.
+
+A shared file is only deleted once nothing points at it. MediaFile counts
+the references:
+
+* a row taking a file adds one,
+* a row switching to another file, clearing it, or being deleted drops one.
+
+These counts are maintained by the signal handlers in ``models.py``. When a
+count reaches zero, the file and its renditions (see ``renditions``) are
+removed after the transaction commits. ``manage.py rehash_media`` moves
+pre-existing media to hashed names and rebuilds the counts.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+from django.views import static
+
+# Content-hashed originals and renditions; anything else may be overwritten in place
+_HASHED_RE = re.compile(r'(^|/)[0-9a-f]{64}(\.[^/]*)?$|\.[0-9a-f]{12}\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Limits for inspect(); uploads beyond these are flagged as oversized
+MAX_FILE_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+
+
+def file_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks() if hasattr(content, 'chunks') else iter(lambda: content.read(65536), b''):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """Where a file called ``name`` with content hash ``digest`` is stored."""
+    directory, ext = posixpath.dirname(name), posixpath.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{ext}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names uploads by content hash and stores each distinct file once."""
+
+    def save(self, name, content, max_length=None):
+        name = hashed_name(self.generate_filename(name), file_hash(content))
+        if self.exists(name):
+            return name
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # A concurrent save of the same bytes created the file first and
+            # this copy got a suffixed name; keep the single shared one
+            self.delete(saved)
+        return name
+
+    def save_derived(self, name, content):
+        """Store a file derived from an original (a rendition) under exactly ``name``."""
+        if self.exists(name):
+            return name
+        return super().save(name, content)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def is_hashed(name):
+    return bool(_HASHED_RE.search(name))
+
+
+def add_reference(name):
+    from .models import MediaFile
+
+    MediaFile.objects.bulk_create([MediaFile(name=name)], ignore_conflicts=True)
+    MediaFile.objects.filter(name=name).update(references=F('references') + 1)
+
+
+def release(name, derived=(), count=1):
+    """Drop ``count`` references to ``name``; at zero it and ``derived`` files are deleted after commit."""
+    from .models import MediaFile
+
+    MediaFile.objects.filter(name=name).update(references=F('references') - count)
+    derived = list(derived)
+    transaction.on_commit(lambda: collect(name, derived))
+
+
+def collect(name, derived=()):
+    """Delete ``name`` (and ``derived``) if no row references it any more."""
+    from .models import MediaFile
+
+    with transaction.atomic():
+        # Locking the row keeps a concurrent add_reference from reviving it mid-delete
+        unused = MediaFile.objects.select_for_update().filter(name=name, references__lte=0)
+        if not unused.exists():
+            return False
+        unused.delete()
+        for path in [name, *derived]:
+            content_storage.delete(path)
+    return True
+
+
+def recount():
+    """Rebuild every MediaFile count from the rows; returns the number of distinct files in use."""
+    from collections import Counter
+
+    from .models import MediaFile, Recipe, UserProfile
+
+    counts = Counter(Recipe.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+    counts.update(UserProfile.objects.exclude(avatar='').exclude(avatar=None).values_list('avatar', flat=True))
+    with transaction.atomic():
+        MediaFile.objects.update(references=0)
+        MediaFile.objects.bulk_create([MediaFile(name=name) for name in counts], ignore_conflicts=True, batch_size=1000)
+        by_count = {}
+        for name, n in counts.items():
+            by_count.setdefault(n, []).append(name)
+        for n, names in by_count.items():
+            for start in range(0, len(names), 500):
+                MediaFile.objects.filter(name__in=names[start:start + 500]).update(references=n)
+    return len(counts)
+
+
+def inspect(name, derived=(), max_bytes=MAX_FILE_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """Check one stored image without decoding its pixels.
+
+    Returns ``(problem, detail)``, or None if the file is fine. ``problem`` is
+    'missing', 'corrupt', 'oversized' or 'renditions' (one of ``derived`` is
+    gone).
+    """
+    import warnings
+
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        size = content_storage.size(name)
+    except FileNotFoundError:
+        return 'missing', 'file not found'
+    if size > max_bytes:
+        return 'oversized', f'{size} bytes'
+    try:
+        with content_storage.open(name, 'rb') as f, warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            # open() only parses the header; pixels are never decoded
+            width, height = Image.open(f).size
+    except Image.DecompressionBombError as exc:
+        return 'oversized', str(exc)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as exc:
+        return 'corrupt', str(exc) or type(exc).__name__
+    if width * height > max_pixels:
+        return 'oversized', f'{width}x{height} pixels'
+    for path in derived:
+        if not content_storage.exists(path):
+            return 'renditions', f'{path} not found'
+    return None
+
+
+def serve(request, path):
+    """Serve MEDIA_ROOT; content-hashed files are marked immutable."""
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,63 @@
+# Full-text search index for recipes (FTS5 on SQLite, tsvector + GIN on Postgres)
+
+from django.db import migrations
+
+# Table names and SQL are inlined so later changes to recipes.search don't
+# change what this migration does
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5("
+            "title, description, tags, ingredients, "
+            "tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO recipes_recipe_fts (rowid, title, description, tags, ingredients) "
+            "SELECT r.id, r.title, r.description, replace(r.tags, ',', ' '), "
+            "coalesce((SELECT group_concat(i.name, ' ') FROM recipes_ingredient i "
+            "WHERE i.recipe_id = r.id), '') "
+            "FROM recipes_recipe r"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS recipes_recipe_search ("
+            "recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe(id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS recipes_recipe_search_document_gin "
+            "ON recipes_recipe_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO recipes_recipe_search (recipe_id, document) "
+            "SELECT r.id, "
+            "setweight(to_tsvector('english', r.title), 'A') || "
+            "setweight(to_tsvector('english', replace(r.tags, ',', ' ')), 'B') || "
+            "setweight(to_tsvector('english', coalesce((SELECT string_agg(i.name, ' ') "
+            "FROM recipes_ingredient i WHERE i.recipe_id = r.id), '')), 'B') || "
+            "setweight(to_tsvector('english', r.description), 'C') "
+            "FROM recipes_recipe r"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS recipes_recipe_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS recipes_recipe_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_enhancements'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+import recipes.models
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Review = apps.get_model('recipes', 'Review')
+    histograms = {}
+    for recipe_id, rating in Review.objects.values_list('recipe_id', 'rating').iterator():
+        histogram = histograms.setdefault(recipe_id, [0] * 5)
+        if 1 <= rating <= 5:
+            histogram[rating - 1] += 1
+    for recipe_id, histogram in histograms.items():
+        count = sum(histogram)
+        avg = sum(star * n for star, n in enumerate(histogram, start=1)) / count if count else 0
+        Recipe.objects.filter(pk=recipe_id).update(
+            rating_avg=avg, rating_count=count, rating_histogram=histogram,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_histogram',
+            field=models.JSONField(blank=True, default=recipes.models.empty_rating_histogram, help_text='Review counts for 1-5 stars'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-rating_count', '-id'], name='recipe_rating_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='recipe_rating_avg_idx'),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Split the old comma-separated Recipe.tags strings into Tag rows
+
+from django.db import migrations
+from django.utils.text import slugify
+
+
+def split_tags(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Tag = apps.get_model('recipes', 'Tag')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+
+    links = {}
+    names = {}
+    for recipe_id, text in Recipe.objects.exclude(tags_text='').values_list('id', 'tags_text').iterator():
+        for raw in text.split(','):
+            name = ' '.join(raw.split()).lower()[:50]
+            slug = slugify(name)
+            if not slug:
+                continue
+            names.setdefault(slug, name)
+            links.setdefault(recipe_id, set()).add(slug)
+
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=slug) for slug, name in names.items()],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    tag_ids = dict(Tag.objects.filter(slug__in=names).values_list('slug', 'id'))
+    RecipeTag.objects.bulk_create(
+        [
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_ids[slug])
+            for recipe_id, slugs in links.items()
+            for slug in slugs
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+
+
+def join_tags(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+
+    names = {}
+    for recipe_id, name in RecipeTag.objects.values_list('recipe_id', 'tag__name').iterator():
+        names.setdefault(recipe_id, []).append(name)
+    for recipe_id, tag_names in names.items():
+        Recipe.objects.filter(pk=recipe_id).update(tags_text=', '.join(sorted(tag_names))[:500])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_tag_recipetag'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_tags, join_tags),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:58
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A frozen copy of recipes.pantry.normalize as it was when this migration was
+# written, so later changes to the live code don't change what it does
+
+_DESCRIPTORS = {
+    'fresh', 'freshly', 'large', 'small', 'medium', 'chopped', 'diced', 'sliced', 'minced',
+    'grated', 'ground', 'whole', 'softened', 'melted', 'cubed', 'peeled', 'optional', 'ripe',
+    'dried', 'finely', 'roughly', 'to', 'taste', 'of', 'for', 'a', 'an', 'the',
+    'cup', 'tbsp', 'tsp', 'tablespoon', 'teaspoon', 'g', 'kg', 'mg', 'ml', 'l', 'oz', 'lb',
+    'pound', 'ounce', 'gram', 'pinch', 'dash', 'can', 'package', 'handful',
+}
+_WORD_RE = re.compile(r'[a-z]+')
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith('ss'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes') or word.endswith(('ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize(name):
+    name = re.sub(r'\(.*?\)', ' ', (name or '').lower()).split(',')[0]
+    words = [w for w in map(_singular, _WORD_RE.findall(name)) if w not in _DESCRIPTORS]
+    return ' '.join(words)[:200]
+
+
+def assign_terms(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientTerm = apps.get_model('recipes', 'IngredientTerm')
+
+    names = {}
+    for ingredient_id, name in Ingredient.objects.values_list('id', 'name').iterator():
+        normalized = normalize(name)
+        if normalized:
+            names.setdefault(normalized, []).append(ingredient_id)
+    IngredientTerm.objects.bulk_create(
+        [IngredientTerm(name=name, head=name.rsplit(' ', 1)[-1][:100]) for name in names],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    term_ids = dict(IngredientTerm.objects.values_list('name', 'id'))
+    for name, ingredient_ids in names.items():
+        for start in range(0, len(ingredient_ids), 500):
+            Ingredient.objects.filter(pk__in=ingredient_ids[start:start + 500]).update(term_id=term_ids[name])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_remove_recipe_tags_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('head', models.CharField(db_index=True, max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='term',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingredients', to='recipes.ingredientterm'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['term', 'recipe'], name='ingredient_term_recipe_idx'),
+        ),
+        migrations.RunPython(assign_terms, migrations.RunPython.noop),
+    ]
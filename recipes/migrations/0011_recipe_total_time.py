@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:00
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredient_terms'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_time_id_idx',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_time',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('prep_time'), '+', models.F('cook_time')), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['total_time', 'id'], name='recipe_total_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='recipe_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', '-view_count', '-id'], name='recipe_cat_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['difficulty', '-created_at', '-id'], name='recipe_diff_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['difficulty', '-view_count', '-id'], name='recipe_diff_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['dietary_restriction', '-created_at', '-id'], name='recipe_diet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['dietary_restriction', '-view_count', '-id'], name='recipe_diet_views_idx'),
+        ),
+    ]
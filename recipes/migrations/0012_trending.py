@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_total_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe')),
+                ('score', models.FloatField(db_index=True)),
+                ('as_of', models.DateTimeField(help_text='Time the score was decayed to')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('folded_views', models.PositiveIntegerField(default=0)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='recipes.recipe')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='viewbucket_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'hour'), name='unique_recipe_view_hour')],
+            },
+        ),
+    ]
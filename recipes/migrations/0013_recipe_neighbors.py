@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNeighborRefresh',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Cosine similarity of who favorited/liked the two recipes')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='recipes.recipe')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipe', '-score'], name='neighbor_recipe_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'neighbor'), name='unique_recipe_neighbor')],
+            },
+        ),
+    ]
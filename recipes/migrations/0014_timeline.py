@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# recipes.timeline.BACKFILL_SIZE when this was written, frozen so later
+# changes to the live setting don't change what this migration does
+BACKFILL_SIZE = 100
+
+
+def backfill_timelines(apps, schema_editor):
+    UserProfile = apps.get_model('recipes', 'UserProfile')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+
+    user_of = dict(UserProfile.objects.values_list('pk', 'user_id'))
+    followers = {}
+    for follower_id, followed_id in UserProfile.followers.through.objects.values_list(
+            'to_userprofile_id', 'from_userprofile_id').iterator():
+        followers.setdefault(user_of[followed_id], []).append(user_of[follower_id])
+    for author_id, follower_ids in followers.items():
+        recent = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-created_at', '-id').values_list('pk', 'created_at')[:BACKFILL_SIZE]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id, created_at=created_at)
+             for user_id in follower_ids for recipe_id, created_at in recent],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_neighbors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(help_text="The recipe's created_at")),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='recipes.recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='timeline_user_created_idx'), models.Index(fields=['user', 'author'], name='timeline_user_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_recipe')],
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:11
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def initialize(apps, schema_editor):
+    Review = apps.get_model('recipes', 'Review')
+    CatalogVersion = apps.get_model('recipes', 'CatalogVersion')
+    Review.objects.update(updated_at=F('created_at'))
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(initialize, migrations.RunPython.noop),
+    ]
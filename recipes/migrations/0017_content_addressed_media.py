@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:26
+
+import recipes.media
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    UserProfile = apps.get_model('recipes', 'UserProfile')
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    counts = Counter(Recipe.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+    counts.update(UserProfile.objects.exclude(avatar='').exclude(avatar=None).values_list('avatar', flat=True))
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, references=n) for name, n in counts.items()], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=recipes.media.ContentAddressedStorage(), upload_to='recipes/'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=recipes.media.ContentAddressedStorage(), upload_to='avatars/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
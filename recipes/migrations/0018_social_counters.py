@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(rows, group_field):
+    return Coalesce(Subquery(
+        rows.filter(**{group_field: OuterRef('pk')}).order_by()
+        .values(group_field).annotate(n=Count('*')).values('n')
+    ), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    UserProfile = apps.get_model('recipes', 'UserProfile')
+    favorites = UserProfile.favorite_recipes.through.objects
+    follows = UserProfile.followers.through.objects
+    Recipe.objects.update(favorite_count=_count(favorites, 'recipe_id'))
+    UserProfile.objects.update(
+        follower_count=_count(follows, 'from_userprofile_id'),
+        following_count=_count(follows, 'to_userprofile_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorite_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='follower_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clamp_ratings(apps, schema_editor):
+    # Reviews saved before ratings were validated can hold any integer; pull
+    # them into 1-5 and refresh the aggregates that had been skipping them
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Review = apps.get_model('recipes', 'Review')
+    out_of_range = Review.objects.exclude(rating__gte=1, rating__lte=5)
+    recipe_ids = set(out_of_range.values_list('recipe_id', flat=True))
+    if not recipe_ids:
+        return
+    out_of_range.filter(rating__lt=1).update(rating=1)
+    out_of_range.filter(rating__gt=5).update(rating=5)
+    for recipe_id in recipe_ids:
+        histogram = [0] * 5
+        for rating in Review.objects.filter(recipe_id=recipe_id).values_list('rating', flat=True):
+            histogram[rating - 1] += 1
+        count = sum(histogram)
+        avg = sum(star * n for star, n in enumerate(histogram, start=1)) / count if count else 0
+        Recipe.objects.filter(pk=recipe_id).update(rating_avg=avg, rating_count=count, rating_histogram=histogram)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_pantry_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(condition=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='review_rating_1_to_5'),
+        ),
+    ]
@@ -1,9 +1,31 @@
 
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 
+from .media import content_storage
+
+def empty_rating_histogram():
+    return [0] * 5
+
+class CounterFieldsMixin:
+    """Models with ``counter_fields``: denormalized counters and aggregates
+    that only move through their own queryset updates (F() increments in
+    social.py and view_counts.py, update_rating_stats() for ratings).
+
+    Writing back a value read earlier would undo increments or reviews that
+    landed in between, so forms and the admin save existing rows with
+    ``update_fields=obj.fields_without_counters()``.
+    """
+    counter_fields = ()
+
+    def fields_without_counters(self):
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and not field.generated and field.name not in self.counter_fields
+        ]
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
@@ -14,7 +36,61 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Recipe(models.Model):
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    slug = models.SlugField(unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+class RecipeQuerySet(models.QuerySet):
+    def with_tags(self, tag_ids, match_all=False):
+        """Recipes tagged with any (or, with match_all, every) tag in `tag_ids`.
+
+        Both modes are index lookups on the recipe/tag through table.
+        """
+        from django.db.models import Count
+
+        tag_ids = list(tag_ids)
+        links = RecipeTag.objects.filter(tag_id__in=tag_ids)
+        if match_all:
+            links = (
+                links.values('recipe_id').annotate(matched=Count('tag_id'))
+                .filter(matched=len(set(tag_ids)))
+            )
+        return self.filter(pk__in=links.values('recipe_id'))
+
+    def for_cards(self):
+        """Project recipes for grid cards in a fixed number of queries.
+
+        Joins category/author, annotates ingredient and instruction counts, and
+        prefetches only the rows a card shows (first three ingredients as
+        `card_ingredients`, first two steps as `card_instructions`).
+        """
+        from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+        from django.db.models.functions import Coalesce
+
+        def count_of(model):
+            counts = (
+                model.objects.filter(recipe=OuterRef('pk'))
+                .order_by().values('recipe').annotate(n=Count('pk')).values('n')
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        return self.select_related('category', 'author').annotate(
+            ingredient_count=count_of(Ingredient),
+            instruction_count=count_of(Instruction),
+        ).prefetch_related(
+            Prefetch('ingredients', queryset=Ingredient.objects.order_by('order', 'pk')[:3],
+                     to_attr='card_ingredients'),
+            Prefetch('instructions', queryset=Instruction.objects.order_by('step_number', 'pk')[:2],
+                     to_attr='card_instructions'),
+        )
+
+class Recipe(CounterFieldsMixin, models.Model):
     DIFFICULTY_CHOICES = [
         ('easy', 'Easy'),
         ('medium', 'Medium'),
@@ -38,38 +114,128 @@ class Recipe(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     prep_time = models.IntegerField(help_text="Preparation time in minutes")
     cook_time = models.IntegerField(help_text="Cooking time in minutes")
+    # Computed by the database so it can be filtered, sorted and indexed
+    total_time = models.GeneratedField(
+        expression=models.F('prep_time') + models.F('cook_time'),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     servings = models.IntegerField(default=4)
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES)
     dietary_restriction = models.CharField(max_length=20, choices=DIETARY_CHOICES, default='none')
-    image = models.ImageField(upload_to='recipes/', blank=True, null=True)
-    tags = models.CharField(max_length=500, blank=True, help_text="Comma-separated tags")
+    image = models.ImageField(upload_to='recipes/', storage=content_storage, blank=True, null=True)
+    # Generated sizes of `image`, see renditions.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    tags = models.ManyToManyField(Tag, through='RecipeTag', related_name='recipes', blank=True)
     view_count = models.IntegerField(default=0)
+    # Denormalized count of favorited_by, maintained by social.py
+    favorite_count = models.IntegerField(default=0)
+    # Review aggregates, maintained by update_rating_stats() on every review write
+    rating_avg = models.FloatField(default=0, db_index=True)
+    rating_count = models.IntegerField(default=0, db_index=True)
+    rating_histogram = models.JSONField(default=empty_rating_histogram, blank=True, help_text="Review counts for 1-5 stars")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('view_count', 'favorite_count', 'rating_avg', 'rating_count', 'rating_histogram')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: one index per listing sort order, tie-broken on id
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_id_idx'),
+            models.Index(fields=['title', 'id'], name='recipe_title_id_idx'),
+            models.Index(fields=['-view_count', '-id'], name='recipe_views_id_idx'),
+            models.Index(fields=['total_time', 'id'], name='recipe_total_time_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='recipe_author_created_idx'),
+            models.Index(fields=['-rating_count', '-id'], name='recipe_rating_count_id_idx'),
+            models.Index(fields=['-rating_avg', '-rating_count'], name='recipe_rating_avg_idx'),
+            # Common filter + sort combinations on recipe_list
+            models.Index(fields=['category', '-created_at', '-id'], name='recipe_cat_created_idx'),
+            models.Index(fields=['category', '-view_count', '-id'], name='recipe_cat_views_idx'),
+            models.Index(fields=['difficulty', '-created_at', '-id'], name='recipe_diff_created_idx'),
+            models.Index(fields=['difficulty', '-view_count', '-id'], name='recipe_diff_views_idx'),
+            models.Index(fields=['dietary_restriction', '-created_at', '-id'], name='recipe_diet_created_idx'),
+            models.Index(fields=['dietary_restriction', '-view_count', '-id'], name='recipe_diet_views_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
-    @property
-    def total_time(self):
-        return self.prep_time + self.cook_time
-    
     def get_average_rating(self):
-        from django.db.models import Avg
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else 0
+        return round(self.rating_avg, 1) if self.rating_count else 0
+
+    def update_rating_stats(self):
+        update_rating_stats(self.pk)
+
+class RecipeTag(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'tag'], name='unique_recipe_tag'),
+        ]
+        indexes = [
+            # Tag filtering walks tag -> recipes
+            models.Index(fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} - {self.tag_id}"
+
+class IngredientTerm(models.Model):
+    """Normalized ingredient vocabulary entry ("Tomatoes, diced" -> "tomato")."""
+    name = models.CharField(max_length=200, unique=True)
+    # Last word of the name, so a pantry "cheese" also finds "parmesan cheese"
+    head = models.CharField(max_length=100, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+class PantryVersion(models.Model):
+    """Single row counting published pantry index changes, shared by every process."""
+    version = models.BigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls, n=1):
+        """Advance the version by ``n`` and return the new value.
+
+        Call inside a transaction: the row stays locked until it commits, so
+        versions become visible in the order they were handed out.
+        """
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + n):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(version=models.F('version') + n)
+        return cls.objects.values_list('version', flat=True).get(pk=1)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+class PantryChange(models.Model):
+    """A recipe whose ingredients changed, published at one pantry index version."""
+    version = models.BigIntegerField(unique=True)
+    # Not a foreign key: deleted recipes still have to be patched out of the index
+    recipe_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f"v{self.version}: {self.recipe_id}"
 
 class Ingredient(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='ingredients', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     quantity = models.CharField(max_length=50)
     order = models.IntegerField(default=0)
+    term = models.ForeignKey(IngredientTerm, null=True, blank=True, editable=False,
+                             related_name='ingredients', on_delete=models.SET_NULL)
     
     class Meta:
         ordering = ['order']
+        indexes = [
+            # Inverted index: ingredient term -> recipes
+            models.Index(fields=['term', 'recipe'], name='ingredient_term_recipe_idx'),
+        ]
     
     def __str__(self):
         return f"{self.quantity} {self.name}"
@@ -91,29 +257,419 @@ class Review(models.Model):
     rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['recipe', 'user']
+        constraints = [
+            # update_rating_stats() buckets ratings 1-5; anything else would be lost from the aggregates
+            models.CheckConstraint(condition=models.Q(rating__gte=1, rating__lte=5), name='review_rating_1_to_5'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.rating} stars"
 
-class UserProfile(models.Model):
+class UserProfile(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=content_storage, blank=True, null=True)
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     favorite_recipes = models.ManyToManyField(Recipe, blank=True, related_name='favorited_by')
     followers = models.ManyToManyField('self', symmetrical=False, blank=True, related_name='following')
+    # Denormalized sizes of followers/following, maintained by social.py
+    follower_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    # Keys the cached profile header
+    updated_at = models.DateTimeField(auto_now=True)
+    counter_fields = ('follower_count', 'following_count')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+class MediaFile(models.Model):
+    """How many rows point at a stored media file; at zero it is deleted (see media.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+class CatalogVersion(models.Model):
+    """Single row counting committed catalog writes, shared by every process.
+
+    Pages that list the whole catalog derive their ETag/Last-Modified from it.
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.get_or_create(pk=1)[0]
+
+    @classmethod
+    def bump(cls):
+        from django.utils import timezone
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+    def __str__(self):
+        return f"v{self.version}"
+
+class RecipeViewBucket(models.Model):
+    """Views of one recipe during one hour, the raw input to trending scores."""
+    recipe = models.ForeignKey(Recipe, related_name='view_buckets', on_delete=models.CASCADE)
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    views = models.PositiveIntegerField(default=0)
+    # How many of `views` are already folded into the recipe's TrendingScore
+    folded_views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'hour'], name='unique_recipe_view_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='viewbucket_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} @ {self.hour:%Y-%m-%d %H:00}: {self.views}"
+
+class TrendingScore(models.Model):
+    """Exponentially decayed view score, refreshed by `manage.py update_trending`."""
+    recipe = models.OneToOneField(Recipe, primary_key=True, related_name='trending', on_delete=models.CASCADE)
+    score = models.FloatField(db_index=True)
+    as_of = models.DateTimeField(help_text="Time the score was decayed to")
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.score:.2f}"
+
+class RecipeNeighbor(models.Model):
+    """One of a recipe's top-K most similar recipes, built by `manage.py build_recommendations`."""
+    recipe = models.ForeignKey(Recipe, related_name='neighbors', on_delete=models.CASCADE)
+    neighbor = models.ForeignKey(Recipe, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField(help_text="Cosine similarity of who favorited/liked the two recipes")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'neighbor'], name='unique_recipe_neighbor'),
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'], name='neighbor_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} ~ {self.neighbor_id}: {self.score:.3f}"
+
+class TimelineEntry(models.Model):
+    """A recipe in a follower's feed, written when it is published or the author is followed."""
+    user = models.ForeignKey(User, related_name='timeline', on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, related_name='timeline_entries', on_delete=models.CASCADE)
+    # Denormalized from the recipe so the feed is one index range scan
+    author = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(help_text="The recipe's created_at")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'], name='unique_timeline_recipe'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.recipe_id}"
+
+class RecipeNeighborRefresh(models.Model):
+    """Recipes whose favorites/reviews changed since their neighbors were last built."""
+    recipe = models.OneToOneField(Recipe, primary_key=True, related_name='+', on_delete=models.CASCADE)
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+def update_rating_stats(recipe_id):
+    """Recompute a recipe's stored rating aggregates from its reviews.
+
+    Locks the recipe row so concurrent review writes serialize, then derives
+    the histogram, count and average in one grouped query over the reviews.
+    """
+    from django.db import transaction
+    from django.db.models import Count
+
+    with transaction.atomic():
+        if not Recipe.objects.select_for_update().filter(pk=recipe_id).exists():
+            return
+        histogram = empty_rating_histogram()
+        rows = Review.objects.filter(recipe_id=recipe_id).values('rating').annotate(n=Count('id'))
+        for row in rows:
+            if 1 <= row['rating'] <= 5:
+                histogram[row['rating'] - 1] = row['n']
+        count = sum(histogram)
+        avg = sum(star * n for star, n in enumerate(histogram, start=1)) / count if count else 0
+        Recipe.objects.filter(pk=recipe_id).update(
+            rating_avg=avg,
+            rating_count=count,
+            rating_histogram=histogram,
+        )
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+
+# Keep the full-text search index in sync with recipe and ingredient writes
+@receiver(post_save, sender=Recipe)
+def index_recipe_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    from . import search
+    search.index_recipe(instance.pk)
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe_on_delete(sender, instance, **kwargs):
+    from . import search
+    search.remove_recipe(instance.pk)
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reindex_recipe_on_ingredient_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from . import search
+    search.index_recipe(instance.recipe_id)
+
+
+# recipe_detail caches rendered fragments keyed by Recipe.updated_at, so an
+# ingredient or step edit has to move it too
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def touch_recipe_on_content_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from django.utils import timezone
+    Recipe.objects.filter(pk=instance.recipe_id).update(updated_at=timezone.now())
+
+def recipe_content_changed(recipe_id, ingredients=False):
+    """Run the Ingredient/Instruction receivers' work once after bulk writes, which send no signals."""
+    from django.db import transaction
+    from django.utils import timezone
+    from .response_cache import bump_catalog_version
+    Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now())
+    if ingredients:
+        from . import pantry, search
+        search.index_recipe(recipe_id)
+        pantry.recipe_changed(recipe_id)
+    transaction.on_commit(bump_catalog_version)
+
+
+# Keep the stored rating aggregates on Recipe in step with review writes
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_rating_stats_on_review_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_rating_stats(instance.recipe_id)
+
+
+# Cached pages, facet counts and shared dashboard sections all hang off the
+# catalog generation; any catalog write makes them stale
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Instruction)
+@receiver(post_delete, sender=Instruction)
+def invalidate_catalog_caches(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'view_count'}:
+        return
+    from django.db import transaction
+    from .response_cache import bump_catalog_version
+    transaction.on_commit(bump_catalog_version)
+
+
+# Tag links feed the search index and the catalog caches (the tag cloud among them)
+def _tags_changed(recipe_ids):
+    from django.db import transaction
+    from . import search
+    from .response_cache import bump_catalog_version
+    for recipe_id in recipe_ids:
+        search.index_recipe(recipe_id)
+    transaction.on_commit(bump_catalog_version)
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._tagged_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _tags_changed([instance.pk])
+    elif action == 'post_clear':
+        _tags_changed(getattr(instance, '_tagged_recipe_ids', []))
+    else:
+        _tags_changed(pk_set)
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, raw=False, **kwargs):
+    # A renamed tag changes the search documents of every recipe carrying it
+    if raw or created:
+        return
+    _tags_changed(list(instance.recipes.values_list('pk', flat=True)))
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_recipes(sender, instance, **kwargs):
+    instance._tagged_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    _tags_changed(getattr(instance, '_tagged_recipe_ids', []))
+
+
+# Pantry inverted index: tag ingredients with their vocabulary term and
+# publish which recipes changed so every process can patch its copy
+@receiver(pre_save, sender=Ingredient)
+def assign_ingredient_term(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from . import pantry
+    instance.term = pantry.term_for(instance.name)
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def publish_pantry_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from . import pantry
+    pantry.recipe_changed(instance.recipe_id)
+
+
+# Favorites and reviews feed the item-item recommender; queue the recipes
+# they touch so `build_recommendations` only redoes what changed
+def _queue_neighbor_refresh(recipe_ids):
+    from . import recommendations
+    recommendations.mark_changed(recipe_ids)
+
+@receiver(m2m_changed, sender=UserProfile.favorite_recipes.through)
+def favorites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._favorite_ids = list(instance.favorite_recipes.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from . import social
+    if reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_favorite_ids', [])
+    else:
+        recipe_ids = pk_set
+    _queue_neighbor_refresh(recipe_ids)
+    social.recount_favorites(recipe_ids)
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def queue_neighbor_refresh_on_review(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _queue_neighbor_refresh([instance.recipe_id])
+
+
+# Followers' timelines: fan a new recipe out to everyone following its author,
+# backfill on follow and trim on unfollow (recipe deletes cascade)
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    from . import timeline
+    timeline.fan_out(instance)
+
+@receiver(m2m_changed, sender=UserProfile.followers.through)
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward: instance is the followed profile, pk_set its new/removed followers.
+    # Reverse (profile.following): instance is the follower, pk_set the followed.
+    if action == 'pre_clear':
+        instance._follow_ids = list(
+            instance.following.values_list('pk', flat=True) if reverse
+            else instance.followers.values_list('pk', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from . import social, timeline
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_follow_ids', [])
+    pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set]
+    if action == 'post_add':
+        timeline.backfill(pairs)
+    else:
+        timeline.trim(pairs)
+    social.recount_follows([instance.pk, *pk_set])
+
+
+# Resized renditions are generated in the background whenever the image changes
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=UserProfile)
+def schedule_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'image', 'avatar'} & set(update_fields)):
+        return
+    from . import renditions
+    image_field, manifest_field, _ = renditions.TARGETS[instance._meta.app_label, instance._meta.model_name]
+    if getattr(instance, image_field) or getattr(instance, manifest_field):
+        if not renditions.is_current(instance):
+            renditions.schedule(instance)
+
+
+# Content-addressed media is shared between rows: count references and
+# delete a file (with its renditions) once nothing points at it
+def _media_fields(instance):
+    from . import renditions
+    image_field, manifest_field, _ = renditions.TARGETS[instance._meta.app_label, instance._meta.model_name]
+    return image_field, manifest_field
+
+def _release_media(instance, name, manifest):
+    from . import media, renditions
+    derived = renditions._rendition_names(manifest) if manifest.get('source') == name else ()
+    media.release(name, derived)
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=UserProfile)
+def remember_stored_media(sender, instance, raw=False, update_fields=None, **kwargs):
+    image_field, manifest_field = _media_fields(instance)
+    instance._stored_media = ('', {})
+    if raw or instance.pk is None or (update_fields is not None and image_field not in update_fields):
+        return
+    row = sender.objects.filter(pk=instance.pk).values_list(image_field, manifest_field).first()
+    if row:
+        instance._stored_media = (row[0] or '', row[1] or {})
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=UserProfile)
+def count_media_references(sender, instance, raw=False, update_fields=None, **kwargs):
+    image_field, _ = _media_fields(instance)
+    if raw or (update_fields is not None and image_field not in update_fields):
+        return
+    from . import media
+    old, manifest = getattr(instance, '_stored_media', ('', {}))
+    new = getattr(instance, image_field).name or ''
+    if new == old:
+        return
+    if new:
+        media.add_reference(new)
+    if old:
+        _release_media(instance, old, manifest)
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=UserProfile)
+def release_media_on_delete(sender, instance, **kwargs):
+    image_field, manifest_field = _media_fields(instance)
+    name = getattr(instance, image_field).name
+    if name:
+        _release_media(instance, name, getattr(instance, manifest_field) or {})
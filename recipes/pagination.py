@@ -0,0 +1,137 @@
+"""Keyset (cursor) pagination for recipe listings.
+
+Unlike ``django.core.paginator.Paginator`` this never runs ``COUNT(*)`` and
+never uses ``OFFSET``: each page is a ``WHERE (sort key) > (last row's key)``
+range scan, so page N costs the same as page 1. The ordering must end in a
+unique column (``id``) so ties are broken deterministically.
+"""
+import base64
+import binascii
+import datetime
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values, backwards=False):
+    payload = {'k': [_encode_value(v) for v in values]}
+    if backwards:
+        payload['b'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, backwards)`` for an opaque cursor token."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload['k']), bool(payload.get('b'))
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+class CursorPage(Sequence):
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginate ``queryset`` by ``ordering``, e.g. ``('-created_at', '-id')``."""
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotated sort keys are stored as plain JSON values
+            return value
+        return field.to_python(value)
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self.keys]
+
+    def _after(self, values, backwards):
+        """Q matching rows strictly after ``values`` in the (possibly reversed) ordering."""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != backwards else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(self.keys[:i]):
+                clause &= Q(**{prev_name: values[j]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """Return a CursorPage; an empty or malformed cursor yields the first page."""
+        values, backwards = None, False
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                values, backwards = decode_cursor(cursor)
+                if len(values) != len(self.keys):
+                    raise InvalidCursor(cursor)
+                values = [self._to_python(name, v) for (name, _), v in zip(self.keys, values)]
+                # Keys are never NULL, and a NULL bound would match nothing
+                if any(value is None for value in values):
+                    raise InvalidCursor(cursor)
+                ordering = self.ordering
+                if backwards:
+                    ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+                # Building the filter converts the values for the database, which
+                # can fail too (e.g. a string for an integer key)
+                queryset = self.queryset.order_by(*ordering).filter(self._after(values, backwards))
+            except (InvalidCursor, ValidationError, TypeError, ValueError):
+                values, backwards = None, False
+                queryset = self.queryset.order_by(*self.ordering)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows)
+
+        first, last = self._key(rows[0]), self._key(rows[-1])
+        if backwards:
+            next_cursor = encode_cursor(last)
+            previous_cursor = encode_cursor(first, backwards=True) if has_more else None
+        else:
+            next_cursor = encode_cursor(last) if has_more else None
+            previous_cursor = encode_cursor(first, backwards=True) if values is not None else None
+        return CursorPage(rows, next_cursor, previous_cursor)
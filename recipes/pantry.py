@@ -0,0 +1,278 @@
+"""Inverted index from ingredient terms to recipes for "cook with what I have".
+
+Every Ingredient row is tagged with a normalized IngredientTerm when it is
+saved. Each process keeps the index in memory as compact sorted integer
+arrays (term id -> recipe ids), so scoring a pantry means counting how often
+each recipe id occurs across the matching posting lists and comparing that
+with the recipe's own term count. No per-request table scans.
+
+Writes publish the changed recipe ids to the database (``PantryChange``)
+under an increasing ``PantryVersion``, so imports, the admin and every worker
+see each other's changes. Before matching, a process compares its copy's
+version with the stored one and patches only the recipes logged since; it
+rebuilds from the database only if it is too far behind and the log entries
+it needs have been pruned.
+"""
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.db import transaction
+
+# Past this many unseen changes a full rebuild is cheaper than patching, so
+# the change log never needs to keep more than this many entries
+MAX_PATCH = 1000
+
+_DESCRIPTORS = {
+    'fresh', 'freshly', 'large', 'small', 'medium', 'chopped', 'diced', 'sliced', 'minced',
+    'grated', 'ground', 'whole', 'softened', 'melted', 'cubed', 'peeled', 'optional', 'ripe',
+    'dried', 'finely', 'roughly', 'to', 'taste', 'of', 'for', 'a', 'an', 'the',
+    # Units, compared after singularizing
+    'cup', 'tbsp', 'tsp', 'tablespoon', 'teaspoon', 'g', 'kg', 'mg', 'ml', 'l', 'oz', 'lb',
+    'pound', 'ounce', 'gram', 'pinch', 'dash', 'can', 'package', 'handful',
+}
+_WORD_RE = re.compile(r'[a-z]+')
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith('ss'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes') or word.endswith(('ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize(name):
+    """Reduce an ingredient name to its vocabulary term, or '' if nothing is left.
+
+    "Tomatoes, diced" -> "tomato"; "Parmesan cheese (grated)" -> "parmesan cheese".
+    """
+    name = re.sub(r'\(.*?\)', ' ', (name or '').lower()).split(',')[0]
+    words = [w for w in map(_singular, _WORD_RE.findall(name)) if w not in _DESCRIPTORS]
+    return ' '.join(words)[:200]
+
+
+def term_for(name):
+    """Return the IngredientTerm for an ingredient name (created on first use)."""
+    from .models import IngredientTerm
+
+    normalized = normalize(name)
+    if not normalized:
+        return None
+    term, _ = IngredientTerm.objects.get_or_create(
+        name=normalized, defaults={'head': normalized.rsplit(' ', 1)[-1][:100]},
+    )
+    return term
+
+
+def terms_for(names):
+    """Bulk ``term_for``: ``{name: IngredientTerm id or None}``, creating missing terms in one insert."""
+    from .models import IngredientTerm
+
+    normalized = {name: normalize(name) for name in names}
+    wanted = set(filter(None, normalized.values()))
+    ids = dict(IngredientTerm.objects.filter(name__in=wanted).values_list('name', 'pk'))
+    missing = wanted - set(ids)
+    if missing:
+        IngredientTerm.objects.bulk_create(
+            [IngredientTerm(name=term, head=term.rsplit(' ', 1)[-1][:100]) for term in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(IngredientTerm.objects.filter(name__in=missing).values_list('name', 'pk'))
+    return {name: ids.get(term) for name, term in normalized.items()}
+
+
+class PantryIndex:
+    """One process's copy of the index.
+
+    Readers never take the lock: the structures are published together as one
+    tuple and never modified afterwards. ``build`` and ``patch`` (serialized by
+    ``lock``) put together new ones, copying only the posting lists a patch
+    touches, and swap the tuple reference.
+    """
+
+    def __init__(self):
+        self.version = None
+        # (term id -> sorted array of recipe ids, recipe id -> tuple of term ids,
+        #  term name -> term id, head word -> tuple of term ids)
+        self.state = ({}, {}, {}, {})
+        self.lock = threading.Lock()
+
+    @property
+    def postings(self):
+        return self.state[0]
+
+    @property
+    def recipe_terms(self):
+        return self.state[1]
+
+    @property
+    def terms(self):
+        return self.state[2]
+
+    @property
+    def heads(self):
+        return self.state[3]
+
+    @staticmethod
+    def _add_terms(terms, heads, rows):
+        for term_id, name, head in rows:
+            if name not in terms:
+                terms[name] = term_id
+                heads[head] = heads.get(head, ()) + (term_id,)
+
+    def build(self, version):
+        from .models import Ingredient, IngredientTerm
+
+        postings, terms, heads, by_recipe = {}, {}, {}, {}
+        self._add_terms(terms, heads, IngredientTerm.objects.values_list('id', 'name', 'head').iterator())
+        pairs = (
+            Ingredient.objects.filter(term__isnull=False)
+            .values_list('term_id', 'recipe_id').distinct().order_by('term_id', 'recipe_id')
+        )
+        for term_id, recipe_id in pairs.iterator(chunk_size=5000):
+            postings.setdefault(term_id, array('q')).append(recipe_id)
+            by_recipe.setdefault(recipe_id, []).append(term_id)
+        recipe_terms = {recipe_id: tuple(ids) for recipe_id, ids in by_recipe.items()}
+        self.state = (postings, recipe_terms, terms, heads)
+        self.version = version
+
+    def patch(self, recipe_ids, version):
+        from .models import Ingredient, IngredientTerm
+
+        current = {}
+        rows = Ingredient.objects.filter(recipe_id__in=recipe_ids, term__isnull=False)
+        for recipe_id, term_id in rows.values_list('recipe_id', 'term_id').distinct():
+            current.setdefault(recipe_id, set()).add(term_id)
+
+        # Shallow copies: untouched posting lists are shared with the published
+        # state, touched ones are copied before they change
+        postings, recipe_terms, terms, heads = (dict(d) for d in self.state)
+        new_term_ids = {t for ids in current.values() for t in ids} - set(terms.values())
+        if new_term_ids:
+            rows = IngredientTerm.objects.filter(pk__in=new_term_ids).values_list('id', 'name', 'head')
+            self._add_terms(terms, heads, rows)
+
+        copied = set()
+
+        def writable(term_id):
+            if term_id not in copied:
+                copied.add(term_id)
+                postings[term_id] = array('q', postings.get(term_id, ()))
+            return postings[term_id]
+
+        for recipe_id in recipe_ids:
+            old = set(recipe_terms.pop(recipe_id, ()))
+            new = current.get(recipe_id, set())
+            for term_id in old - new:
+                if term_id in postings:
+                    posting = writable(term_id)
+                    i = bisect_left(posting, recipe_id)
+                    if i < len(posting) and posting[i] == recipe_id:
+                        del posting[i]
+            for term_id in new - old:
+                insort(writable(term_id), recipe_id)
+            if new:
+                recipe_terms[recipe_id] = tuple(sorted(new))
+        self.state = (postings, recipe_terms, terms, heads)
+        self.version = version
+
+    def sync(self):
+        """Bring this process's copy up to the latest published version."""
+        from .models import PantryChange, PantryVersion
+
+        version = PantryVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            if self.version is None or version < self.version or version - self.version > MAX_PATCH:
+                self.build(version)
+                return
+            changes = list(
+                PantryChange.objects.filter(version__gt=self.version, version__lte=version)
+                .values_list('recipe_id', flat=True)
+            )
+            if len(changes) != version - self.version:
+                self.build(version)
+                return
+            self.patch(set(changes), version)
+
+    @staticmethod
+    def _resolve(pantry_item, terms, heads):
+        normalized = normalize(pantry_item)
+        if not normalized:
+            return set()
+        ids = set(heads.get(normalized, ()))
+        if normalized in terms:
+            ids.add(terms[normalized])
+        return ids
+
+    def resolve(self, pantry_item):
+        """Term ids a pantry entry covers: its exact term plus terms with that head word."""
+        _, _, terms, heads = self.state
+        return self._resolve(pantry_item, terms, heads)
+
+    def match(self, pantry, limit=24, max_missing=None):
+        """Rank recipes by how few ingredients are missing, then by how many match.
+
+        Returns ``[(recipe_id, matched, missing), ...]``.
+        """
+        self.sync()
+        # One snapshot for the whole request, consistent even if a patch lands meanwhile
+        postings, recipe_terms, terms, heads = self.state
+        term_ids = set()
+        for item in pantry:
+            term_ids |= self._resolve(item, terms, heads)
+
+        matched = Counter()
+        for term_id in term_ids:
+            matched.update(postings.get(term_id, ()))
+
+        scored = []
+        for recipe_id, n in matched.items():
+            missing = len(recipe_terms.get(recipe_id, ())) - n
+            if max_missing is None or missing <= max_missing:
+                scored.append((missing, -n, recipe_id))
+        return [(recipe_id, -neg_n, missing) for missing, neg_n, recipe_id in heapq.nsmallest(limit, scored)]
+
+index = PantryIndex()
+
+
+def _publish(recipe_ids):
+    from .models import PantryChange, PantryVersion
+
+    with transaction.atomic():
+        version = PantryVersion.bump(len(recipe_ids))
+        if len(recipe_ids) <= MAX_PATCH:
+            # Larger batches put every reader far enough behind to rebuild anyway
+            first = version - len(recipe_ids) + 1
+            PantryChange.objects.bulk_create(
+                [PantryChange(version=first + i, recipe_id=recipe_id) for i, recipe_id in enumerate(recipe_ids)]
+            )
+        PantryChange.objects.filter(version__lte=version - MAX_PATCH).delete()
+
+
+def recipe_changed(recipe_id):
+    """Publish that a recipe's ingredients changed, once the transaction commits."""
+    transaction.on_commit(lambda: _publish([recipe_id]))
+
+
+def recipes_changed(recipe_ids):
+    """``recipe_changed`` for a batch, published with one version bump."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: _publish(recipe_ids))
+
+
+def parse_pantry(text):
+    """Split user input (commas or new lines) into pantry entries."""
+    return [item.strip() for item in re.split(r'[,\n]', text or '') if item.strip()]
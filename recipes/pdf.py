@@ -0,0 +1,258 @@
+"""Printable recipe PDFs and cookbooks, rendered with reportlab.
+
+Rendered files are cached on disk under ``RECIPE_PDF_CACHE_DIR``, one file
+per document (a recipe, or a user's cookbook). The file name combines the
+document's name with a version hashed from the title plus each recipe's id
+and ``updated_at``. Any edit to a recipe, including its ingredients or
+steps, moves ``updated_at``, so a stale PDF is never served, and writing the
+new version deletes the ones it supersedes. Cache hits are streamed straight
+from the file.
+
+Rendering is CPU-bound, so it is rationed per process:
+
+* at most ``RECIPE_PDF_MAX_CONCURRENT`` renders run at once. A request that
+  cannot get a slot within ``RECIPE_PDF_WAIT_SECONDS`` gets PdfBusy, which
+  the views turn into a 503, instead of queueing behind other work;
+* cookbooks (more than one recipe) are rendered in a worker process, so the
+  web worker's thread only waits on a pipe. Each render has a worker to
+  itself, and up to ``RECIPE_PDF_WORKERS`` idle workers are kept for reuse.
+  Set it to 0 to render in-process. A request whose render is still running
+  after ``RECIPE_PDF_TIMEOUT`` seconds also gets PdfBusy, and that render's
+  worker, and only that one, is stopped so the abandoned render does not
+  keep a process busy.
+
+Worker processes get plain dicts (see ``exporter.record``) and never touch
+the database.
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+# Cookbooks stop at this many recipes
+MAX_COOKBOOK_RECIPES = 200
+
+_idle = []
+_idle_lock = threading.Lock()
+_slots = None
+_slots_lock = threading.Lock()
+
+
+class PdfBusy(Exception):
+    """Every render slot stayed taken for too long; try again later."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cache_dir():
+    return Path(_setting('RECIPE_PDF_CACHE_DIR', settings.BASE_DIR / 'pdf_cache'))
+
+
+def _render_slots():
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(_setting('RECIPE_PDF_MAX_CONCURRENT', 2))
+        return _slots
+
+
+def _serve(conn):
+    """Main loop of a worker process: render each job received on ``conn`` until told to stop."""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            conn.send((render(*job), None))
+        except Exception as exc:
+            conn.send((None, exc))
+
+
+class _Worker:
+    def __init__(self):
+        # spawn, not fork: the web process has threads and open DB connections
+        context = multiprocessing.get_context('spawn')
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        self.process.terminate()
+        self.conn.close()
+
+
+def _checkout():
+    with _idle_lock:
+        while _idle:
+            worker = _idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.stop()
+    return _Worker()
+
+
+def _checkin(worker):
+    with _idle_lock:
+        if len(_idle) < _setting('RECIPE_PDF_WORKERS', 2):
+            _idle.append(worker)
+            return
+    worker.conn.send(None)
+    worker.conn.close()
+
+
+def _render_in_worker(title, recipes, note):
+    worker = _checkout()
+    try:
+        worker.conn.send((title, recipes, note))
+        if not worker.conn.poll(_setting('RECIPE_PDF_TIMEOUT', 120)):
+            raise PdfBusy()
+        content, error = worker.conn.recv()
+    except (EOFError, OSError):
+        # The worker died mid-render
+        worker.stop()
+        raise PdfBusy() from None
+    except PdfBusy:
+        # Abandon the render: stop its worker, which runs nothing else
+        worker.stop()
+        raise
+    _checkin(worker)
+    if error is not None:
+        raise error
+    return content
+
+
+def render(title, recipes, note=''):
+    """PDF bytes for ``recipes`` (dicts from ``exporter.record``), one recipe per page.
+
+    ``note`` is printed under the title on a cookbook's contents page.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import ListFlowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=title, leftMargin=2 * cm, rightMargin=2 * cm,
+                            topMargin=2 * cm, bottomMargin=2 * cm)
+    story = []
+    if len(recipes) > 1:
+        story.append(Paragraph(escape(title), styles['Title']))
+        if note:
+            story.append(Paragraph(escape(note), styles['Italic']))
+        story.append(Spacer(1, 0.5 * cm))
+        story += [Paragraph(f'{n}. {escape(recipe["title"])}', styles['Normal']) for n, recipe in enumerate(recipes, 1)]
+        story.append(PageBreak())
+
+    for n, recipe in enumerate(recipes):
+        if n:
+            story.append(PageBreak())
+        details = (
+            f'Prep {recipe["prep_time"]} min &middot; Cook {recipe["cook_time"]} min &middot; '
+            f'Serves {recipe["servings"]} &middot; {escape(recipe["difficulty"].title())}'
+        )
+        if recipe['dietary_restriction'] != 'none':
+            details += f' &middot; {escape(recipe["dietary_restriction"].title())}'
+        story += [
+            Paragraph(escape(recipe['title']), styles['Title']),
+            Paragraph(f'by {escape(recipe["author"])}', styles['Italic']),
+            Paragraph(details, styles['Normal']),
+            Spacer(1, 0.4 * cm),
+            Paragraph(escape(recipe['description']).replace('\n', '<br/>'), styles['BodyText']),
+            Paragraph('Ingredients', styles['Heading2']),
+            ListFlowable(
+                [Paragraph(escape(f'{i["quantity"]} {i["name"]}'.strip()), styles['BodyText'])
+                 for i in recipe['ingredients']],
+                bulletType='bullet', start='•',
+            ),
+            Paragraph('Instructions', styles['Heading2']),
+            ListFlowable(
+                [Paragraph(escape(step), styles['BodyText']) for step in recipe['instructions']],
+                bulletType='1',
+            ),
+        ]
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _cache_path(name, title, stamps, note):
+    """Path of this version of document ``name``, and the glob matching all of its versions."""
+    document = hashlib.sha256(name.encode()).hexdigest()[:32]
+    parts = [title, note] + [f'{pk}:{updated_at.isoformat()}' for pk, updated_at in stamps]
+    version = hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+    return cache_dir() / document[:2] / f'{document}-{version}.pdf', f'{document}-*.pdf'
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _evict(path, versions):
+    # Responses still streaming an old version keep their open file handle
+    for old in path.parent.glob(versions):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+def _open(path):
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+
+def open_pdf(name, title, recipe_ids, note=''):
+    """The PDF of ``recipe_ids`` (in that order) as an open binary file, rendering it first if needed.
+
+    ``name`` identifies the document across versions (e.g. ``recipe:12``);
+    rendering a new version removes the older ones. The file is opened here
+    rather than by the caller, so a concurrent eviction can't remove it in
+    between. Raises PdfBusy when no render slot frees up in time or a
+    cookbook takes too long.
+    """
+    from . import exporter
+    from .models import Recipe
+
+    updated = dict(Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', 'updated_at'))
+    stamps = [(pk, updated[pk]) for pk in recipe_ids if pk in updated]
+    path, versions = _cache_path(name, title, stamps, note)
+    cached = _open(path)
+    if cached:
+        return cached
+
+    slots = _render_slots()
+    if not slots.acquire(timeout=_setting('RECIPE_PDF_WAIT_SECONDS', 10)):
+        raise PdfBusy()
+    try:
+        cached = _open(path)
+        if cached:
+            # Rendered by another request while this one waited
+            return cached
+        by_id = {recipe.pk: recipe for recipe in exporter.changed_recipes().filter(pk__in=updated)}
+        recipes = [exporter.record(by_id[pk]) for pk, _ in stamps if pk in by_id]
+        if len(recipes) > 1 and _setting('RECIPE_PDF_WORKERS', 2) > 0:
+            content = _render_in_worker(title, recipes, note)
+        else:
+            content = render(title, recipes, note)
+        _write(path, content)
+        _evict(path, versions)
+    finally:
+        slots.release()
+    # Serve from memory if a newer version already replaced this one
+    return _open(path) or BytesIO(content)
@@ -0,0 +1,159 @@
+"""Offline item-item recommendations from favorites and reviews.
+
+``build()`` turns favorites and good reviews into a sparse user x recipe
+matrix. For every recipe it stores its top-K neighbors by cosine similarity
+in RecipeNeighbor. A recipe's row of similarities is one sparse product: walk
+the users who liked it, then those users' recipes. Rows are computed and
+written in batches, so the work is about sum(favorites per user ** 2), never
+recipes ** 2.
+
+Favorite and review writes queue the recipe in RecipeNeighborRefresh. An
+incremental build only recomputes rows that can have changed:
+- the queued recipes;
+- every recipe sharing a user with them, because their norms and dot
+  products moved;
+- every recipe that currently lists one of them as a neighbor.
+
+At request time, ``recommend_for()`` just merges the neighbor lists of the
+user's own favorites.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+NEIGHBORS_PER_RECIPE = 20
+# Users with more liked recipes than this are skipped: they add
+# len(items) ** 2 work and carry little signal per pair
+MAX_ITEMS_PER_USER = 500
+FAVORITE_WEIGHT = 1.0
+# Reviews below this rating don't count as liking the recipe
+MIN_LIKED_RATING = 4
+# Neighbor lists merged per request, newest favorites first
+MAX_SEEDS = 100
+
+
+def mark_changed(recipe_ids):
+    from .models import RecipeNeighborRefresh
+
+    RecipeNeighborRefresh.objects.bulk_create(
+        [RecipeNeighborRefresh(recipe_id=recipe_id) for recipe_id in set(recipe_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def _interactions():
+    """Return ``(user_items, item_users)``: ``{user: {recipe: weight}}`` and its transpose."""
+    from .models import Review, UserProfile
+
+    user_items = defaultdict(dict)
+    favorites = UserProfile.favorite_recipes.through.objects.values_list('userprofile__user_id', 'recipe_id')
+    for user_id, recipe_id in favorites.iterator(chunk_size=5000):
+        user_items[user_id][recipe_id] = FAVORITE_WEIGHT
+    reviews = Review.objects.filter(rating__gte=MIN_LIKED_RATING).values_list('user_id', 'recipe_id', 'rating')
+    for user_id, recipe_id, rating in reviews.iterator(chunk_size=5000):
+        weight = rating / 5
+        if weight > user_items[user_id].get(recipe_id, 0):
+            user_items[user_id][recipe_id] = weight
+
+    item_users = defaultdict(dict)
+    for user_id, items in list(user_items.items()):
+        if len(items) > MAX_ITEMS_PER_USER:
+            del user_items[user_id]
+            continue
+        for recipe_id, weight in items.items():
+            item_users[recipe_id][user_id] = weight
+    return user_items, item_users
+
+
+def _neighbors(recipe_id, user_items, item_users, norms, k):
+    """Top-``k`` ``(score, neighbor_id)`` for one recipe: a sparse row-times-matrix product."""
+    dots = defaultdict(float)
+    for user_id, weight in item_users.get(recipe_id, {}).items():
+        for other_id, other_weight in user_items[user_id].items():
+            if other_id != recipe_id:
+                dots[other_id] += weight * other_weight
+    norm = norms[recipe_id]
+    return heapq.nlargest(k, ((dot / (norm * norms[other_id]), other_id) for other_id, dot in dots.items()))
+
+
+def _affected(changed, item_users, user_items):
+    from .models import RecipeNeighbor
+
+    affected = set(changed)
+    for recipe_id in changed:
+        for user_id in item_users.get(recipe_id, ()):
+            affected.update(user_items[user_id])
+    affected.update(
+        RecipeNeighbor.objects.filter(neighbor_id__in=changed).values_list('recipe_id', flat=True)
+    )
+    return affected
+
+
+def build(full=False, k=NEIGHBORS_PER_RECIPE, batch_size=500):
+    """(Re)build neighbor lists; incrementally from the refresh queue unless ``full``.
+
+    Returns ``{'recipes': rows recomputed, 'neighbors': rows written}``.
+    """
+    from .models import Recipe, RecipeNeighbor, RecipeNeighborRefresh
+
+    # Snapshot the queue first; anything queued during the build stays for next time
+    queued = list(RecipeNeighborRefresh.objects.values_list('recipe_id', flat=True))
+    user_items, item_users = _interactions()
+    norms = {
+        recipe_id: math.sqrt(sum(w * w for w in users.values()))
+        for recipe_id, users in item_users.items()
+    }
+
+    if full:
+        targets = set(Recipe.objects.values_list('pk', flat=True))
+    else:
+        targets = _affected(queued, item_users, user_items)
+    targets = sorted(targets)
+
+    written = 0
+    for start in range(0, len(targets), batch_size):
+        batch = targets[start:start + batch_size]
+        rows = [
+            RecipeNeighbor(recipe_id=recipe_id, neighbor_id=neighbor_id, score=score)
+            for recipe_id in batch if recipe_id in item_users
+            for score, neighbor_id in _neighbors(recipe_id, user_items, item_users, norms, k)
+        ]
+        with transaction.atomic():
+            RecipeNeighbor.objects.filter(recipe_id__in=batch).delete()
+            # Recipes deleted since the matrix was read would break the FK
+            live = set(Recipe.objects.filter(pk__in={r.recipe_id for r in rows} | {r.neighbor_id for r in rows})
+                       .values_list('pk', flat=True))
+            rows = [r for r in rows if r.recipe_id in live and r.neighbor_id in live]
+            RecipeNeighbor.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+
+    RecipeNeighborRefresh.objects.filter(recipe_id__in=queued).delete()
+    return {'recipes': len(targets), 'neighbors': written}
+
+
+def recommend_for(user, limit=6):
+    """Card-ready recipes similar to what ``user`` favorited or rated highly."""
+    from .models import Recipe, RecipeNeighbor, Review, UserProfile
+
+    favorites = list(
+        UserProfile.favorite_recipes.through.objects.filter(userprofile__user=user)
+        .order_by('-pk').values_list('recipe_id', flat=True)[:MAX_SEEDS]
+    )
+    liked = list(
+        Review.objects.filter(user=user, rating__gte=MIN_LIKED_RATING)
+        .order_by('-created_at').values_list('recipe_id', flat=True)[:MAX_SEEDS]
+    )
+    seeds = set(favorites) | set(liked)
+    if not seeds:
+        return []
+
+    scores = defaultdict(float)
+    rows = RecipeNeighbor.objects.filter(recipe_id__in=seeds).values_list('neighbor_id', 'score')
+    for neighbor_id, score in rows:
+        if neighbor_id not in seeds:
+            scores[neighbor_id] += score
+    ids = [pk for pk, _ in heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))]
+    by_id = Recipe.objects.for_cards().in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
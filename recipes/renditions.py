@@ -0,0 +1,195 @@
+"""Resized WebP and JPEG renditions of recipe photos and avatars.
+
+Each image gets fixed-size renditions for where it is shown: ``card`` and
+``header`` for ``Recipe.image``, ``avatar`` for ``UserProfile.avatar``. They
+are stored next to the original, named after the original plus the hash of
+the rendition's own bytes, e.g. ``recipes/soup.card-320.1a2b3c4d5e6f.webp``,
+so a URL never changes meaning and can be cached forever.
+
+What was generated is recorded on the row (``image_renditions`` /
+``avatar_renditions``) together with the original's name, so templates build
+``srcset`` without touching storage, and a replaced image is recognised as
+stale. Generation runs after commit in a small thread pool, never on the
+request thread. It is triggered when an image is saved, and lazily by the
+``{% rendition %}`` tag, which shows the original until the renditions exist.
+``manage.py generate_renditions`` backfills existing media.
+"""
+import hashlib
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Rendition widths per use; ``ratio`` crops to a fixed aspect, None keeps the original's
+SPECS = {
+    'card': {'widths': (320, 640), 'ratio': (4, 3), 'sizes': '(max-width: 600px) 100vw, 320px'},
+    'header': {'widths': (800, 1600), 'ratio': None, 'sizes': '(max-width: 900px) 100vw, 800px'},
+    'avatar': {'widths': (64, 128), 'ratio': (1, 1), 'sizes': '64px'},
+}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+
+# (app_label, model) -> (image field, manifest field, rendition kinds)
+TARGETS = {
+    ('recipes', 'recipe'): ('image', 'image_renditions', ('card', 'header')),
+    ('recipes', 'userprofile'): ('avatar', 'avatar_renditions', ('avatar',)),
+}
+
+_executor = None
+_lock = threading.Lock()
+_queued = set()
+
+
+def _target(instance):
+    return TARGETS[instance._meta.app_label, instance._meta.model_name]
+
+
+def is_current(instance):
+    field, manifest_field, _ = _target(instance)
+    image = getattr(instance, field)
+    return bool(image) and getattr(instance, manifest_field).get('source') == image.name
+
+
+def _resize(image, width, ratio):
+    from PIL import Image, ImageOps
+
+    if ratio is None:
+        height = round(image.height * width / image.width)
+        return image.resize((width, height), Image.Resampling.LANCZOS)
+    return ImageOps.fit(image, (width, round(width * ratio[1] / ratio[0])), Image.Resampling.LANCZOS)
+
+
+def render(field_file, kinds):
+    """Write the renditions of ``field_file`` to its storage and return the manifest."""
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    with field_file.open('rb') as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA'))
+            image = background
+        image = image.convert('RGB')
+
+    stem = posixpath.splitext(field_file.name)[0]
+    manifest = {'source': field_file.name, 'width': image.width, 'height': image.height}
+    for kind in kinds:
+        spec = SPECS[kind]
+        # Never upscale; an image narrower than every width still gets its smallest size
+        widths = [w for w in spec['widths'] if w <= image.width] or [min(spec['widths'][0], image.width)]
+        entry = {}
+        for fmt, pil_format in FORMATS.items():
+            files = []
+            for width in widths:
+                resized = _resize(image, width, spec['ratio'])
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, quality=QUALITY)
+                content = buffer.getvalue()
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                name = f'{stem}.{kind}-{width}.{digest}.{fmt}'
+                save = getattr(storage, 'save_derived', storage.save)
+                name = save(name, ContentFile(content))
+                files.append([width, resized.height, name])
+            entry[fmt] = files
+        manifest[kind] = entry
+    return manifest
+
+
+def _rendition_names(manifest):
+    return {
+        name for kind in SPECS if kind in manifest
+        for files in manifest[kind].values() for _, _, name in files
+    }
+
+
+def refresh(instance):
+    """Regenerate ``instance``'s renditions if they are missing or stale; True if any were written."""
+    from .response_cache import bump_catalog_version
+
+    field, manifest_field, kinds = _target(instance)
+    image = getattr(instance, field)
+    old = getattr(instance, manifest_field) or {}
+    if not image:
+        manifest = {}
+    elif old.get('source') == image.name:
+        return False
+    else:
+        manifest = render(image, kinds)
+
+    updates = {manifest_field: manifest}
+    if any(f.name == 'updated_at' for f in instance._meta.concrete_fields):
+        from django.utils import timezone
+        # Cached recipe fragments and profile headers are keyed by updated_at
+        updates['updated_at'] = timezone.now()
+    type(instance).objects.filter(pk=instance.pk).update(**updates)
+    setattr(instance, manifest_field, manifest)
+    # Renditions of a replaced image go when its last reference does (media.release)
+    transaction.on_commit(bump_catalog_version)
+    return True
+
+
+def _workers():
+    return getattr(settings, 'RECIPE_RENDITION_WORKERS', 2)
+
+
+def _run(label, pk):
+    try:
+        instance = apps.get_model(label).objects.filter(pk=pk).first()
+        if instance is not None:
+            refresh(instance)
+    except Exception:
+        logger.exception('Could not generate renditions for %s %s', label, pk)
+    finally:
+        with _lock:
+            _queued.discard((label, pk))
+        # Pool threads get their own connection; don't leak it
+        connection.close()
+
+
+def schedule(instance):
+    """Generate ``instance``'s renditions in the background once the transaction commits.
+
+    With RECIPE_RENDITION_WORKERS = 0 they are generated inline instead.
+    """
+    global _executor
+    key = (instance._meta.label, instance.pk)
+    if _workers() <= 0:
+        transaction.on_commit(lambda: refresh(instance))
+        return
+    with _lock:
+        if key in _queued:
+            return
+        _queued.add(key)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='renditions')
+    transaction.on_commit(lambda: _executor.submit(_run, *key))
+
+
+def srcsets(instance, kind):
+    """``{'webp': srcset, 'jpeg': srcset, 'src', 'width', 'height', 'sizes'}`` for ``kind``, or None."""
+    field, manifest_field, _ = _target(instance)
+    if not is_current(instance):
+        return None
+    entry = getattr(instance, manifest_field).get(kind)
+    if not entry:
+        return None
+    storage = getattr(instance, field).storage
+    jpeg = entry['jpeg']
+    return {
+        'webp': ', '.join(f'{storage.url(name)} {width}w' for width, _, name in entry['webp']),
+        'jpeg': ', '.join(f'{storage.url(name)} {width}w' for width, _, name in jpeg),
+        'src': storage.url(jpeg[0][2]),
+        'width': jpeg[0][0],
+        'height': jpeg[0][1],
+        'sizes': SPECS[kind]['sizes'],
+    }
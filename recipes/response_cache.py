@@ -0,0 +1,149 @@
+"""Shared caching for anonymous pages and catalog-wide querysets.
+
+Everything cached here is keyed by the catalog generation: the
+``CatalogVersion`` row, which the signal handlers in ``models.py`` bump after
+every committed write to recipes, reviews, categories, ingredients,
+instructions or tags. Bumping it makes every older entry unreachable, so a
+page rendered before a write is never served after it. The generation is
+read *before* a page is rendered, so a render that races a write is stored
+under the old generation and is never read back.
+
+The generation lives in the database rather than the cache so every worker
+process sees the same one, and it is the same value the catalog pages' ETag
+is derived from (see ``conditional.py``): a cached body always matches the
+validator it is served with. It is read once per request.
+"""
+import functools
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+HITS_KEY = 'recipes:response-cache:hits'
+MISSES_KEY = 'recipes:response-cache:misses'
+
+
+def catalog_version(request=None):
+    """The current catalog generation, remembered on ``request`` once read."""
+    from .models import CatalogVersion
+
+    version = getattr(request, '_catalog_version', None)
+    if version is None:
+        version = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+        if request is not None:
+            request._catalog_version = version
+    return version
+
+
+def bump_catalog_version():
+    from .models import CatalogVersion
+
+    CatalogVersion.bump()
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Another process may have created it in between; add() won't clobber it
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    """Return ``{'hits', 'misses', 'hit_rate', 'generation'}`` for the response cache."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'generation': catalog_version(),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _timeout():
+    return getattr(settings, 'RECIPE_RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def normalized_query(request):
+    """The GET parameters as a canonical string: sorted, blanks dropped."""
+    items = [
+        (key, value.strip())
+        for key in sorted(request.GET)
+        for value in sorted(request.GET.getlist(key))
+        if value.strip()
+    ]
+    return urlencode(items)
+
+
+def _response_key(request, generation):
+    signature = f'{request.path}?{normalized_query(request)}'
+    return f'recipes:response:{generation}:{hashlib.sha1(signature.encode()).hexdigest()}'
+
+
+def _cacheable(request):
+    # Pending flash messages are rendered into the page, so those requests
+    # must neither be served from nor stored in the shared cache
+    return (
+        _timeout() > 0
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def cache_anonymous_response(view):
+    """Serve anonymous GETs of ``view`` from the cache, keyed by path and query string.
+
+    Authenticated users always get a freshly rendered page. Sets an
+    ``X-Cache: HIT|MISS`` header on anonymous responses.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = _response_key(request, catalog_version(request))
+        cached = cache.get(key)
+        if cached is not None:
+            _count(HITS_KEY)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(MISSES_KEY)
+        response = view(request, *args, **kwargs)
+        # A page that used a CSRF token is tied to this visitor; don't share it
+        if (response.status_code == 200 and not response.streaming and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+            cache.set(key, (response.content, response['Content-Type']), _timeout())
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def cached_list(request, name, build):
+    """Return ``build()`` as a list, cached per catalog generation under ``name``.
+
+    For catalog-wide sections that are the same for every user, so signed-in
+    pages can share them while still rendering their personalized parts.
+    """
+    if _timeout() <= 0:
+        return list(build())
+    key = f'recipes:list:{catalog_version(request)}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = list(build())
+        cache.set(key, value, _timeout())
+    return value
@@ -0,0 +1,208 @@
+"""Full-text search index for recipes.
+
+SQLite (local/dev) keeps an FTS5 virtual table keyed by recipe id; Postgres
+keeps a separate table of weighted ``tsvector`` documents, one row per recipe,
+behind a GIN index. Both cover the recipe title, description, tags and
+ingredient names and are kept in sync by the save/delete signal handlers in
+``models.py``.
+
+``matching`` filters a recipe queryset to the hits inside the same SQL query,
+so other filters, counts and pagination see every match; ``search_recipe_ids``
+returns only the best-ranked ids and is used for ordering by relevance.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'recipes_recipe_fts'
+POSTGRES_TABLE = 'recipes_recipe_search'
+
+# How many hits are ranked when sorting by relevance; the rest follow unranked
+SEARCH_RESULT_LIMIT = 500
+# Recipes per index_recipes() call when rebuilding
+REINDEX_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def backend(conn=None):
+    """Return 'sqlite', 'postgresql' or None when no index is available."""
+    vendor = (conn or connection).vendor
+    if vendor in ('sqlite', 'postgresql'):
+        return vendor
+    return None
+
+
+def _documents(recipe_ids):
+    """Index documents for ``recipe_ids`` in three queries: ``{recipe_id: doc}``."""
+    from .models import Ingredient, Recipe, RecipeTag
+
+    docs = {
+        pk: {'title': title, 'description': description, 'tags': [], 'ingredients': []}
+        for pk, title, description in Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', 'title', 'description')
+    }
+    tags = RecipeTag.objects.filter(recipe_id__in=docs).order_by('tag__name').values_list('recipe_id', 'tag__name')
+    for recipe_id, name in tags:
+        docs[recipe_id]['tags'].append(name)
+    ingredients = Ingredient.objects.filter(recipe_id__in=docs).values_list('recipe_id', 'name')
+    for recipe_id, name in ingredients:
+        docs[recipe_id]['ingredients'].append(name)
+    for doc in docs.values():
+        doc['tags'] = ' '.join(doc['tags'])
+        doc['ingredients'] = ' '.join(doc['ingredients'])
+    return docs
+
+
+def index_recipe(recipe_id):
+    """(Re)index one recipe, or drop it from the index if it no longer exists."""
+    index_recipes([recipe_id])
+
+
+def index_recipes(recipe_ids):
+    """(Re)index a batch of recipes; ids that no longer exist are dropped from the index."""
+    vendor = backend()
+    if vendor is None:
+        return
+    recipe_ids = list(recipe_ids)
+    docs = _documents(recipe_ids)
+    for recipe_id in set(recipe_ids) - set(docs):
+        remove_recipe(recipe_id)
+    if not docs:
+        return
+
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [[pk] for pk in docs])
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, tags, ingredients) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [[pk, doc['title'], doc['description'], doc['tags'], doc['ingredients']]
+                 for pk, doc in docs.items()],
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (recipe_id, document) VALUES (%s, "
+                "setweight(to_tsvector('english', %s), 'A') || "
+                "setweight(to_tsvector('english', %s), 'B') || "
+                "setweight(to_tsvector('english', %s), 'B') || "
+                "setweight(to_tsvector('english', %s), 'C')) "
+                "ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document",
+                [[pk, doc['title'], doc['tags'], doc['ingredients'], doc['description']]
+                 for pk, doc in docs.items()],
+            )
+
+
+def remove_recipe(recipe_id):
+    vendor = backend()
+    if vendor is None:
+        return
+    table, key = (SQLITE_TABLE, 'rowid') if vendor == 'sqlite' else (POSTGRES_TABLE, 'recipe_id')
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {key} = %s", [recipe_id])
+
+
+def rebuild_index():
+    """Drop every index row and re-index the whole catalog. Returns the row count."""
+    from .models import Recipe
+
+    vendor = backend()
+    if vendor is None:
+        return 0
+    table = SQLITE_TABLE if vendor == 'sqlite' else POSTGRES_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), REINDEX_BATCH_SIZE):
+        index_recipes(recipe_ids[start:start + REINDEX_BATCH_SIZE])
+    return len(recipe_ids)
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+def _sqlite_match(tokens):
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _postgres_query(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def _fallback_matches(tokens):
+    from .models import Recipe
+
+    matches = Recipe.objects.all()
+    for token in tokens:
+        matches = matches.filter(
+            Q(title__icontains=token) |
+            Q(description__icontains=token) |
+            Q(tags__name__icontains=token) |
+            Q(ingredients__name__icontains=token)
+        )
+    return matches
+
+
+def matching(query):
+    """Return a ``Q`` selecting every recipe that matches ``query``.
+
+    Every word must match (prefix match on the last letters typed), in any of
+    title, description, tags or ingredient names. The match runs as a
+    subquery of the caller's query, uncapped.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return Q(pk__in=[])
+
+    vendor = backend()
+    if vendor == 'sqlite':
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [_sqlite_match(tokens)],
+        ))
+    if vendor == 'postgresql':
+        return Q(pk__in=RawSQL(
+            f"SELECT recipe_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('english', %s)",
+            [_postgres_query(tokens)],
+        ))
+    return Q(pk__in=_fallback_matches(tokens).values('pk'))
+
+
+def search_recipe_ids(query, limit=None):
+    """Return the ids of the ``limit`` (default ``SEARCH_RESULT_LIMIT``) best matches for ``query``, best first."""
+    limit = limit or SEARCH_RESULT_LIMIT
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+
+    vendor = backend()
+    if vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 2.0, 5.0, 5.0) LIMIT %s"
+        )
+        params = [_sqlite_match(tokens), limit]
+    elif vendor == 'postgresql':
+        sql = (
+            f"SELECT recipe_id FROM {POSTGRES_TABLE}, to_tsquery('english', %s) query "
+            "WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC LIMIT %s"
+        )
+        params = [_postgres_query(tokens), limit]
+    else:
+        return list(_fallback_matches(tokens).values_list('pk', flat=True).distinct()[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_ordering(ranked_ids):
+    """Order-by expression that keeps rows in the order of ``ranked_ids``, with any other rows after them."""
+    if not ranked_ids:
+        return 'pk'
+    return Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)],
+        default=Value(len(ranked_ids)),
+        output_field=IntegerField(),
+    )
@@ -0,0 +1,115 @@
+"""Favorites and follows, with their denormalized counters.
+
+``Recipe.favorite_count``, ``UserProfile.follower_count`` and
+``UserProfile.following_count`` are kept next to the rows they count, so
+showing them never runs a COUNT over the join table.
+
+The toggles here each write one join-table row:
+
+* unfavoriting/unfollowing is a single DELETE whose row count says whether
+  there was anything to remove,
+* favoriting/following is an INSERT that the unique constraint turns into a
+  no-op when the row already exists.
+
+Counters move with ``F()`` updates in the same transaction, so concurrent
+clicks never lose an increment. The toggles also do what the m2m_changed
+receivers in ``models.py`` do for ``.add()``/``.remove()``: queue recommender
+refreshes and update timelines. Those receivers recount from the join table
+instead, which is exact whatever they were given.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _favorites():
+    from .models import UserProfile
+    return UserProfile.favorite_recipes.through.objects
+
+
+def _follows():
+    # from_userprofile is the followed profile, to_userprofile the follower
+    from .models import UserProfile
+    return UserProfile.followers.through.objects
+
+
+def is_favorite(profile, recipe_id):
+    return _favorites().filter(userprofile_id=profile.pk, recipe_id=recipe_id).exists()
+
+
+def is_following(follower, followed):
+    return _follows().filter(from_userprofile_id=followed.pk, to_userprofile_id=follower.pk).exists()
+
+
+def _insert(manager, **fields):
+    """Insert one join row; False if it already existed."""
+    try:
+        with transaction.atomic():
+            manager.create(**fields)
+    except IntegrityError:
+        return False
+    return True
+
+
+def toggle_favorite(profile, recipe_id):
+    """Favorite ``recipe_id`` for ``profile``, or unfavorite it if it already was. True if now a favorite."""
+    from . import recommendations
+    from .models import Recipe
+
+    with transaction.atomic():
+        removed, _ = _favorites().filter(userprofile_id=profile.pk, recipe_id=recipe_id).delete()
+        if removed:
+            delta, favorited = -removed, False
+        elif _insert(_favorites(), userprofile_id=profile.pk, recipe_id=recipe_id):
+            delta, favorited = 1, True
+        else:
+            return True
+        Recipe.objects.filter(pk=recipe_id).update(favorite_count=F('favorite_count') + delta)
+        recommendations.mark_changed([recipe_id])
+    return favorited
+
+
+def toggle_follow(follower, followed):
+    """Make ``follower`` follow ``followed``, or stop if it already does. True if now following."""
+    from . import timeline
+    from .models import UserProfile
+
+    with transaction.atomic():
+        removed, _ = _follows().filter(from_userprofile_id=followed.pk, to_userprofile_id=follower.pk).delete()
+        if removed:
+            delta, following = -removed, False
+            timeline.trim([(follower.pk, followed.pk)])
+        elif _insert(_follows(), from_userprofile_id=followed.pk, to_userprofile_id=follower.pk):
+            delta, following = 1, True
+            timeline.backfill([(follower.pk, followed.pk)])
+        else:
+            return True
+        UserProfile.objects.filter(pk=followed.pk).update(follower_count=F('follower_count') + delta)
+        UserProfile.objects.filter(pk=follower.pk).update(following_count=F('following_count') + delta)
+    return following
+
+
+def _count(rows, group_field):
+    return Coalesce(Subquery(
+        rows.filter(**{group_field: OuterRef('pk')}).order_by()
+        .values(group_field).annotate(n=Count('*')).values('n')
+    ), Value(0))
+
+
+def recount_favorites(recipe_ids=None):
+    """Recompute ``favorite_count`` from the join table, for ``recipe_ids`` or every recipe."""
+    from .models import Recipe
+
+    recipes = Recipe.objects.all() if recipe_ids is None else Recipe.objects.filter(pk__in=list(recipe_ids))
+    recipes.update(favorite_count=_count(_favorites(), 'recipe_id'))
+
+
+def recount_follows(profile_ids=None):
+    """Recompute follower/following counts from the join table, for ``profile_ids`` or every profile."""
+    from .models import UserProfile
+
+    profiles = UserProfile.objects.all() if profile_ids is None else UserProfile.objects.filter(pk__in=list(profile_ids))
+    profiles.update(
+        follower_count=_count(_follows(), 'from_userprofile_id'),
+        following_count=_count(_follows(), 'to_userprofile_id'),
+    )
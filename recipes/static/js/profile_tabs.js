@@ -0,0 +1,39 @@
+// Profile tabs: the page ships with only the open tab rendered. The other
+// tab's grid is fetched from its fragment URL the first time it is opened.
+// Without JavaScript the tab links reload the page with ?tab=...
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-fragment-url]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    var container = link.closest('.profile-tabs');
+    var name = link.dataset.tab;
+    var panel = container.querySelector('[data-tab-panel="' + name + '"]');
+
+    container.querySelectorAll('[data-tab]').forEach(function (other) {
+        other.className = 'btn ' + (other === link ? 'btn-primary' : 'btn-secondary');
+    });
+    container.querySelectorAll('[data-tab-panel]').forEach(function (other) {
+        other.hidden = other !== panel;
+    });
+    history.replaceState(null, '', '?tab=' + name + '#profile-tabs');
+
+    if (panel.dataset.loaded || panel.children.length) {
+        return;
+    }
+    panel.dataset.loaded = '1';
+    fetch(link.dataset.fragmentUrl, {credentials: 'same-origin'})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            panel.innerHTML = html;
+        })
+        .catch(function () {
+            window.location = link.href;
+        });
+});
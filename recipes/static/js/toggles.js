@@ -0,0 +1,35 @@
+// Favorite/follow buttons: post to the JSON endpoint and update in place
+// instead of reloading the page. Without JavaScript the form posts normally.
+document.addEventListener('submit', function (event) {
+    var form = event.target;
+    var url = form.dataset && form.dataset.toggleUrl;
+    if (!url) {
+        return;
+    }
+    event.preventDefault();
+    var button = form.querySelector('button[type="submit"]');
+    button.disabled = true;
+    fetch(url, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: {'X-Requested-With': 'XMLHttpRequest'},
+        credentials: 'same-origin',
+    }).then(function (response) {
+        if (!response.ok) {
+            throw new Error(response.status);
+        }
+        return response.json();
+    }).then(function (data) {
+        var on = data[form.dataset.toggleState];
+        button.innerHTML = on ? form.dataset.onLabel : form.dataset.offLabel;
+        button.className = on ? 'btn btn-secondary' : 'btn btn-primary';
+        var count = document.querySelector(form.dataset.countTarget);
+        if (count) {
+            count.textContent = data[form.dataset.toggleCount];
+        }
+    }).catch(function () {
+        form.submit();
+    }).finally(function () {
+        button.disabled = false;
+    });
+});
@@ -0,0 +1,63 @@
+"""Helpers for the normalized Tag model: parsing, assignment and the tag cloud."""
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.text import slugify
+
+from .models import Tag
+from .response_cache import catalog_version
+
+# Keyed on the catalog generation, which every tag write bumps
+TAG_CLOUD_KEY = 'recipes:tag-cloud:{}'
+TAG_CLOUD_TIMEOUT = 600
+TAG_CLOUD_SIZE = 30
+
+
+def parse_tags(text):
+    """Split a comma-separated string into normalized, de-duplicated tag names."""
+    names = []
+    seen = set()
+    for raw in (text or '').split(','):
+        name = ' '.join(raw.split()).lower()[:50]
+        slug = slugify(name)
+        if slug and slug not in seen:
+            seen.add(slug)
+            names.append(name)
+    return names
+
+
+def get_or_create_tags(names):
+    """Return Tag objects for `names`, creating missing ones in one bulk insert."""
+    by_slug = {slugify(name): name for name in names}
+    existing = {tag.slug: tag for tag in Tag.objects.filter(slug__in=by_slug)}
+    missing = [Tag(name=name, slug=slug) for slug, name in by_slug.items() if slug not in existing]
+    if missing:
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update({tag.slug: tag for tag in Tag.objects.filter(slug__in=[t.slug for t in missing])})
+    return [existing[slug] for slug in by_slug if slug in existing]
+
+
+def set_recipe_tags(recipe, text):
+    recipe.tags.set(get_or_create_tags(parse_tags(text)))
+
+
+def tag_cloud(request=None):
+    """Most-used tags with their recipe counts and a 1-5 display weight (cached per catalog generation)."""
+    key = TAG_CLOUD_KEY.format(catalog_version(request))
+    cloud = cache.get(key)
+    if cloud is not None:
+        return cloud
+
+    tags = list(
+        Tag.objects.annotate(recipe_count=Count('recipetag'))
+        .filter(recipe_count__gt=0)
+        .order_by('-recipe_count', 'name')[:TAG_CLOUD_SIZE]
+    )
+    cloud = []
+    if tags:
+        low, high = tags[-1].recipe_count, tags[0].recipe_count
+        spread = max(high - low, 1)
+        for tag in sorted(tags, key=lambda t: t.name):
+            weight = 1 + round(4 * (tag.recipe_count - low) / spread)
+            cloud.append({'name': tag.name, 'slug': tag.slug, 'count': tag.recipe_count, 'weight': weight})
+    cache.set(key, cloud, TAG_CLOUD_TIMEOUT)
+    return cloud
@@ -0,0 +1,20 @@
+from django import template
+
+from recipes import renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(instance, kind):
+    """srcset data for ``instance``'s image at ``kind`` (see renditions.srcsets), or None.
+
+    Missing or stale renditions are queued for background generation; the
+    template falls back to the original meanwhile.
+    """
+    data = renditions.srcsets(instance, kind)
+    if data is None and instance.pk is not None:
+        image_field = renditions.TARGETS[instance._meta.app_label, instance._meta.model_name][0]
+        if getattr(instance, image_field):
+            renditions.schedule(instance)
+    return data
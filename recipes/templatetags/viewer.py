@@ -0,0 +1,21 @@
+from django import template
+
+from recipes import viewer
+
+register = template.Library()
+
+
+@register.filter
+def favorited(recipe, request):
+    """``{% if recipe|favorited:request %}``: whether the signed-in user favorited ``recipe``."""
+    if not request or not request.user.is_authenticated:
+        return False
+    return viewer.for_request(request).is_favorite(recipe)
+
+
+@register.filter
+def follows_author(recipe, request):
+    """``{% if recipe|follows_author:request %}``: whether the signed-in user follows ``recipe``'s author."""
+    if not request or not request.user.is_authenticated:
+        return False
+    return viewer.for_request(request).follows_author(recipe)
@@ -1,3 +1,1623 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import IngredientFormSet, InstructionFormSet, UserProfileForm
+from .pagination import CursorPaginator, encode_cursor
+from . import media, pantry, pdf, recommendations, renditions, response_cache, search, social, timeline, trending, view_counts, viewer
+from .models import (
+    CatalogVersion, Category, Ingredient, Instruction, MediaFile, PantryChange, Recipe, RecipeNeighbor, RecipeNeighborRefresh, RecipeViewBucket,
+    RecipeTag, Review, Tag, TimelineEntry, TrendingScore, UserProfile,
+)
+
+
+def make_recipes(author, category, count, start=0):
+    recipes = []
+    for i in range(start, start + count):
+        recipe = Recipe.objects.create(
+            title=f'Recipe {i}', slug=f'recipe-{i}', author=author, category=category,
+            description='A test recipe.', prep_time=10, cook_time=20, difficulty='easy',
+        )
+        for order in range(5):
+            Ingredient.objects.create(recipe=recipe, name=f'Ingredient {order}', quantity='1', order=order)
+        for step in range(1, 4):
+            Instruction.objects.create(recipe=recipe, step_number=step, description=f'Step {step}')
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeCardQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_for_cards_projection(self):
+        make_recipes(self.user, self.category, 1)
+        recipe = Recipe.objects.for_cards().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.ingredient_count, 5)
+            self.assertEqual(recipe.instruction_count, 3)
+            self.assertEqual([i.order for i in recipe.card_ingredients], [0, 1, 2])
+            self.assertEqual([i.step_number for i in recipe.card_instructions], [1, 2])
+            self.assertEqual(recipe.category.name, 'Dinner')
+
+    def test_recipe_list_query_count_is_constant(self):
+        make_recipes(self.user, self.category, 2)
+        small, response = self.count_queries(reverse('recipe_list'))
+        self.assertContains(response, '+2 more')
+
+        make_recipes(self.user, self.category, 10, start=2)
+        large, response = self.count_queries(reverse('recipe_list'))
+        self.assertEqual(len(response.context['recipes']), 12)
+        self.assertEqual(small, large)
+
+    def test_dashboard_query_count_is_constant(self):
+        make_recipes(self.user, self.category, 1)
+        small, _ = self.count_queries(reverse('dashboard'))
+
+        make_recipes(self.user, self.category, 8, start=1)
+        large, _ = self.count_queries(reverse('dashboard'))
+        self.assertEqual(small, large)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        recipes = make_recipes(cls.user, cls.category, 8)
+        moment = timezone.now()
+        for i, recipe in enumerate(recipes):
+            # Pairs of equal sort keys, so every page boundary needs the id tie-break
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created_at=moment - timedelta(hours=i // 2), title=f'Dish {i // 2}',
+                prep_time=i // 2, view_count=i // 2, rating_count=i % 3,
+            )
+
+    def walk(self, ordering, per_page=3):
+        paginator = CursorPaginator(Recipe.objects.all(), ordering, per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.page(backwards[-1].previous_cursor))
+        return pages, backwards
+
+    def test_every_sort_pages_forward_and_back(self):
+        from .views import RECIPE_SORTS
+
+        for sort, ordering in RECIPE_SORTS.items():
+            with self.subTest(sort=sort):
+                expected = list(Recipe.objects.order_by(*ordering).values_list('pk', flat=True))
+                pages, backwards = self.walk(ordering)
+                self.assertEqual([r.pk for page in pages for r in page], expected)
+                self.assertEqual([len(page) for page in pages], [3, 3, 2])
+                # Walking back from the last page revisits the same pages
+                self.assertEqual([[r.pk for r in page] for page in backwards],
+                                 [[r.pk for r in page] for page in reversed(pages)])
+                self.assertFalse(pages[0].has_previous())
+
+    def test_malformed_cursors_give_the_first_page(self):
+        paginator = CursorPaginator(Recipe.objects.all(), ('-created_at', '-id'), 3)
+        first = [r.pk for r in paginator.page()]
+        cursors = ['garbage', encode_cursor([None, None]), encode_cursor([5, 5]), encode_cursor([1]),
+                   encode_cursor(['2024-01-01T00:00:00+00:00', 'abc'])]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual([r.pk for r in paginator.page(cursor)], first)
+
+        self.client.force_login(self.user)
+        for url, cursor in [
+            (reverse('recipe_list') + '?sort=newest', encode_cursor([None, None])),
+            (reverse('recipe_list') + '?sort=newest', encode_cursor([5, 5])),
+            (reverse('recipe_list') + '?sort=fastest', encode_cursor(['abc', 5])),
+            (reverse('feed') + '?', encode_cursor([None, None])),
+        ]:
+            with self.subTest(url=url, cursor=cursor):
+                self.assertEqual(self.client.get(f'{url}&cursor={cursor}').status_code, 200)
+
+
+# Exercises the facet cache underneath the page cache
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.dinner = Category.objects.create(name='Dinner', slug='dinner')
+        cls.dessert = Category.objects.create(name='Dessert', slug='dessert')
+        specs = [
+            (cls.dinner, 'easy', 'vegan', 10),
+            (cls.dinner, 'hard', 'none', 45),
+            (cls.dessert, 'easy', 'keto', 20),
+            (cls.dessert, 'medium', 'vegan', 90),
+        ]
+        for i, (category, difficulty, dietary, prep_time) in enumerate(specs):
+            Recipe.objects.create(
+                title=f'Recipe {i}', slug=f'recipe-{i}', author=cls.user, category=category,
+                description='A test recipe.', prep_time=prep_time, cook_time=5,
+                difficulty=difficulty, dietary_restriction=dietary,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, response, facet):
+        return {option['value']: option['count'] for option in response.context['facets'][facet]}
+
+    def test_counts_match_filtered_results(self):
+        params = {'category': 'dinner', 'difficulty': 'easy'}
+        response = self.client.get(reverse('recipe_list'), params)
+        # A facet's own selection is left out of its counts
+        self.assertEqual(self.counts(response, 'category'), {'dessert': 1, 'dinner': 1})
+        self.assertEqual(self.counts(response, 'difficulty'), {'easy': 1, 'medium': 0, 'hard': 1})
+        self.assertEqual(self.counts(response, 'prep_time')['15'], 1)
+
+        for value, count in self.counts(response, 'difficulty').items():
+            page = self.client.get(reverse('recipe_list'), {**params, 'difficulty': value})
+            self.assertEqual(page.context['recipes'].paginator.count, count)
+
+    def test_counts_are_cached_and_invalidated_on_write(self):
+        url = reverse('recipe_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                title='New', slug='new', author=self.user, category=self.dinner,
+                description='New recipe.', prep_time=1, cook_time=1, difficulty='easy',
+            )
+        with CaptureQueriesContext(connection) as fresh:
+            response = self.client.get(url)
+        self.assertEqual(len(fresh.captured_queries), len(cached.captured_queries) + 1)
+        self.assertEqual(self.counts(response, 'category')['dinner'], 3)
+
+    def test_counts_follow_writes_made_by_other_processes(self):
+        url = reverse('recipe_list')
+        self.assertEqual(self.counts(self.client.get(url), 'category')['dinner'], 2)
+        # Another worker's write: only the database and its CatalogVersion move
+        Recipe.objects.filter(category=self.dessert).update(category=self.dinner)
+        CatalogVersion.bump()
+        self.assertEqual(self.counts(self.client.get(url), 'category')['dinner'], 4)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.dinner = Category.objects.create(name='Dinner', slug='dinner')
+        cls.dessert = Category.objects.create(name='Dessert', slug='dessert')
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, title, category=None):
+        return Recipe.objects.create(
+            title=title, slug=title.lower().replace(' ', '-'), author=self.user,
+            category=category or self.dinner, description='A test recipe.',
+            prep_time=10, cook_time=20, difficulty='easy',
+        )
+
+    def assertFound(self, query, recipe, found=True):
+        (self.assertIn if found else self.assertNotIn)(recipe.pk, search.search_recipe_ids(query))
+        self.assertEqual(Recipe.objects.filter(search.matching(query), pk=recipe.pk).exists(), found)
+
+    def test_index_follows_recipe_ingredient_and_tag_writes(self):
+        recipe = self.create('Tomato soup')
+        self.assertFound('tomato', recipe)
+
+        recipe.title = 'Pumpkin soup'
+        recipe.save()
+        self.assertFound('pumpkin', recipe)
+        self.assertFound('tomato', recipe, found=False)
+
+        saffron = Ingredient.objects.create(recipe=recipe, name='Saffron', quantity='1 pinch')
+        self.assertFound('saffron', recipe)
+        saffron.delete()
+        self.assertFound('saffron', recipe, found=False)
+
+        tag = Tag.objects.create(name='Weeknight', slug='weeknight')
+        recipe.tags.add(tag)
+        self.assertFound('weeknight', recipe)
+        tag.name = 'Holiday'
+        tag.save()
+        self.assertFound('holiday', recipe)
+        self.assertFound('weeknight', recipe, found=False)
+        recipe.tags.remove(tag)
+        self.assertFound('holiday', recipe, found=False)
+        recipe.tags.add(tag)
+        tag.delete()
+        self.assertFound('holiday', recipe, found=False)
+
+        recipe.delete()
+        self.assertEqual(search.search_recipe_ids('pumpkin'), [])
+
+    def test_filters_and_facets_see_matches_past_the_ranking_cap(self):
+        soups = [self.create('Soup one'), self.create('Soup two'), self.create('Soup three', self.dessert)]
+        self.create('Salad')
+        url = reverse('recipe_list')
+        with mock.patch.object(search, 'SEARCH_RESULT_LIMIT', 1):
+            response = self.client.get(url, {'q': 'soup', 'category': 'dinner'})
+            self.assertEqual(response.context['recipes'].paginator.count, 2)
+            counts = {option['value']: option['count'] for option in response.context['facets']['category']}
+            self.assertEqual(counts, {'dessert': 1, 'dinner': 2})
+
+            response = self.client.get(url, {'q': 'soup', 'sort': 'relevance'})
+            ranked = search.search_recipe_ids('soup')
+        shown = [recipe.pk for recipe in response.context['recipes']]
+        self.assertEqual(len(ranked), 1)
+        self.assertEqual(shown[0], ranked[0])
+        self.assertEqual(sorted(shown), sorted(recipe.pk for recipe in soups))
+
+
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class TagFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'pass1234')
+        cls.recipes = make_recipes(author, Category.objects.create(name='Dinner', slug='dinner'), 4)
+        cls.tags = {slug: Tag.objects.create(name=slug, slug=slug) for slug in ('pie', 'pierogi', 'vegan', 'quick')}
+        for recipe, slugs in zip(cls.recipes, [('pie', 'vegan'), ('pierogi', 'vegan'), ('pie', 'quick'), ()]):
+            recipe.tags.add(*[cls.tags[slug] for slug in slugs])
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, *numbers):
+        return {self.recipes[n].pk for n in numbers}
+
+    def with_tags(self, slugs, match_all=False):
+        tag_ids = [self.tags[slug].pk for slug in slugs]
+        return set(Recipe.objects.with_tags(tag_ids, match_all=match_all).values_list('pk', flat=True))
+
+    def listed(self, **params):
+        response = self.client.get(reverse('recipe_list'), params)
+        return {recipe.pk for recipe in response.context['recipes']}
+
+    def test_any_and_all(self):
+        self.assertEqual(self.with_tags(['pie']), self.ids(0, 2))
+        self.assertEqual(self.with_tags(['pie', 'vegan']), self.ids(0, 1, 2))
+        self.assertEqual(self.with_tags(['pie', 'vegan'], match_all=True), self.ids(0))
+        self.assertEqual(self.with_tags(['pie', 'pie'], match_all=True), self.ids(0, 2))
+        self.assertEqual(self.with_tags([]), set())
+
+    def test_list_filters_by_exact_tag(self):
+        # "pie" must not match "pierogi"
+        self.assertEqual(self.listed(tag='pie'), self.ids(0, 2))
+        self.assertEqual(self.listed(tag='pierogi'), self.ids(1))
+        self.assertEqual(self.listed(tag=['pie', 'vegan'], tag_mode='all'), self.ids(0))
+        self.assertEqual(self.listed(tag=['pie', 'vegan']), self.ids(0, 1, 2))
+
+    def test_tag_cloud_follows_writes_made_by_other_processes(self):
+        from .tags import tag_cloud
+
+        self.assertEqual({tag['slug']: tag['count'] for tag in tag_cloud()}['pie'], 2)
+        RecipeTag.objects.create(recipe=self.recipes[3], tag=self.tags['pie'])
+        self.assertEqual({tag['slug']: tag['count'] for tag in tag_cloud()}['pie'], 2)
+        # Another worker's tag write bumps the shared version, not this process's cache
+        CatalogVersion.bump()
+        self.assertEqual({tag['slug']: tag['count'] for tag in tag_cloud()}['pie'], 3)
+
+    def test_unknown_tags(self):
+        self.assertEqual(self.listed(tag='nosuch'), set())
+        self.assertEqual(self.listed(tag=['pie', 'nosuch']), self.ids(0, 2))
+        self.assertEqual(self.listed(tag=['pie', 'nosuch'], tag_mode='all'), set())
+
+
+class TagSplitMigrationTests(TransactionTestCase):
+    before = [('recipes', '0007_tag_recipetag')]
+    after = [('recipes', '0008_split_recipe_tags')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_splits_tag_strings_into_tag_rows(self):
+        apps = self.migrate(self.before)
+        author = apps.get_model('auth', 'User').objects.create(username='author')
+        Recipe = apps.get_model('recipes', 'Recipe')
+        texts = {'pie': 'Pie, Quick  Dinner ,pie', 'pierogi': 'PIEROGI', 'plain': '', 'junk': ' , !!'}
+        for slug, text in texts.items():
+            Recipe.objects.create(
+                title=slug, slug=slug, author=author, description='', prep_time=1, cook_time=1,
+                difficulty='easy', tags_text=text,
+            )
+
+        apps = self.migrate(self.after)
+        Tag = apps.get_model('recipes', 'Tag')
+        RecipeTag = apps.get_model('recipes', 'RecipeTag')
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', 'name')),
+            [('pie', 'pie'), ('pierogi', 'pierogi'), ('quick-dinner', 'quick dinner')],
+        )
+        self.assertEqual(
+            sorted(RecipeTag.objects.values_list('recipe__slug', 'tag__slug')),
+            [('pie', 'pie'), ('pie', 'quick-dinner'), ('pierogi', 'pierogi')],
+        )
+
+        apps = self.migrate(self.before)
+        tags_text = dict(apps.get_model('recipes', 'Recipe').objects.values_list('slug', 'tags_text'))
+        self.assertEqual(tags_text['pie'], 'pie, quick dinner')
+        self.assertEqual(tags_text['pierogi'], 'pierogi')
+
+
+class TotalTimeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        for slug, prep_time, cook_time in [('slow', 5, 100), ('long', 10, 55), ('quick', 30, 25)]:
+            Recipe.objects.create(
+                title=slug.title(), slug=slug, author=user, description='A test recipe.',
+                prep_time=prep_time, cook_time=cook_time, difficulty='easy',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def slugs(self, **params):
+        response = self.client.get(reverse('recipe_list'), params)
+        return [recipe.slug for recipe in response.context['recipes']]
+
+    def test_total_time_is_stored(self):
+        self.assertEqual(Recipe.objects.get(slug='long').total_time, 65)
+
+    def test_filter_uses_the_sum(self):
+        self.assertEqual(self.slugs(total_time_max='60'), ['quick'])
+
+    def test_fastest_sorts_by_the_sum(self):
+        self.assertEqual(self.slugs(sort='fastest'), ['quick', 'long', 'slow'])
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        make_recipes(cls.user, cls.category, 2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_skips_the_view(self):
+        url = reverse('recipe_list')
+        self.assertEqual(self.client.get(url, {'sort': 'title'})['X-Cache'], 'MISS')
+        # Only the conditional-GET validator lookup runs
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'sort': 'title', 'q': ''})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Recipe 1')
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertEqual(response_cache.stats()['misses'], 1)
+
+    def test_write_invalidates_cached_pages(self):
+        url = reverse('dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_recipes(self.user, self.category, 1, start=2)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Recipe 2')
+
+    def test_write_in_another_process_invalidates_cached_pages(self):
+        url = reverse('recipe_list')
+        first = self.client.get(url)
+        # Another worker's write: the row changes, this process's cache does not
+        Recipe.objects.filter(title='Recipe 1').update(title='Renamed elsewhere')
+        CatalogVersion.bump()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed elsewhere')
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_authenticated_users_bypass_page_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('dashboard'))
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('X-Cache', response)
+        self.assertIsNotNone(response.context)
+
+
+@override_settings(RECIPE_VIEW_COUNT_FLUSH_INTERVAL=3600, RECIPE_VIEW_COUNT_FLUSH_THRESHOLD=3)
+class ViewCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.recipe = make_recipes(user, Category.objects.create(name='Dinner', slug='dinner'), 1)[0]
+        cls.url = reverse('recipe_detail', args=[cls.recipe.slug])
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def stored_views(self):
+        return Recipe.objects.values_list('view_count', flat=True).get(pk=self.recipe.pk)
+
+    def test_buffered_views_are_flushed_in_one_batch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+            response = self.client.get(self.url)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(response.context['recipe'].view_count, 1)
+        self.assertEqual(self.stored_views(), 0)
+        self.assertEqual(view_counts.pending(self.recipe.pk), 2)
+
+        # The third view reaches the threshold and writes all three at once
+        self.client.get(self.url)
+        self.assertEqual(self.stored_views(), 3)
+        self.assertEqual(view_counts.pending(), 0)
+        self.assertEqual(RecipeViewBucket.objects.get(recipe=self.recipe).views, 3)
+
+    @override_settings(RECIPE_VIEW_COUNT_MODE='exact')
+    def test_exact_mode_writes_every_view(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(self.stored_views(), 2)
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.viral, cls.steady, cls.old = make_recipes(user, Category.objects.create(name='Dinner', slug='dinner'), 3)
+
+    def setUp(self):
+        cache.clear()
+        self.now = trending.hour_of(timezone.now()) + timedelta(minutes=30)
+
+    def hours_ago(self, hours):
+        return trending.hour_of(self.now - timedelta(hours=hours))
+
+    def test_recent_views_outrank_an_old_spike(self):
+        trending.add_views({
+            (self.viral.pk, self.hours_ago(72)): 100,
+            **{(self.steady.pk, self.hours_ago(h)): 5 for h in range(6)},
+        })
+        trending.refresh(now=self.now)
+        self.assertEqual(trending.top_recipe_ids(2), [self.steady.pk, self.viral.pk])
+
+    def test_incremental_refresh_matches_rebuild(self):
+        trending.add_views({(self.steady.pk, self.hours_ago(3)): 4, (self.steady.pk, self.hours_ago(0)): 2})
+        trending.refresh(now=self.now - timedelta(minutes=20))
+        # More views land in the already-folded open hour
+        trending.add_views({(self.steady.pk, self.hours_ago(0)): 3, (self.old.pk, self.hours_ago(1)): 1})
+        result = trending.refresh(now=self.now)
+        self.assertEqual(result['folded'], 4)
+        incremental = dict(TrendingScore.objects.values_list('pk', 'score'))
+
+        trending.refresh(now=self.now, rebuild=True)
+        rebuilt = dict(TrendingScore.objects.values_list('pk', 'score'))
+        self.assertEqual(incremental.keys(), rebuilt.keys())
+        for pk, score in rebuilt.items():
+            self.assertAlmostEqual(incremental[pk], score)
+
+    def test_folded_old_buckets_are_compacted(self):
+        trending.add_views({(self.old.pk, self.hours_ago(24 * 10)): 50, (self.steady.pk, self.hours_ago(1)): 1})
+        result = trending.refresh(now=self.now)
+        self.assertEqual(result['compacted'], 1)
+        self.assertEqual(list(RecipeViewBucket.objects.values_list('recipe', flat=True)), [self.steady.pk])
+
+    def test_refresh_reaches_processes_that_cached_an_empty_list(self):
+        self.assertEqual(trending.top_recipe_ids(5), [])
+        trending.add_views({(self.viral.pk, self.hours_ago(1)): 3})
+        # The cron process's cache is not this one's; only the database bump is shared
+        with self.captureOnCommitCallbacks(execute=True):
+            trending.refresh(now=self.now)
+        self.assertEqual(trending.top_recipe_ids(5), [self.viral.pk])
+
+    def test_dashboard_reads_precomputed_order(self):
+        trending.add_views({(self.old.pk, self.hours_ago(1)): 9, (self.viral.pk, self.hours_ago(1)): 3})
+        trending.refresh(now=self.now)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual([r.pk for r in response.context['trending']], [self.old.pk, self.viral.pk])
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'pass1234')
+        cls.recipes = make_recipes(author, Category.objects.create(name='Dinner', slug='dinner'), 5)
+        cls.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com', 'pass1234') for i in range(4)]
+        r = cls.recipes
+        cls.users[0].profile.favorite_recipes.add(r[0], r[1])
+        cls.users[1].profile.favorite_recipes.add(r[0], r[1], r[2])
+        cls.users[2].profile.favorite_recipes.add(r[2], r[3])
+        Review.objects.create(recipe=r[3], user=cls.users[2], rating=5)
+        # Low ratings don't count as liking a recipe
+        Review.objects.create(recipe=r[4], user=cls.users[1], rating=1)
+
+    def neighbors(self):
+        return sorted(
+            (recipe_id, neighbor_id, round(score, 6))
+            for recipe_id, neighbor_id, score in RecipeNeighbor.objects.values_list('recipe', 'neighbor', 'score')
+        )
+
+    def test_recommendations_merge_neighbor_lists(self):
+        recommendations.build(full=True)
+        self.assertFalse(RecipeNeighborRefresh.objects.exists())
+        self.users[3].profile.favorite_recipes.add(self.recipes[0])
+        recommended = recommendations.recommend_for(self.users[3])
+        self.assertEqual([r.pk for r in recommended], [self.recipes[1].pk, self.recipes[2].pk])
+
+    def test_incremental_build_matches_full_build(self):
+        recommendations.build(full=True)
+        self.users[2].profile.favorite_recipes.add(self.recipes[0])
+        self.users[0].profile.favorite_recipes.remove(self.recipes[1])
+        result = recommendations.build()
+        self.assertLess(result['recipes'], len(self.recipes))
+        incremental = self.neighbors()
+
+        recommendations.build(full=True)
+        self.assertEqual(incremental, self.neighbors())
+
+    def test_dashboard_shows_recommendations(self):
+        recommendations.build(full=True)
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual([r.pk for r in response.context['recommended']], [self.recipes[2].pk])
+
+
+class PantryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'pass1234')
+        category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipes = {}
+        for slug, names in [
+            ('caprese', ['Tomatoes, diced', 'Fresh basil']),
+            ('sauce', ['Tomatoes', 'Basil', 'Garlic', 'Onion (chopped)']),
+            ('salsa', ['Ripe tomatoes', 'Onion']),
+            ('gratin', ['Potatoes', 'Parmesan cheese (grated)']),
+        ]:
+            recipe = Recipe.objects.create(
+                title=slug.title(), slug=slug, author=author, category=category,
+                description='A test recipe.', prep_time=10, cook_time=20, difficulty='easy',
+            )
+            for order, name in enumerate(names):
+                Ingredient.objects.create(recipe=recipe, name=name, quantity='1', order=order)
+            cls.recipes[slug] = recipe
+
+    def match(self, index, pantry_items, **kwargs):
+        ids = {recipe.pk: slug for slug, recipe in self.recipes.items()}
+        return [(ids[recipe_id], matched, missing) for recipe_id, matched, missing in index.match(pantry_items, **kwargs)]
+
+    def test_normalize(self):
+        self.assertEqual(pantry.normalize('Tomatoes, diced'), 'tomato')
+        self.assertEqual(pantry.normalize('Parmesan cheese (grated)'), 'parmesan cheese')
+        self.assertEqual(pantry.normalize('2 cups of flour'), 'flour')
+        self.assertEqual(pantry.normalize('Peaches'), 'peach')
+        self.assertEqual(pantry.normalize('Glass'), 'glass')
+        self.assertEqual(pantry.normalize('Freshly ground, to taste'), '')
+
+    def test_fewest_missing_first_then_most_matched(self):
+        index = pantry.PantryIndex()
+        self.assertEqual(self.match(index, ['tomatoes', 'basil']), [
+            ('caprese', 2, 0), ('salsa', 1, 1), ('sauce', 2, 2),
+        ])
+        # A head word covers every term ending in it
+        self.assertEqual(self.match(index, ['cheese', 'potato']), [('gratin', 2, 0)])
+
+    def test_max_missing(self):
+        index = pantry.PantryIndex()
+        self.assertEqual(self.match(index, ['tomato', 'basil'], max_missing=1), [('caprese', 2, 0), ('salsa', 1, 1)])
+        self.assertEqual(self.match(index, ['tomato', 'basil'], max_missing=0), [('caprese', 2, 0)])
+
+    def test_writes_elsewhere_are_patched_in(self):
+        index = pantry.PantryIndex()
+        index.sync()
+        built = index.build
+        index.build = lambda version: self.fail('patched changes should not rebuild')
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                Ingredient.objects.create(recipe=self.recipes['salsa'], name='Basil, torn', quantity='1')
+            with self.captureOnCommitCallbacks(execute=True):
+                Ingredient.objects.filter(recipe=self.recipes['sauce'], name='Basil').get().delete()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipes['caprese'].delete()
+            self.assertEqual(self.match(index, ['tomatoes', 'basil']), [
+                ('salsa', 2, 1), ('sauce', 1, 2),
+            ])
+        finally:
+            index.build = built
+        fresh = pantry.PantryIndex()
+        fresh.sync()
+        self.assertEqual(index.recipe_terms, fresh.recipe_terms)
+        self.assertEqual({t: list(ids) for t, ids in index.postings.items() if ids},
+                         {t: list(ids) for t, ids in fresh.postings.items()})
+
+    def test_patches_leave_the_published_state_untouched(self):
+        index = pantry.PantryIndex()
+        index.sync()
+        postings, recipe_terms, terms, heads = before = index.state
+        frozen = ({t: list(ids) for t, ids in postings.items()}, dict(recipe_terms), dict(terms),
+                  {head: tuple(ids) for head, ids in heads.items()})
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(recipe=self.recipes['salsa'], name='Basil', quantity='1')
+            Ingredient.objects.create(recipe=self.recipes['gratin'], name='Nutmeg', quantity='1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.filter(recipe=self.recipes['sauce'], name='Garlic').delete()
+        self.assertEqual(self.match(index, ['tomato', 'basil', 'onion'], max_missing=0), [
+            ('sauce', 3, 0), ('salsa', 3, 0), ('caprese', 2, 0),
+        ])
+        # A reader still holding the old snapshot sees exactly what it saw before
+        self.assertIsNot(index.state, before)
+        self.assertEqual(({t: list(ids) for t, ids in postings.items()}, recipe_terms, terms, heads), frozen)
+
+    def test_rebuilds_when_the_change_log_was_pruned(self):
+        index = pantry.PantryIndex()
+        index.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(recipe=self.recipes['salsa'], name='Basil', quantity='1')
+        PantryChange.objects.all().delete()
+        self.assertEqual(self.match(index, ['tomato', 'basil', 'onion'])[0], ('salsa', 3, 0))
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass1234')
+        cls.chef = User.objects.create_user('chef', 'chef@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.old = make_recipes(cls.chef, cls.category, 2)
+
+    def feed(self):
+        return [r.pk for r in timeline.recent(self.reader, 50)]
+
+    def test_follow_backfills_and_new_recipes_fan_out(self):
+        self.client.force_login(self.reader)
+        self.client.post(reverse('follow_user', args=['chef']))
+        self.assertEqual(sorted(self.feed()), sorted(r.pk for r in self.old))
+
+        new = make_recipes(self.chef, self.category, 1, start=2)[0]
+        self.assertEqual(self.feed()[0], new.pk)
+
+        new.delete()
+        self.assertEqual(len(self.feed()), 2)
+
+        # Following from the other side of the relation works too, and unfollow trims
+        self.client.post(reverse('follow_user', args=['chef']))
+        self.assertEqual(self.feed(), [])
+        self.reader.profile.following.add(self.chef.profile)
+        self.assertEqual(len(self.feed()), 2)
+
+    def test_feed_pages_with_a_cursor(self):
+        self.chef.profile.followers.add(self.reader.profile)
+        make_recipes(self.chef, self.category, 3, start=2)
+        page = timeline.feed_page(self.reader, None, per_page=3)
+        self.assertTrue(page.has_next())
+        rest = timeline.feed_page(self.reader, page.next_cursor, per_page=3)
+        self.assertEqual(len(page) + len(rest), 5)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 5)
+
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(len(response.context['recipes']), 5)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['following_recipes']), 5)
+
+
+class RatingStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass1234')
+        cls.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com', 'pass1234') for i in range(3)]
+        [cls.recipe, cls.other] = make_recipes(cls.author, Category.objects.create(name='Dinner', slug='dinner'), 2)
+
+    def stats(self, recipe=None):
+        return Recipe.objects.values_list('rating_avg', 'rating_count', 'rating_histogram').get(pk=(recipe or self.recipe).pk)
+
+    def test_review_writes_keep_stats_in_step(self):
+        first = Review.objects.create(recipe=self.recipe, user=self.users[0], rating=5)
+        Review.objects.create(recipe=self.recipe, user=self.users[1], rating=3)
+        self.assertEqual(self.stats(), (4.0, 2, [0, 0, 1, 0, 1]))
+
+        # Re-reviewing goes through update_or_create and moves the old rating's bucket
+        self.client.force_login(self.users[0])
+        self.client.post(reverse('add_review', args=[self.recipe.slug]), {'rating': '1', 'comment': 'Changed my mind'})
+        self.assertEqual(self.stats(), (2.0, 2, [1, 0, 1, 0, 0]))
+
+        Review.objects.get(pk=first.pk).delete()
+        self.assertEqual(self.stats(), (3.0, 1, [0, 0, 1, 0, 0]))
+        Review.objects.filter(recipe=self.recipe).delete()
+        self.assertEqual(self.stats(), (0.0, 0, [0, 0, 0, 0, 0]))
+        self.assertEqual(self.stats(self.other), (0.0, 0, [0, 0, 0, 0, 0]))
+
+    def test_out_of_range_ratings_are_rejected(self):
+        Review.objects.create(recipe=self.recipe, user=self.users[1], rating=5)
+        self.client.force_login(self.users[0])
+        url = reverse('add_review', args=[self.recipe.slug])
+        for rating in ['0', '6', '-3', '4.5', 'five', '']:
+            response = self.client.post(url, {'rating': rating, 'comment': 'Hmm'})
+            self.assertEqual(response.status_code, 400, rating)
+        self.assertEqual(Review.objects.filter(recipe=self.recipe).count(), 1)
+        self.assertEqual(self.stats(), (5.0, 1, [0, 0, 0, 0, 1]))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Review.objects.create(recipe=self.recipe, user=self.users[0], rating=7)
+
+    def test_recompute_ratings_repairs_drift(self):
+        for user, rating in zip(self.users, [4, 4, 1]):
+            Review.objects.create(recipe=self.recipe, user=user, rating=rating)
+        Review.objects.create(recipe=self.other, user=self.users[0], rating=5)
+        expected = self.stats()
+        Recipe.objects.filter(pk=self.recipe.pk).update(rating_avg=1.5, rating_count=7, rating_histogram=[7, 0, 0, 0, 0])
+
+        out = StringIO()
+        call_command('recompute_ratings', '--dry-run', stdout=out)
+        self.assertIn('Checked 2 recipes, would update 1', out.getvalue())
+        self.assertEqual(self.stats(), (1.5, 7, [7, 0, 0, 0, 0]))
+
+        out = StringIO()
+        call_command('recompute_ratings', '--batch-size', '1', stdout=out)
+        self.assertIn('updated 1', out.getvalue())
+        self.assertEqual(self.stats(), expected)
+        self.assertEqual(expected, (3.0, 3, [1, 0, 0, 2, 0]))
+        self.assertEqual(self.stats(self.other), (5.0, 1, [0, 0, 0, 0, 1]))
+
+        out = StringIO()
+        call_command('recompute_ratings', stdout=out)
+        self.assertIn('updated 0', out.getvalue())
+
+
+class RecipeDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.recipe = make_recipes(cls.user, Category.objects.create(name='Dinner', slug='dinner'), 1)[0]
+        cls.url = reverse('recipe_detail', args=[cls.recipe.slug])
+        for i in range(12):
+            reviewer = User.objects.create_user(f'reviewer{i}', f'r{i}@example.com', 'pass1234')
+            Review.objects.create(recipe=cls.recipe, user=reviewer, rating=4, comment=f'Review {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # Write buffered views inside this test's transaction
+        view_counts.flush()
+
+    def test_fragments_are_cached_until_the_recipe_changes(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Ingredient 4')
+        self.assertEqual(len(cold.captured_queries) - len(warm.captured_queries), 2)
+        self.assertFalse([q for q in warm.captured_queries if 'recipes_ingredient' in q['sql']])
+
+        ingredient = self.recipe.ingredients.get(order=4)
+        ingredient.name = 'Saffron'
+        ingredient.save()
+        self.assertContains(self.client.get(self.url), 'Saffron')
+
+    def test_header_follows_the_author_name(self):
+        self.assertContains(self.client.get(self.url), 'By cook')
+        etag = self.client.get(self.url)['ETag']
+        # Renaming the user leaves the recipe's updated_at alone
+        User.objects.filter(pk=self.user.pk).update(first_name='Julia', last_name='Child')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'By Julia Child')
+
+    def test_reviews_are_paginated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['reviews']), 10)
+        self.assertContains(response, 'reviews_page=2#reviews')
+        self.assertEqual(response.context['reviews_count'], 12)
+        response = self.client.get(self.url, {'reviews_page': 2})
+        self.assertEqual(len(response.context['reviews']), 2)
+
+    def test_review_pages_follow_the_rows_not_the_stored_count(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(rating_count=30)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['reviews_count'], 12)
+        self.assertEqual(response.context['reviews'].paginator.num_pages, 2)
+        self.assertEqual(len(self.client.get(self.url, {'reviews_page': 3}).context['reviews']), 2)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipe = make_recipes(cls.user, cls.category, 1)[0]
+        CatalogVersion.bump()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_return_304_with_one_query(self):
+        for url in [reverse('recipe_list'), reverse('dashboard'), reverse('recipe_detail', args=[self.recipe.slug])]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertIn('Cookie', response['Vary'])
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(not_modified.status_code, 304)
+
+    def test_catalog_write_changes_the_validators(self):
+        url = reverse('recipe_list')
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_recipes(self.user, self.category, 1, start=1)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_review_changes_the_detail_validators(self):
+        url = reverse('recipe_detail', args=[self.recipe.slug])
+        response = self.client.get(url)
+        review = Review.objects.create(recipe=self.recipe, user=self.user, rating=5, comment='Great')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+        review.comment = 'Even better the second time'
+        review.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_signed_in_pages_are_private_and_unvalidated(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+
+class ImportRecipesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chef = User.objects.create_user('chef', 'chef@example.com', 'pass1234')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass1234')
+        cls.chef.profile.followers.add(cls.reader.profile)
+        cls.category = Category.objects.create(name='Breakfast', slug='breakfast')
+        make_recipes(cls.chef, cls.category, 1)
+        Recipe.objects.filter(slug='recipe-0').update(slug='pancakes')
+
+    def write_source(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w') as f:
+            for row in rows:
+                f.write(row if isinstance(row, str) else json.dumps(row))
+                f.write('\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def row(self, **fields):
+        return {
+            'title': 'Pancakes', 'description': 'Fluffy.', 'author': 'chef', 'category': 'breakfast',
+            'prep_time': 5, 'cook_time': 10, 'difficulty': 'easy', 'tags': ['quick'],
+            'ingredients': [{'quantity': '2 cups', 'name': 'Flour'}, '2 | eggs'],
+            'instructions': ['Mix.', 'Fry.'], **fields,
+        }
+
+    def run_import(self, path, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_recipes', path, '--batch-size', '2', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_writes_everything_the_signals_would(self):
+        path = self.write_source([self.row(), self.row(), '{not json', self.row(difficulty='extreme'), self.row()])
+        self.run_import(path)
+
+        slugs = sorted(Recipe.objects.filter(title='Pancakes').values_list('slug', flat=True))
+        self.assertEqual(slugs, ['pancakes-1', 'pancakes-2', 'pancakes-3'])
+        recipe = Recipe.objects.get(slug='pancakes-1')
+        self.assertEqual(recipe.total_time, 15)
+        self.assertEqual([(i.quantity, i.name, i.term.name) for i in recipe.ingredients.all()],
+                         [('2 cups', 'Flour', 'flour'), ('2', 'eggs', 'egg')])
+        self.assertEqual(list(recipe.instructions.values_list('step_number', flat=True)), [1, 2])
+        self.assertEqual(list(recipe.tags.values_list('name', flat=True)), ['quick'])
+        self.assertIn(recipe.pk, search.search_recipe_ids('eggs'))
+        self.assertIn(recipe.pk, [r.pk for r in timeline.recent(self.reader, 10)])
+
+    def test_dry_run_and_checkpoint_resume(self):
+        path = self.write_source([self.row(title='Waffles') for _ in range(3)])
+        self.run_import(path, '--dry-run')
+        self.assertFalse(Recipe.objects.filter(title='Waffles').exists())
+
+        checkpoint = f'{path}.checkpoint'
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+        with open(checkpoint, 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'position': 2}, f)
+        self.run_import(path, '--checkpoint', checkpoint)
+        self.assertEqual(Recipe.objects.filter(title='Waffles').count(), 1)
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f)['position'], 3)
+
+
+class ExportRecipesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('editor', 'editor@example.com', 'pass1234', is_staff=True)
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipes = make_recipes(cls.cook, cls.category, 5)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_recipes'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        self.client.login(username='cook', password='pass1234')
+        self.assertEqual(self.client.get(reverse('export_recipes')).status_code, 302)
+
+    def test_streams_records_with_a_fixed_number_of_queries(self):
+        self.client.login(username='editor', password='pass1234')
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row['slug'] for row in rows], [r.slug for r in sorted(self.recipes, key=lambda r: r.pk)])
+        self.assertEqual(rows[0]['ingredients'][0], {'quantity': '1', 'name': 'Ingredient 0'})
+        self.assertEqual(rows[0]['instructions'], ['Step 1', 'Step 2', 'Step 3'])
+        # Recipes (with author and category), then one prefetch per relation, plus the session/user lookups
+        self.assertLessEqual(len(queries), 6)
+
+        csv_lines = self.export(format='csv').splitlines()
+        self.assertTrue(csv_lines[0].startswith('id,slug,title'))
+
+    def test_since_includes_recipes_with_new_reviews(self):
+        self.client.login(username='editor', password='pass1234')
+        cutoff = timezone.now() + timedelta(minutes=1)
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(updated_at=cutoff + timedelta(minutes=1))
+        Review.objects.create(recipe=self.recipes[3], user=self.staff, rating=5)
+        Review.objects.filter(recipe=self.recipes[3]).update(updated_at=cutoff + timedelta(minutes=1))
+        Recipe.objects.filter(pk=self.recipes[3].pk).update(updated_at=timezone.now())
+
+        rows = [json.loads(line) for line in self.export(since=cutoff.isoformat()).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.recipes[1].pk, self.recipes[3].pk])
+
+
+class PdfExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipes = make_recipes(cls.cook, cls.category, 3)
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings = override_settings(RECIPE_PDF_CACHE_DIR=cache_dir.name, RECIPE_PDF_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache_dir = cache_dir.name
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return b''.join(response.streaming_content)
+
+    def cached_files(self):
+        return sorted(str(p) for p in Path(self.cache_dir).rglob('*.pdf'))
+
+    def test_recipe_pdf_is_cached_until_the_recipe_changes(self):
+        url = reverse('recipe_pdf', args=[self.recipes[0].slug])
+        self.assertTrue(self.download(url).startswith(b'%PDF'))
+        first = self.cached_files()
+        self.assertEqual(len(first), 1)
+
+        self.download(url)
+        self.assertEqual(self.cached_files(), first)
+
+        # The new version replaces the old file instead of accumulating next to it
+        Ingredient.objects.create(recipe=self.recipes[0], name='Salt', quantity='1 tsp', order=9)
+        self.download(url)
+        second = self.cached_files()
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(second, first)
+
+        self.download(reverse('recipe_pdf', args=[self.recipes[1].slug]))
+        self.assertEqual(len(self.cached_files()), 2)
+
+    def test_download_survives_the_file_being_evicted(self):
+        url = reverse('recipe_pdf', args=[self.recipes[0].slug])
+
+        def evict_everything(path, versions):
+            for old in path.parent.glob(versions):
+                old.unlink()
+
+        # Replaced by a newer version right after being written: served from memory
+        with mock.patch.object(pdf, '_evict', evict_everything):
+            self.assertTrue(self.download(url).startswith(b'%PDF'))
+        self.assertEqual(self.cached_files(), [])
+
+        # Evicted after the cache hit was opened: the open handle still streams it
+        self.download(url)
+        opened = pdf.open_pdf
+
+        def open_then_evict(*args):
+            content = opened(*args)
+            for path in self.cached_files():
+                os.unlink(path)
+            return content
+
+        with mock.patch.object(pdf, 'open_pdf', open_then_evict):
+            self.assertTrue(self.download(url).startswith(b'%PDF'))
+
+    def test_cookbook_of_own_recipes(self):
+        self.client.login(username='cook', password='pass1234')
+        content = self.download(reverse('cookbook_pdf', args=['my-recipes']))
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(self.client.get(reverse('cookbook_pdf', args=['everything'])).status_code, 404)
+
+    def test_truncated_cookbook_says_so(self):
+        self.client.login(username='cook', password='pass1234')
+        url = reverse('cookbook_pdf', args=['my-recipes'])
+        with mock.patch.object(pdf, 'MAX_COOKBOOK_RECIPES', 2), mock.patch.object(pdf, 'render', wraps=pdf.render) as render:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cookbook-Truncated'], '2')
+        (_, recipes, note), _ = render.call_args
+        self.assertEqual([recipe['title'] for recipe in recipes], ['Recipe 2', 'Recipe 1'])
+        self.assertEqual(note, 'Only the 2 most recent recipes are included.')
+
+        response = self.client.get(url)
+        self.assertNotIn('X-Cookbook-Truncated', response)
+
+    @override_settings(RECIPE_PDF_WORKERS=1)
+    def test_timed_out_render_stops_only_its_own_worker(self):
+        self.addCleanup(lambda: [pdf._idle.pop().stop() for _ in list(pdf._idle)])
+        self.client.login(username='cook', password='pass1234')
+        url = reverse('cookbook_pdf', args=['my-recipes'])
+        self.assertTrue(self.download(url).startswith(b'%PDF'))
+        [worker] = pdf._idle
+
+        # Another request's render holds the warm worker while this one times out
+        busy = pdf._checkout()
+        self.assertIs(busy, worker)
+        stuck = mock.Mock()
+        stuck.conn.poll.return_value = False
+        Ingredient.objects.create(recipe=self.recipes[0], name='Salt', quantity='1 tsp', order=9)
+        with mock.patch.object(pdf, '_Worker', return_value=stuck), override_settings(RECIPE_PDF_TIMEOUT=0.01):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        stuck.stop.assert_called_once_with()
+        self.assertTrue(busy.process.is_alive())
+        self.assertEqual(pdf._idle, [])
+
+        pdf._checkin(busy)
+        self.assertTrue(self.download(url).startswith(b'%PDF'))
+        self.assertEqual(pdf._idle, [worker])
+
+    def test_busy_renderer_returns_503(self):
+        slots = pdf._render_slots()
+        while slots.acquire(blocking=False):
+            self.addCleanup(slots.release)
+        with override_settings(RECIPE_PDF_WAIT_SECONDS=0.01):
+            response = self.client.get(reverse('recipe_pdf', args=[self.recipes[1].slug]))
+        self.assertEqual(response.status_code, 503)
+
+
+class BulkFormsetSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        [cls.recipe] = make_recipes(cls.cook, cls.category, 1)
+
+    def post_data(self, edits=None, deletes=(), new=()):
+        ingredients = list(self.recipe.ingredients.order_by('order', 'pk'))
+        data = {
+            'ingredients-TOTAL_FORMS': str(len(ingredients) + len(new)),
+            'ingredients-INITIAL_FORMS': str(len(ingredients)),
+        }
+        for i, ingredient in enumerate(ingredients):
+            data.update({
+                f'ingredients-{i}-id': str(ingredient.pk), f'ingredients-{i}-recipe': str(self.recipe.pk),
+                f'ingredients-{i}-name': (edits or {}).get(i, ingredient.name),
+                f'ingredients-{i}-quantity': ingredient.quantity, f'ingredients-{i}-order': str(ingredient.order),
+            })
+            if i in deletes:
+                data[f'ingredients-{i}-DELETE'] = 'on'
+        for j, name in enumerate(new, start=len(ingredients)):
+            data.update({f'ingredients-{j}-name': name, f'ingredients-{j}-quantity': '1', f'ingredients-{j}-order': str(j)})
+        return data
+
+    def save(self, data):
+        formset = IngredientFormSet(data, instance=self.recipe, prefix='ingredients')
+        self.assertTrue(formset.is_valid(), formset.errors)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            formset.save()
+        return formset, queries
+
+    def test_diff_save_uses_bulk_statements_and_keeps_derived_data(self):
+        before = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        formset, queries = self.save(self.post_data(edits={0: 'Ripe Tomatoes', 1: 'Basil'}, deletes=[2], new=['Garlic']))
+
+        self.assertEqual(len(formset.changed_objects), 2)
+        self.assertEqual(len(formset.deleted_objects), 1)
+        self.assertEqual(len(formset.new_objects), 1)
+        self.assertFalse(Ingredient.objects.filter(pk=formset.deleted_objects[0].pk).exists())
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT INTO "recipes_ingredient"', 'UPDATE "recipes_ingredient"', 'DELETE FROM "recipes_ingredient"'))]
+        self.assertEqual(len(writes), 3)
+
+        names = list(self.recipe.ingredients.order_by('order').values_list('name', 'term__name'))
+        self.assertEqual(names, [('Ripe Tomatoes', 'tomato'), ('Basil', 'basil'), ('Ingredient 3', 'ingredient'),
+                                 ('Ingredient 4', 'ingredient'), ('Garlic', 'garlic')])
+        self.assertIn(self.recipe.pk, search.search_recipe_ids('garlic'))
+        self.assertGreater(Recipe.objects.get(pk=self.recipe.pk).updated_at, before)
+
+    def test_query_count_does_not_grow_with_the_rows_deleted(self):
+        _, one = self.save(self.post_data(deletes=[0], new=['Garlic']))
+        # Terms, the writes, and after_bulk_save's reindex/publish/bump: no per-row work
+        self.assertLessEqual(len(one.captured_queries), 13)
+        _, three = self.save(self.post_data(deletes=[0, 1, 2], new=['Onion']))
+        self.assertEqual(len(three.captured_queries), len(one.captured_queries))
+
+    def test_unchanged_submission_writes_nothing(self):
+        _, queries = self.save(self.post_data())
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].startswith('SELECT')])
+
+
+def png_bytes(size=(1200, 900), color=(200, 80, 40)):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(RECIPE_RENDITION_WORKERS=0, RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class RenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        [cls.recipe] = make_recipes(cls.cook, cls.category, 1)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = Path(media.name)
+
+    def upload(self, recipe, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save('photo.png', ContentFile(content))
+        recipe.refresh_from_db()
+
+    def test_upload_generates_hashed_webp_and_jpeg_sizes(self):
+        self.upload(self.recipe, png_bytes())
+        manifest = self.recipe.image_renditions
+        self.assertEqual(manifest['source'], self.recipe.image.name)
+        self.assertEqual([w for w, _, _ in manifest['card']['webp']], [320, 640])
+        self.assertEqual([(w, h) for w, h, _ in manifest['card']['jpeg']], [(320, 240), (640, 480)])
+        self.assertEqual([w for w, _, _ in manifest['header']['jpeg']], [800])  # never upscaled
+        for kind in ('card', 'header'):
+            for files in manifest[kind].values():
+                for _, _, name in files:
+                    self.assertTrue((self.media / name).exists(), name)
+                    self.assertRegex(name, r'^recipes/[0-9a-f]{2}/[0-9a-f]{64}\.\w+-\d+\.[0-9a-f]{12}\.(webp|jpeg)$')
+
+        html = self.client.get(reverse('recipe_list')).content.decode()
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{manifest['card']['jpeg'][1][2]} 640w", html)
+
+    def test_replacing_the_image_drops_old_renditions(self):
+        self.upload(self.recipe, png_bytes())
+        old = {name for files in self.recipe.image_renditions['card'].values() for _, _, name in files}
+        self.upload(self.recipe, png_bytes(color=(10, 120, 30)))
+        self.assertFalse(any((self.media / name).exists() for name in old))
+        self.assertEqual(self.recipe.image_renditions['source'], self.recipe.image.name)
+
+    def test_backfill_command(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(image='recipes/legacy.png')
+        (self.media / 'recipes').mkdir()
+        (self.media / 'recipes' / 'legacy.png').write_bytes(png_bytes((500, 500)))
+        call_command('generate_renditions', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_renditions['source'], 'recipes/legacy.png')
+
+
+@override_settings(RECIPE_RENDITION_WORKERS=0, RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.first, cls.second = make_recipes(cls.cook, cls.category, 2)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = Path(media_root.name)
+
+    def upload(self, recipe, content, name='photo.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save(name, ContentFile(content))
+        recipe.refresh_from_db()
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_identical_uploads_share_one_file(self):
+        self.upload(self.first, png_bytes(), 'mine.png')
+        self.upload(self.second, png_bytes(), 'yours.PNG')
+        self.assertEqual(self.first.image.name, self.second.image.name)
+        self.assertRegex(self.first.image.name, r'^recipes/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(list((self.media / 'recipes').glob('*/*.png'))), 1)
+        self.assertEqual(self.references(self.first.image.name), 2)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        self.upload(self.first, png_bytes())
+        self.upload(self.second, png_bytes())
+        name = self.first.image.name
+        derived = renditions._rendition_names(self.first.image_renditions)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertTrue((self.media / name).exists())
+        self.assertEqual(self.references(name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.image = None
+            self.second.save()
+        self.assertFalse((self.media / name).exists())
+        self.assertFalse(any((self.media / path).exists() for path in derived))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_hashed_media_is_served_immutable(self):
+        self.upload(self.first, png_bytes())
+        request = RequestFactory().get('/media/')
+        response = media.serve(request, self.first.image.name)
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        (self.media / 'legacy.png').write_bytes(png_bytes())
+        self.assertNotIn('Cache-Control', media.serve(request, 'legacy.png'))
+
+    def test_rehash_command_merges_legacy_duplicates(self):
+        (self.media / 'recipes').mkdir()
+        for name in ('legacy.png', 'copy.png'):
+            (self.media / 'recipes' / name).write_bytes(png_bytes())
+        Recipe.objects.filter(pk=self.first.pk).update(image='recipes/legacy.png')
+        Recipe.objects.filter(pk=self.second.pk).update(image='recipes/copy.png')
+        call_command('rehash_media', '--workers', '2', stdout=StringIO(), stderr=StringIO())
+
+        names = set(Recipe.objects.filter(pk__in=[self.first.pk, self.second.pk]).values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        [name] = names
+        self.assertTrue(media.is_hashed(name))
+        self.assertTrue((self.media / name).exists())
+        self.assertFalse((self.media / 'recipes' / 'legacy.png').exists())
+        self.assertEqual(self.references(name), 2)
+
+
+@override_settings(RECIPE_RENDITION_WORKERS=0, RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class AuditMediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = User.objects.create_user('cook', 'cook@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.good, cls.missing, cls.corrupt, cls.stale = make_recipes(cls.cook, cls.category, 4)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = Path(media_root.name)
+        (self.media / 'recipes').mkdir()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.good.image.save('good.png', ContentFile(png_bytes()))
+            self.missing.image.save('gone.png', ContentFile(png_bytes(color=(1, 2, 3))))
+            self.stale.image.save('stale.png', ContentFile(png_bytes(color=(4, 5, 6))))
+        (self.media / self.missing.image.name).unlink()
+        (self.media / 'recipes' / 'broken.png').write_bytes(b'not an image at all')
+        Recipe.objects.filter(pk=self.corrupt.pk).update(image='recipes/broken.png')
+        self.stale.refresh_from_db()
+        for name in renditions._rendition_names(self.stale.image_renditions):
+            (self.media / name).unlink()
+
+    def audit(self, *args):
+        out = StringIO()
+        call_command('audit_media', '--workers', '4', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_reports_missing_corrupt_and_oversized_files(self):
+        output = self.audit('--max-pixels', '1000000')
+        self.assertIn(f'missing: recipe {self.missing.pk}', output)
+        self.assertIn(f'corrupt: recipe {self.corrupt.pk}', output)
+        self.assertIn(f'oversized: recipe {self.good.pk}', output)  # 1200x900
+        self.assertIn('Checked 4 images', output)
+        self.assertIn('1 missing, 1 corrupt, 2 oversized, 0 renditions', output)
+
+        output = self.audit()
+        self.assertNotIn(f'recipe {self.good.pk} ', output)
+        self.assertIn('1 missing, 1 corrupt, 0 oversized, 1 renditions', output)
+
+    def test_clear_missing_and_regenerate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.audit('--clear-missing', '--regenerate')
+        self.missing.refresh_from_db()
+        self.assertFalse(self.missing.image)
+        self.assertEqual(self.missing.image_renditions, {})
+        self.stale.refresh_from_db()
+        self.assertTrue(all((self.media / name).exists() for name in renditions._rendition_names(self.stale.image_renditions)))
+        self.assertIn('0 missing, 1 corrupt, 0 oversized, 0 renditions', self.audit())
+
+
+class SocialToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass1234')
+        cls.chef = User.objects.create_user('chef', 'chef@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipes = make_recipes(cls.chef, cls.category, 21)
+        cls.recipe = cls.recipes[0]
+
+    def favorite_count(self):
+        return Recipe.objects.values_list('favorite_count', flat=True).get(pk=self.recipe.pk)
+
+    def counts(self, user):
+        return UserProfile.objects.values_list('follower_count', 'following_count').get(user=user)
+
+    def test_favorite_toggle_cost_does_not_grow_with_favorites(self):
+        self.client.force_login(self.reader)
+        url = reverse('toggle_favorite_json', args=[self.recipe.slug])
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.post(url).json(), {'favorited': True, 'favorite_count': 1})
+        self.client.post(url)
+        self.reader.profile.favorite_recipes.add(*self.recipes[1:])
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(url)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(self.favorite_count(), 1)
+
+        response = self.client.post(reverse('toggle_favorite', args=[self.recipe.slug]))
+        self.assertRedirects(response, reverse('recipe_detail', args=[self.recipe.slug]), fetch_redirect_response=False)
+        self.assertEqual(self.favorite_count(), 0)
+        self.assertFalse(self.reader.profile.favorite_recipes.filter(pk=self.recipe.pk).exists())
+
+    def test_json_toggles_are_post_only_and_need_a_login(self):
+        url = reverse('follow_user_json', args=['chef'])
+        self.assertEqual(self.client.post(url).status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(reverse('follow_user_json', args=['reader'])).status_code, 400)
+
+    def test_follow_updates_both_counters_and_the_timeline(self):
+        self.client.force_login(self.reader)
+        url = reverse('follow_user_json', args=['chef'])
+        self.assertEqual(self.client.post(url).json(), {'following': True, 'follower_count': 1})
+        self.assertEqual(self.counts(self.chef), (1, 0))
+        self.assertEqual(self.counts(self.reader), (0, 1))
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 21)
+
+        response = self.client.get(reverse('profile_detail', args=['chef']))
+        self.assertTrue(response.context['is_following'])
+        self.assertContains(response, '<span id="follower-count">1</span>', html=True)
+
+        self.assertEqual(self.client.post(url).json(), {'following': False, 'follower_count': 0})
+        self.assertEqual(self.counts(self.reader), (0, 0))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_m2m_writes_keep_counters_exact(self):
+        profile = self.reader.profile
+        profile.favorite_recipes.add(self.recipe)
+        profile.favorite_recipes.remove(self.recipe)
+        profile.favorite_recipes.remove(self.recipe)
+        self.assertEqual(self.favorite_count(), 0)
+        self.recipe.favorited_by.add(profile)
+        self.assertEqual(self.favorite_count(), 1)
+
+        profile.following.add(self.chef.profile)
+        self.assertEqual(self.counts(self.chef), (1, 0))
+        self.chef.profile.followers.clear()
+        self.assertEqual((self.counts(self.chef), self.counts(self.reader)), ((0, 0), (0, 0)))
+
+    def test_edits_do_not_overwrite_counters(self):
+        def favorite_meanwhile(sender, instance, **kwargs):
+            # Someone favorites, views and reviews the recipe after the edit view loaded it
+            social.toggle_favorite(self.reader.profile, instance.pk)
+            Recipe.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 3)
+            Review.objects.create(recipe_id=instance.pk, user=self.reader, rating=4)
+
+        self.client.force_login(self.chef)
+        data = {
+            'title': 'Renamed', 'description': 'A test recipe.', 'category': self.category.pk,
+            'prep_time': '10', 'cook_time': '20', 'servings': '4', 'difficulty': 'easy', 'tags': '',
+            'ingredients-TOTAL_FORMS': '0', 'ingredients-INITIAL_FORMS': '0',
+            'instructions-TOTAL_FORMS': '0', 'instructions-INITIAL_FORMS': '0',
+        }
+        pre_save.connect(favorite_meanwhile, sender=Recipe)
+        try:
+            response = self.client.post(reverse('edit_recipe', args=[self.recipe.slug]), data)
+        finally:
+            pre_save.disconnect(favorite_meanwhile, sender=Recipe)
+        self.assertEqual(response.status_code, 302)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.title, 'Renamed')
+        self.assertEqual(self.favorite_count(), 1)
+        self.assertEqual(recipe.view_count, 3)
+        self.assertEqual((recipe.rating_avg, recipe.rating_count, recipe.rating_histogram), (4.0, 1, [0, 0, 0, 1, 0]))
+
+        profile = UserProfile.objects.get(user=self.chef)
+        social.toggle_follow(self.reader.profile, profile)
+        form = UserProfileForm({'bio': 'Hello'}, instance=profile, user=self.chef)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(UserProfile.objects.get(user=self.chef).bio, 'Hello')
+        self.assertEqual(self.counts(self.chef), (1, 0))
+
+    def test_deleted_rows_can_be_saved_again(self):
+        recipe = Recipe.objects.get(pk=self.recipes[-1].pk)
+        pk = recipe.pk
+        recipe.delete()
+        recipe.pk = pk
+        recipe.save()
+        self.assertTrue(Recipe.objects.filter(pk=pk).exists())
+
+    def test_logging_in_leaves_the_profile_alone(self):
+        before = UserProfile.objects.values_list('updated_at', flat=True).get(user=self.chef)
+        self.assertTrue(self.client.login(username='chef', password='pass1234'))
+        self.assertEqual(UserProfile.objects.values_list('updated_at', flat=True).get(user=self.chef), before)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=0)
+class ViewerContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass1234')
+        cls.chef = User.objects.create_user('chef', 'chef@example.com', 'pass1234')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.chef_recipes = make_recipes(cls.chef, cls.category, 2)
+        cls.other_recipes = make_recipes(cls.other, cls.category, 1, start=2)
+        social.toggle_follow(cls.reader.profile, cls.chef.profile)
+        social.toggle_favorite(cls.reader.profile, cls.other_recipes[0].pk)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def get(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.content.decode()
+
+    def test_recipe_list_badges_cost_the_same_for_any_page_size(self):
+        small, html = self.get(reverse('recipe_list'))
+        self.assertEqual(html.count('badge-following'), 2)
+        self.assertEqual(html.count('badge-favorite'), 1)
+
+        more = make_recipes(self.chef, self.category, 6, start=3) + make_recipes(self.other, self.category, 3, start=9)
+        for recipe in more[::2]:
+            social.toggle_favorite(self.reader.profile, recipe.pk)
+        large, html = self.get(reverse('recipe_list'))
+        self.assertEqual(html.count('badge-following'), 8)
+        self.assertEqual(html.count('badge-favorite'), 6)
+        self.assertEqual(small, large)
+
+    def test_dashboard_primes_every_section_at_once(self):
+        _, html = self.get(reverse('dashboard'))
+        self.assertIn('badge-following', html)
+        favorites = self.reader.profile.favorite_recipes.through.objects
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('dashboard'))
+        lookups = [q['sql'] for q in ctx.captured_queries if favorites.model._meta.db_table in q['sql']]
+        # recommend_for reads favorites once; the badges add exactly one more
+        self.assertEqual(len(lookups), 2)
+
+    def test_unprimed_lookups_and_anonymous_viewers(self):
+        request = RequestFactory().get('/')
+        request.user = self.reader
+        context = viewer.for_request(request)
+        recipe = Recipe.objects.get(pk=self.other_recipes[0].pk)
+        with self.assertNumQueries(2):
+            self.assertTrue(context.is_favorite(recipe))
+            self.assertFalse(context.follows_author(recipe))
+            self.assertTrue(context.is_favorite(recipe))
+        self.assertIs(viewer.for_request(request), context)
+
+        from django.contrib.auth.models import AnonymousUser
+        request.user, request._viewer_context = AnonymousUser(), None
+        with self.assertNumQueries(0):
+            viewer.prime(request, [recipe])
+            self.assertFalse(viewer.for_request(request).is_favorite(recipe))
+
+
+class ProfilePageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass1234')
+        cls.chef = User.objects.create_user('chef', 'chef@example.com', 'pass1234')
+        cls.category = Category.objects.create(name='Dinner', slug='dinner')
+        cls.recipes = make_recipes(cls.chef, cls.category, 3)
+        for recipe in cls.recipes:
+            social.toggle_favorite(cls.chef.profile, recipe.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_only_one_page_of_the_open_tab_is_rendered(self):
+        url = reverse('profile_detail', args=['chef'])
+        few, response = self.get(url)
+        self.assertEqual(len(response.context['tab_page']), 3)
+
+        more = make_recipes(self.chef, self.category, 27, start=3)
+        for recipe in more:
+            social.toggle_favorite(self.chef.profile, recipe.pk)
+        cache.clear()
+        many, response = self.get(url)
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['tab_page']), 12)
+        self.assertContains(response, 'data-tab-panel="favorites" hidden')
+        self.assertEqual(response.content.decode().count('class="recipe-card"'), 12)
+
+        _, response = self.get(f'{url}?tab=favorites&favorites_page=3')
+        # Most recently favorited first
+        self.assertEqual([r.pk for r in response.context['tab_page']], [r.pk for r in (self.recipes + more)[5::-1]])
+        self.assertContains(response, '?tab=favorites&favorites_page=2#profile-tabs')
+
+    def test_tab_fragment(self):
+        _, response = self.get(reverse('profile_tab', args=['chef', 'favorites']))
+        html = response.content.decode()
+        self.assertNotIn('<html', html)
+        self.assertEqual(html.count('class="recipe-card"'), 3)
+        self.assertEqual(self.client.get(reverse('profile_tab', args=['chef', 'reviews'])).status_code, 404)
+
+    def test_header_is_cached_until_the_profile_changes(self):
+        url = reverse('profile_detail', args=['chef'])
+        UserProfile.objects.filter(user=self.chef).update(bio='First bio')
+        self.assertContains(self.client.get(url), 'First bio')
+        UserProfile.objects.filter(user=self.chef).update(bio='Unsaved bio')
+        self.assertContains(self.client.get(url), 'First bio')
+
+        profile = UserProfile.objects.get(user=self.chef)
+        profile.bio = 'Saved bio'
+        profile.save()
+        self.assertContains(self.client.get(url), 'Saved bio')
+
+        social.toggle_follow(self.reader.profile, profile)
+        self.assertContains(self.client.get(url), '<span id="follower-count">1</span>', html=True)
@@ -0,0 +1,108 @@
+"""Materialized "from people you follow" feeds.
+
+Each follower gets a TimelineEntry per recipe, so reading a feed is one range
+scan over (user, -created_at, -id) instead of ``author_id IN (...)`` sorted
+across every followed author. Rows are written by the signal handlers in
+``models.py``:
+
+* a new recipe is fanned out to every follower of its author,
+* following someone backfills their most recent recipes,
+* unfollowing removes that author's entries; deleted recipes cascade.
+"""
+from django.db.models import Q
+
+from .pagination import CursorPaginator
+
+# How many of an author's recipes a new follower gets in their feed
+BACKFILL_SIZE = 100
+BATCH_SIZE = 1000
+
+
+def _write(entries):
+    from .models import TimelineEntry
+
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Add ``recipe`` to the timeline of everyone following its author."""
+    fan_out_many([recipe])
+
+
+def fan_out_many(recipes):
+    """``fan_out`` for a batch of recipes, reading each author's followers once."""
+    from .models import TimelineEntry, UserProfile
+
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe)
+    for author_id, authored in by_author.items():
+        followers = UserProfile.objects.filter(following__user_id=author_id).values_list('user_id', flat=True)
+        _write(
+            TimelineEntry(user_id=user_id, recipe_id=recipe.pk, author_id=author_id, created_at=recipe.created_at)
+            for user_id in followers.iterator(chunk_size=BATCH_SIZE)
+            for recipe in authored
+        )
+
+
+def _user_pairs(pairs):
+    """Map ``(follower_profile_id, followed_profile_id)`` pairs to user id pairs."""
+    from .models import UserProfile
+
+    profile_ids = {pk for pair in pairs for pk in pair}
+    users = dict(UserProfile.objects.filter(pk__in=profile_ids).values_list('pk', 'user_id'))
+    return [(users[a], users[b]) for a, b in pairs if a in users and b in users]
+
+
+def backfill(pairs):
+    """Give each follower the followed author's most recent recipes."""
+    from .models import Recipe, TimelineEntry
+
+    by_author = {}
+    for follower_id, author_id in _user_pairs(pairs):
+        by_author.setdefault(author_id, []).append(follower_id)
+    for author_id, follower_ids in by_author.items():
+        recent = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-created_at', '-id').values_list('pk', 'created_at')[:BACKFILL_SIZE]
+        )
+        _write(
+            TimelineEntry(user_id=follower_id, recipe_id=recipe_id, author_id=author_id, created_at=created_at)
+            for follower_id in follower_ids
+            for recipe_id, created_at in recent
+        )
+
+
+def trim(pairs):
+    """Remove the unfollowed authors' recipes from the followers' timelines."""
+    from .models import TimelineEntry
+
+    condition = Q()
+    for follower_id, author_id in _user_pairs(pairs):
+        condition |= Q(user_id=follower_id, author_id=author_id)
+    if condition:
+        TimelineEntry.objects.filter(condition).delete()
+
+
+def _cards(entries):
+    from .models import Recipe
+
+    by_id = Recipe.objects.for_cards().in_bulk([entry.recipe_id for entry in entries])
+    return [by_id[entry.recipe_id] for entry in entries if entry.recipe_id in by_id]
+
+
+def recent(user, limit):
+    """The newest ``limit`` recipes in ``user``'s feed, ready for recipe cards."""
+    from .models import TimelineEntry
+
+    return _cards(TimelineEntry.objects.filter(user=user).order_by('-created_at', '-id')[:limit])
+
+
+def feed_page(user, cursor, per_page):
+    """A keyset page of ``user``'s feed whose items are recipes ready for cards."""
+    from .models import TimelineEntry
+
+    entries = TimelineEntry.objects.filter(user=user).only('id', 'recipe_id', 'created_at')
+    page = CursorPaginator(entries, ('-created_at', '-id'), per_page).page(cursor)
+    page.object_list = _cards(page.object_list)
+    return page
@@ -0,0 +1,175 @@
+"""Time-decayed trending scores built from hourly view buckets.
+
+``recipe_detail`` views land in RecipeViewBucket rows (one per recipe per
+hour), written in batches by ``view_counts``. ``refresh()`` (run by
+``manage.py update_trending``) folds the views added since the last run into
+TrendingScore, where a view that is ``h`` hours old is worth
+``0.5 ** (h / half_life)``:
+
+* every stored score is decayed to the new ``as_of`` time in one UPDATE,
+* each bucket adds its unfolded views, weighted by the bucket's age, and
+  remembers how many it has folded, so the open hour can be folded again
+  later without double counting,
+* buckets older than the retention window are deleted, and scores that
+  decayed to nothing are dropped.
+
+The top of the table is cached for a few minutes, keyed by the database
+CatalogVersion that ``refresh()`` bumps. Every web process therefore sees a
+refresh made by the cron process on its next read, even with a per-process
+cache, and the dashboard never sorts the recipes table to find what is
+trending.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .response_cache import bump_catalog_version
+
+TRENDING_KEY = 'recipes:trending'
+TRENDING_SIZE = 50
+# Bounds how long a process can miss a refresh whose version bump it didn't see
+TRENDING_CACHE_TIMEOUT = 300
+# Scores below this are indistinguishable from never viewed
+MIN_SCORE = 0.01
+
+
+def _half_life_hours():
+    return getattr(settings, 'RECIPE_TRENDING_HALF_LIFE_HOURS', 24)
+
+
+def _retention():
+    return timedelta(days=getattr(settings, 'RECIPE_TRENDING_RETENTION_DAYS', 7))
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def decay(hours):
+    return 0.5 ** (hours / _half_life_hours())
+
+
+def add_views(counts):
+    """Add ``{(recipe_id, hour): views}`` to the hourly buckets.
+
+    Missing buckets are created empty first, then incremented with one
+    ``F('views') + n`` UPDATE per (hour, n), so concurrent writers never lose
+    each other's counts.
+    """
+    from .models import Recipe, RecipeViewBucket
+
+    if not counts:
+        return
+    groups = defaultdict(list)
+    for (recipe_id, hour), n in counts.items():
+        groups[hour, n].append(recipe_id)
+    with transaction.atomic():
+        existing = set(Recipe.objects.filter(pk__in={recipe_id for recipe_id, _ in counts})
+                       .values_list('pk', flat=True))
+        RecipeViewBucket.objects.bulk_create(
+            [RecipeViewBucket(recipe_id=recipe_id, hour=hour)
+             for recipe_id, hour in counts if recipe_id in existing],
+            ignore_conflicts=True,
+        )
+        for (hour, n), recipe_ids in groups.items():
+            RecipeViewBucket.objects.filter(recipe_id__in=recipe_ids, hour=hour).update(views=F('views') + n)
+
+
+def refresh(now=None, rebuild=False):
+    """Fold new views into TrendingScore; the cached top recipes move to a new key.
+
+    With ``rebuild`` the scores are recomputed from every retained bucket.
+    Returns ``{'folded', 'scored', 'compacted'}`` counts.
+    """
+    from .models import RecipeViewBucket, TrendingScore
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        if rebuild:
+            TrendingScore.objects.all().delete()
+            RecipeViewBucket.objects.update(folded_views=0)
+
+        last = TrendingScore.objects.aggregate(as_of=Max('as_of'))['as_of']
+        if last is not None:
+            factor = decay((now - last).total_seconds() / 3600)
+            TrendingScore.objects.update(score=F('score') * factor, as_of=now)
+
+        buckets = list(
+            RecipeViewBucket.objects.select_for_update()
+            .filter(views__gt=F('folded_views'))
+            .values_list('pk', 'recipe_id', 'hour', 'views', 'folded_views')
+        )
+        added = defaultdict(float)
+        for _, recipe_id, hour, views, folded in buckets:
+            # Views are dated to the middle of their hour. Inside the open hour
+            # that can be slightly in the future, which keeps folding exact
+            age = (now - hour).total_seconds() / 3600 - 0.5
+            added[recipe_id] += (views - folded) * decay(age)
+
+        scores = {s.pk: s for s in TrendingScore.objects.filter(pk__in=added)}
+        new = []
+        for recipe_id, value in added.items():
+            if recipe_id in scores:
+                scores[recipe_id].score += value
+            else:
+                new.append(TrendingScore(recipe_id=recipe_id, score=value, as_of=now))
+        TrendingScore.objects.bulk_update(scores.values(), ['score'], batch_size=500)
+        TrendingScore.objects.bulk_create(new, batch_size=500)
+        RecipeViewBucket.objects.bulk_update(
+            [RecipeViewBucket(pk=pk, folded_views=views) for pk, _, _, views, _ in buckets],
+            ['folded_views'], batch_size=500,
+        )
+
+        TrendingScore.objects.filter(score__lt=MIN_SCORE).delete()
+        compacted, _ = RecipeViewBucket.objects.filter(
+            hour__lt=hour_of(now) - _retention(), views=F('folded_views'),
+        ).delete()
+
+    # The dashboard shows the new order, so cached and validated pages are
+    # stale; the bump also moves top_recipe_ids() to a new cache key
+    transaction.on_commit(bump_catalog_version)
+    return {
+        'folded': sum(views - folded for _, _, _, views, folded in buckets),
+        'scored': len(added),
+        'compacted': compacted,
+    }
+
+
+def _cache_key():
+    from .models import CatalogVersion
+
+    version = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+    return f'{TRENDING_KEY}:{version}'
+
+
+def top_recipe_ids(limit):
+    """Ids of the ``limit`` most trending recipes, from the cache or the score table."""
+    from .models import TrendingScore
+
+    key = _cache_key()
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(TrendingScore.objects.order_by('-score', 'pk').values_list('pk', flat=True)[:TRENDING_SIZE])
+        cache.set(key, ids, TRENDING_CACHE_TIMEOUT)
+    return ids[:limit]
+
+
+def trending_recipes(limit):
+    """Card-ready recipes in trending order.
+
+    Until ``update_trending`` has produced any scores this falls back to the
+    most viewed recipes of the last 30 days.
+    """
+    from .models import Recipe
+
+    ids = top_recipe_ids(limit)
+    if not ids:
+        since = timezone.now() - timedelta(days=30)
+        return list(Recipe.objects.for_cards().filter(created_at__gte=since).order_by('-view_count')[:limit])
+    by_id = Recipe.objects.for_cards().in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
@@ -6,19 +6,27 @@ urlpatterns = [
     path('', views.dashboard, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('recipes/', views.recipe_list, name='recipe_list'),
+    path('cook/', views.pantry_search, name='pantry_search'),
     path('recipe/<slug:slug>/', views.recipe_detail, name='recipe_detail'),
     path('recipe/<slug:slug>/review/', views.add_review, name='add_review'),
     path('recipe/<slug:slug>/favorite/', views.toggle_favorite, name='toggle_favorite'),
+    path('recipe/<slug:slug>/favorite.json', views.toggle_favorite_json, name='toggle_favorite_json'),
     path('recipe/<slug:slug>/edit/', views.edit_recipe, name='edit_recipe'),
     path('recipe/<slug:slug>/delete/', views.delete_recipe, name='delete_recipe'),
+    path('recipe/<slug:slug>/pdf/', views.recipe_pdf, name='recipe_pdf'),
     
     path('add-recipe/', views.add_recipe, name='add_recipe'),
     path('my-recipes/', views.my_recipes, name='my_recipes'),
+    path('feed/', views.feed, name='feed'),
+    path('cookbook/<slug:source>/pdf/', views.cookbook_pdf, name='cookbook_pdf'),
+    path('export/recipes/', views.export_recipes, name='export_recipes'),
     
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/<str:username>/follow/', views.follow_user, name='follow_user'),
+    path('profile/<str:username>/follow.json', views.follow_user_json, name='follow_user_json'),
+    path('profile/<str:username>/tab/<slug:tab>/', views.profile_tab, name='profile_tab'),
     path('profile/<str:username>/', views.profile_view, name='profile_detail'),
     path('profile/', views.profile_view, name='profile'),
 ]
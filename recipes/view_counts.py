@@ -0,0 +1,130 @@
+"""Recipe view counting without a write per page view.
+
+In ``exact`` mode every view is an ``UPDATE ... SET view_count = view_count + 1``.
+In ``buffered`` mode (the default) views accumulate in a per-process counter
+and are written in one batch, grouped by increment, with
+``F('view_count') + n``. A flush happens when the buffer holds
+``RECIPE_VIEW_COUNT_FLUSH_THRESHOLD`` views, when a view arrives more than
+``RECIPE_VIEW_COUNT_FLUSH_INTERVAL`` seconds after the last flush, from a
+background timer once the process goes quiet, and when the worker exits.
+Counts buffered by a process that is killed outright are lost, which is
+acceptable for a popularity signal.
+
+Each flush also adds the views to the hourly buckets behind the trending
+scores (see ``trending``), in the same transaction.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import trending
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_timer = None
+
+
+def _mode():
+    return getattr(settings, 'RECIPE_VIEW_COUNT_MODE', 'buffered')
+
+
+def _interval():
+    return getattr(settings, 'RECIPE_VIEW_COUNT_FLUSH_INTERVAL', 30)
+
+
+def _threshold():
+    return getattr(settings, 'RECIPE_VIEW_COUNT_FLUSH_THRESHOLD', 100)
+
+
+def record_view(recipe_id):
+    """Count one view of ``recipe_id`` according to RECIPE_VIEW_COUNT_MODE."""
+    from .models import Recipe
+
+    hour = trending.hour_of(timezone.now())
+    if _mode() == 'exact':
+        with transaction.atomic():
+            Recipe.objects.filter(pk=recipe_id).update(view_count=F('view_count') + 1)
+            trending.add_views({(recipe_id, hour): 1})
+        return
+
+    with _lock:
+        _pending[recipe_id, hour] += 1
+        due = (
+            sum(_pending.values()) >= _threshold()
+            or time.monotonic() - _last_flush >= _interval()
+        )
+        if not due:
+            _schedule()
+    if due:
+        flush()
+
+
+def pending(recipe_id=None):
+    """Views buffered in this process, for one recipe or in total."""
+    with _lock:
+        return sum(n for (pending_id, _), n in _pending.items() if recipe_id in (None, pending_id))
+
+
+def flush():
+    """Write buffered views to the database. Returns the number of views written."""
+    from .models import Recipe
+
+    global _last_flush
+    with _lock:
+        counts = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not counts:
+        return 0
+
+    per_recipe = Counter()
+    for (recipe_id, _), n in counts.items():
+        per_recipe[recipe_id] += n
+    by_increment = defaultdict(list)
+    for recipe_id, n in per_recipe.items():
+        by_increment[n].append(recipe_id)
+    try:
+        with transaction.atomic():
+            for n, recipe_ids in by_increment.items():
+                Recipe.objects.filter(pk__in=recipe_ids).update(view_count=F('view_count') + n)
+            trending.add_views(counts)
+    except DatabaseError:
+        logger.exception('Could not flush %d buffered recipe views; keeping them for the next flush',
+                         sum(counts.values()))
+        with _lock:
+            _pending.update(counts)
+        return 0
+    return sum(counts.values())
+
+
+def _timer_flush():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    finally:
+        # Timer threads get their own connection; don't leak it
+        connection.close()
+
+
+def _schedule():
+    """Start the idle-flush timer if none is running. Call with ``_lock`` held."""
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(_interval(), _timer_flush)
+        _timer.daemon = True
+        _timer.start()
+
+
+atexit.register(flush)
@@ -0,0 +1,73 @@
+"""What the signed-in user has done to the recipes on a page.
+
+Cards show whether the viewer favorited each recipe and follows its author.
+Looking that up per card would cost two queries a card. Instead the view
+hands every recipe on the page to ``prime()``, which answers for all of them
+with one query per question. Templates read the answers with the
+``favorited``/``follows_author`` filters from ``templatetags/viewer.py``. A
+recipe that wasn't primed is looked up on its own, so a missed ``prime()``
+costs queries, not correctness.
+
+The context lives on the request, so everything on one page shares it.
+Anonymous viewers never query.
+"""
+
+
+class ViewerContext:
+    def __init__(self, user):
+        self.user = user
+        self.favorite_ids = set()
+        self.followed_author_ids = set()
+        self._known_recipes = set()
+        self._known_authors = set()
+
+    def prime(self, *groups):
+        """Look up favorites and follows for every recipe in ``groups`` (iterables of recipes)."""
+        if not self.user.is_authenticated:
+            return
+        from .models import UserProfile
+
+        recipes = [recipe for group in groups if group for recipe in group]
+
+        recipe_ids = {recipe.pk for recipe in recipes} - self._known_recipes
+        if recipe_ids:
+            self.favorite_ids.update(
+                UserProfile.favorite_recipes.through.objects
+                .filter(userprofile__user_id=self.user.pk, recipe_id__in=recipe_ids)
+                .values_list('recipe_id', flat=True)
+            )
+            self._known_recipes |= recipe_ids
+
+        author_ids = {recipe.author_id for recipe in recipes} - self._known_authors - {self.user.pk}
+        if author_ids:
+            # from_userprofile is the followed profile, to_userprofile the follower
+            self.followed_author_ids.update(
+                UserProfile.followers.through.objects
+                .filter(to_userprofile__user_id=self.user.pk, from_userprofile__user_id__in=author_ids)
+                .values_list('from_userprofile__user_id', flat=True)
+            )
+            self._known_authors |= author_ids
+
+    def is_favorite(self, recipe):
+        if recipe.pk not in self._known_recipes:
+            self.prime([recipe])
+        return recipe.pk in self.favorite_ids
+
+    def follows_author(self, recipe):
+        if recipe.author_id == self.user.pk:
+            return False
+        if recipe.author_id not in self._known_authors:
+            self.prime([recipe])
+        return recipe.author_id in self.followed_author_ids
+
+
+def for_request(request):
+    """The request's ViewerContext, created on first use."""
+    viewer = getattr(request, '_viewer_context', None)
+    if viewer is None:
+        viewer = request._viewer_context = ViewerContext(request.user)
+    return viewer
+
+
+def prime(request, *groups):
+    for_request(request).prime(*groups)
@@ -1,18 +1,74 @@
+from functools import wraps
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.db.models import Avg, Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
 from .models import Recipe, Category, Review, UserProfile, Ingredient, Instruction
+from . import exporter, facets, pantry, pdf, search, social, timeline, view_counts, viewer
+from .models import Tag
+from .tags import tag_cloud
+from .trending import trending_recipes
+from .recommendations import recommend_for
+from .pagination import CursorPaginator
+from .response_cache import cache_anonymous_response, cached_list
+from .conditional import catalog_metadata, conditional_page, recipe_metadata
 from .forms import (
     RegisterForm, LoginForm, UserProfileForm,
     RecipeForm, IngredientFormSet, InstructionFormSet,
 )
 
+RECIPES_PER_PAGE = 12
+REVIEWS_PER_PAGE = 10
+# Profile tabs, paged independently; only the open one is rendered with the page
+PROFILE_TABS = {'recipes': 'Recipes', 'favorites': 'Favorites'}
+# Followers/following avatars listed in the profile header
+PROFILE_PEOPLE_SHOWN = 12
+# Rendered recipe_detail fragments are keyed by updated_at, so this only
+# bounds how long unused entries linger
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Sort options for recipe listings; each ends in `id` so keyset pages are stable
+RECIPE_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'fastest': ('total_time', 'id'),
+    'title': ('title', 'id'),
+    'most_viewed': ('-view_count', '-id'),
+    'most_rated': ('-rating_count', '-id'),
+}
+
+
+def paginate_recipes(request, recipes, ordering):
+    """Paginate an ordered recipe queryset by page number or, opt-in, by keyset cursor.
+
+    Cursor mode is used when the request carries a `cursor` parameter or
+    RECIPE_PAGINATION is set to 'cursor'. Returns the page and the query
+    string (minus page/cursor) for building pagination links.
+    """
+    params = request.GET.copy()
+    params.pop('page', None)
+    cursor = params.pop('cursor', [None])[0]
+    use_cursor = cursor is not None or settings.RECIPE_PAGINATION == 'cursor'
+
+    if use_cursor and ordering is not None:
+        page_obj = CursorPaginator(recipes, ordering, RECIPES_PER_PAGE).page(cursor)
+    else:
+        if ordering is not None:
+            recipes = recipes.order_by(*ordering)
+        paginator = Paginator(recipes, RECIPES_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    viewer.prime(request, page_obj)
+    return page_obj, params.urlencode()
+
+
 @login_required
 def add_recipe(request):
     if request.method == 'POST':
@@ -34,6 +90,7 @@ def add_recipe(request):
             recipe.slug = slug
             
             recipe.save()
+            form.save_m2m()
             
             # Save ingredients
             ingredient_formset.instance = recipe
@@ -86,7 +143,8 @@ def edit_recipe(request, slug):
                     counter += 1
                 recipe.slug = slug
             
-            recipe.save()
+            recipe.save(update_fields=recipe.fields_without_counters())
+            form.save_m2m()
             ingredient_formset.save()
             instruction_formset.save()
             
@@ -123,32 +181,117 @@ def delete_recipe(request, slug):
     
     return render(request, 'pages/delete_recipe.html', {'recipe': recipe})
 
+def _pdf_response(name, title, recipe_ids, filename, note=''):
+    try:
+        content = pdf.open_pdf(name, title, recipe_ids, note)
+    except pdf.PdfBusy:
+        response = HttpResponse('PDF rendering is busy, please try again shortly.', status=503, content_type='text/plain')
+        response['Retry-After'] = '30'
+        return response
+    return FileResponse(content, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+def recipe_pdf(request, slug):
+    recipe = get_object_or_404(Recipe.objects.only('pk', 'title', 'slug'), slug=slug)
+    return _pdf_response(f'recipe:{recipe.pk}', recipe.title, [recipe.pk], f'{recipe.slug}.pdf')
+
+
+COOKBOOKS = {
+    'favorites': 'Favorite Recipes',
+    'my-recipes': 'My Recipes',
+}
+
+
+@login_required
+def cookbook_pdf(request, source):
+    """The user's favorites or own recipes as one PDF, newest first."""
+    if source not in COOKBOOKS:
+        raise Http404
+    if source == 'favorites':
+        recipe_ids = (UserProfile.favorite_recipes.through.objects.filter(userprofile__user=request.user)
+                      .order_by('-pk').values_list('recipe_id', flat=True))
+    else:
+        recipe_ids = (Recipe.objects.filter(author=request.user)
+                      .order_by('-created_at', '-id').values_list('pk', flat=True))
+    recipe_ids = list(recipe_ids[:pdf.MAX_COOKBOOK_RECIPES + 1])
+    note = ''
+    if len(recipe_ids) > pdf.MAX_COOKBOOK_RECIPES:
+        recipe_ids = recipe_ids[:pdf.MAX_COOKBOOK_RECIPES]
+        note = f'Only the {pdf.MAX_COOKBOOK_RECIPES} most recent recipes are included.'
+    title = f"{request.user.get_full_name() or request.user.username}'s {COOKBOOKS[source]}"
+    response = _pdf_response(f'cookbook:{request.user.pk}:{source}', title, recipe_ids, f'{source}-cookbook.pdf', note)
+    if note and response.status_code == 200:
+        response['X-Cookbook-Truncated'] = str(pdf.MAX_COOKBOOK_RECIPES)
+    return response
+
+
 @login_required
 def my_recipes(request):
-    recipes = Recipe.objects.filter(author=request.user).order_by('-created_at')
-    
-    paginator = Paginator(recipes, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    recipes = Recipe.objects.filter(author=request.user).for_cards()
+    page_obj, pagination_query = paginate_recipes(request, recipes, RECIPE_SORTS['newest'])
     
     context = {
         'recipes': page_obj,
+        'pagination_query': pagination_query,
         'is_my_recipes': True,
     }
     return render(request, 'pages/recipe_list.html', context)
 
 
+@login_required
+def feed(request):
+    """Recipes from the authors the user follows, newest first."""
+    params = request.GET.copy()
+    cursor = params.pop('cursor', [None])[0]
+    page = timeline.feed_page(request.user, cursor, RECIPES_PER_PAGE)
+    viewer.prime(request, page)
+    context = {
+        'recipes': page,
+        'pagination_query': params.urlencode(),
+    }
+    return render(request, 'pages/feed.html', context)
+
+
+@user_passes_test(lambda user: user.is_staff)
+def export_recipes(request):
+    """Staff download of the whole catalog (or what changed ?since=...) as JSON Lines or CSV."""
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in exporter.FORMATS:
+        return HttpResponseBadRequest('format must be jsonl or csv')
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = exporter.parse_since(request.GET['since'])
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+
+    response = StreamingHttpResponse(exporter.export_lines(fmt, since=since), content_type=exporter.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="recipes.{fmt}"'
+    return response
+
+
+@conditional_page(catalog_metadata)
+@cache_anonymous_response
 def recipe_list(request):
-    recipes = Recipe.objects.all().select_related('category', 'author').prefetch_related('reviews')
+    recipes = Recipe.objects.for_cards()
 
-    # Search by title or description
+    # Full-text search over title, description, tags and ingredients
     query = request.GET.get('q', '').strip()
     if query:
-        recipes = recipes.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(tags__icontains=query)
-        )
+        recipes = recipes.filter(search.matching(query))
+
+    # Filter by tag: ?tag=a&tag=b, any tag by default or all of them with tag_mode=all
+    tag_slugs = [slug for slug in request.GET.getlist('tag') if slug]
+    tag_mode = 'all' if request.GET.get('tag_mode') == 'all' else 'any'
+    selected_tags = list(Tag.objects.filter(slug__in=tag_slugs)) if tag_slugs else []
+    tag_ids = None
+    match_all = tag_mode == 'all'
+    if tag_slugs:
+        tag_ids = [tag.pk for tag in selected_tags]
+        if match_all and len(selected_tags) < len(set(tag_slugs)):
+            # An unknown tag can never be matched, so nothing has all of them
+            tag_ids, match_all = [], False
+        recipes = recipes.with_tags(tag_ids, match_all=match_all)
 
     # Filter by category
     category_slug = request.GET.get('category', '').strip()
@@ -179,7 +322,7 @@ def recipe_list(request):
     if total_time_max:
         try:
             total_time_max = int(total_time_max)
-            recipes = recipes.filter(prep_time__lt=total_time_max).filter(cook_time__lt=total_time_max)
+            recipes = recipes.filter(total_time__lte=total_time_max)
         except (ValueError, TypeError):
             pass
 
@@ -188,36 +331,51 @@ def recipe_list(request):
     if min_rating:
         try:
             min_rating = int(min_rating)
-            # Complex query for average rating filtering
-            from django.db.models import Avg
-            recipes = recipes.annotate(avg_rating=Avg('reviews__rating')).filter(avg_rating__gte=min_rating)
+            recipes = recipes.filter(rating_avg__gte=min_rating, rating_count__gt=0)
         except (ValueError, TypeError):
             pass
 
+    # Facet counts for the filter sidebar, from one cached grouped query
+    categories = list(Category.objects.all().order_by('name'))
+    facet_options = facets.facet_counts(
+        request,
+        categories,
+        query=query,
+        tag_ids=tag_ids,
+        tag_mode='all' if match_all else 'any',
+        category=next((cat for cat in categories if cat.slug == category_slug), None),
+        difficulty=difficulty,
+        dietary=dietary if dietary != 'none' else '',
+        prep_time=prep_time_max if isinstance(prep_time_max, int) else None,
+        total_time=total_time_max if isinstance(total_time_max, int) else None,
+        rating=min_rating if isinstance(min_rating, int) else None,
+    )
+
     # Sort options
-    sort_by = request.GET.get('sort', 'newest')
-    if sort_by == 'newest':
-        recipes = recipes.order_by('-created_at')
-    elif sort_by == 'fastest':
-        recipes = recipes.order_by('prep_time', 'cook_time')
-    elif sort_by == 'title':
-        recipes = recipes.order_by('title')
-    elif sort_by == 'most_viewed':
-        recipes = recipes.order_by('-view_count')
-    elif sort_by == 'most_rated':
-        from django.db.models import Count, Avg
-        recipes = recipes.annotate(review_count=Count('reviews')).order_by('-review_count')
-
-    paginator = Paginator(recipes, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sort_by = request.GET.get('sort', 'relevance' if query else 'newest')
+    ordering = None
+    if sort_by == 'relevance' and query:
+        # Search rank lives outside the table, so relevance pages by number;
+        # only the best hits are ranked and the rest follow, newest first
+        ranked_ids = search.search_recipe_ids(query)
+        recipes = recipes.order_by(search.rank_ordering(ranked_ids), '-created_at', '-pk')
+    else:
+        if sort_by not in RECIPE_SORTS:
+            sort_by = 'newest'
+        ordering = RECIPE_SORTS[sort_by]
+
+    page_obj, pagination_query = paginate_recipes(request, recipes, ordering)
 
     # Prepare filter context
     context = {
         'recipes': page_obj,
-        'categories': Category.objects.all().order_by('name'),
+        'pagination_query': pagination_query,
+        'categories': categories,
         'dietary_options': Recipe.DIETARY_CHOICES,
+        'facets': facet_options,
         'query': query,
+        'selected_tags': selected_tags,
+        'tag_mode': tag_mode,
         'selected_category': category_slug,
         'selected_difficulty': difficulty,
         'selected_dietary': dietary,
@@ -229,58 +387,77 @@ def recipe_list(request):
     return render(request, 'pages/recipe_list.html', context)
 
 
+def pantry_search(request):
+    """Rank recipes by how much of their ingredient list the user already has."""
+    pantry_text = request.GET.get('have', '')
+    items = pantry.parse_pantry(pantry_text)
+
+    max_missing = request.GET.get('max_missing', '').strip()
+    try:
+        max_missing = int(max_missing)
+    except ValueError:
+        max_missing = None
+
+    results = []
+    if items:
+        matches = pantry.index.match(items, limit=24, max_missing=max_missing)
+        recipes = Recipe.objects.for_cards().in_bulk([recipe_id for recipe_id, _, _ in matches])
+        results = [
+            {'recipe': recipes[recipe_id], 'matched': matched, 'missing': missing}
+            for recipe_id, matched, missing in matches
+            if recipe_id in recipes
+        ]
+        viewer.prime(request, recipes.values())
+
+    context = {
+        'pantry_text': pantry_text,
+        'pantry_items': items,
+        'selected_max_missing': max_missing,
+        'results': results,
+    }
+    return render(request, 'pages/pantry.html', context)
+
+
+@conditional_page(catalog_metadata)
+@cache_anonymous_response
 def dashboard(request):
     """Enhanced dashboard view with trending and recommended recipes"""
-    from django.db.models import Avg, Count
-    from datetime import timedelta
-    from django.utils import timezone
+    from django.db.models import Count
     
-    # Trending recipes (most viewed in last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    trending = Recipe.objects.filter(
-        created_at__gte=thirty_days_ago
-    ).annotate(
-        avg_rating=Avg('reviews__rating')
-    ).order_by('-view_count')[:6]
+    # The shared sections are cached per catalog generation, so signed-in
+    # users (who bypass the page cache) don't re-run them on every hit
+
+    # Trending recipes, from the precomputed decayed scores
+    trending = cached_list(request, 'dashboard:trending', lambda: trending_recipes(6))
     
     # Top rated recipes
-    top_rated = Recipe.objects.annotate(
-        avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
-    ).filter(review_count__gt=0).order_by('-avg_rating')[:6]
+    top_rated = cached_list(request, 'dashboard:top_rated', lambda: Recipe.objects.for_cards().filter(
+        rating_count__gt=0
+    ).order_by('-rating_avg', '-rating_count')[:6])
     
     # Recent recipes
-    recent = Recipe.objects.all().order_by('-created_at')[:6]
+    recent = cached_list(request, 'dashboard:recent', lambda: Recipe.objects.for_cards().order_by('-created_at')[:6])
     
     # Popular categories
-    popular_categories = Category.objects.annotate(
+    popular_categories = cached_list(request, 'dashboard:categories', lambda: Category.objects.annotate(
         recipe_count=Count('recipe')
-    ).order_by('-recipe_count')[:8]
+    ).order_by('-recipe_count')[:8])
     
     # If user is authenticated, get personalized recommendations
     recommended = None
     following_recipes = None
     if request.user.is_authenticated:
-        # Recipes from followed users
-        followed_users = request.user.profile.following.values_list('user_id', flat=True)
-        following_recipes = Recipe.objects.filter(
-            author_id__in=followed_users
-        ).order_by('-created_at')[:6]
+        # Recipes from followed users, from the materialized timeline
+        following_recipes = timeline.recent(request.user, 6)
         
-        # Recommended based on user's favorite categories
-        user_favorite_categories = request.user.profile.favorite_recipes.values_list(
-            'category_id', flat=True
-        ).distinct()
-        if user_favorite_categories:
-            recommended = Recipe.objects.filter(
-                category_id__in=user_favorite_categories
-            ).exclude(
-                id__in=request.user.profile.favorite_recipes.values_list('id', flat=True)
-            ).annotate(
-                avg_rating=Avg('reviews__rating')
-            ).order_by('-avg_rating')[:6]
+        # Merged neighbor lists of the user's favorites (built offline)
+        recommended = recommend_for(request.user, limit=6)
+
+    # Favorite/following badges for every card on the page, in two queries
+    viewer.prime(request, trending, top_rated, recent, recommended, following_recipes)
     
     context = {
+        'tag_cloud': tag_cloud(request),
         'trending': trending,
         'top_rated': top_rated,
         'recent': recent,
@@ -291,28 +468,37 @@ def dashboard(request):
     return render(request, 'pages/dashboard.html', context)
 
 
+def _count_revalidated_view(request):
+    view_counts.record_view(request.recipe_pk)
+
+
+@conditional_page(recipe_metadata, on_not_modified=_count_revalidated_view)
 def recipe_detail(request, slug):
-    recipe = get_object_or_404(
-        Recipe.objects.select_related('category', 'author')
-        .prefetch_related('ingredients', 'instructions', 'reviews'),
-        slug=slug
-    )
+    # Ingredients and instructions stay lazy: they are only queried when
+    # their cached fragment is missing
+    recipe = get_object_or_404(Recipe.objects.select_related('category', 'author'), slug=slug)
     
-    # Increment view count
+    # Count the view (buffered by default, so no write on this request) and
+    # show the count as if it had already been stored
+    view_counts.record_view(recipe.pk)
     recipe.view_count += 1
-    recipe.save(update_fields=['view_count'])
 
-    reviews = recipe.reviews.all()
-    average_rating = reviews.aggregate(Avg('rating'))['rating__avg']
+    reviews = Review.objects.filter(recipe=recipe).select_related('user').order_by('-created_at', '-id')
+    # Counted from the rows, not the stored rating_count, so the page count
+    # always matches what the pages hold
+    paginator = Paginator(reviews, REVIEWS_PER_PAGE)
+    reviews_page = paginator.get_page(request.GET.get('reviews_page'))
+    average_rating = recipe.rating_avg if recipe.rating_count else None
 
     context = {
         'recipe': recipe,
         'ingredients': recipe.ingredients.all(),
         'instructions': recipe.instructions.all(),
-        'reviews': reviews,
+        'reviews': reviews_page,
         'average_rating': average_rating,
-        'reviews_count': reviews.count(),
+        'reviews_count': paginator.count,
         'rating_range': range(1, 6),
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'pages/recipe_detail.html', context)
 
@@ -322,7 +508,12 @@ def add_review(request, slug):
     recipe = get_object_or_404(Recipe, slug=slug)
 
     if request.method == 'POST':
-        rating = request.POST.get('rating')
+        try:
+            rating = int(request.POST.get('rating', ''))
+        except ValueError:
+            rating = None
+        if rating not in range(1, 6):
+            return HttpResponseBadRequest('Rating must be a whole number from 1 to 5.')
         comment = request.POST.get('comment')
 
         Review.objects.update_or_create(
@@ -407,11 +598,38 @@ def logout_view(request):
     return redirect('home')
 
 
+def _profile_tab(request, profile, tab):
+    """One page of ``profile``'s own recipes or favorites, ready for cards."""
+    if tab == 'recipes':
+        recipes = Recipe.objects.filter(author_id=profile.user_id).for_cards().order_by(*RECIPE_SORTS['newest'])
+        page = Paginator(recipes, RECIPES_PER_PAGE).get_page(request.GET.get('recipes_page'))
+    else:
+        # Most recently favorited first: page the join rows, then load just that page's cards
+        favorite_ids = (UserProfile.favorite_recipes.through.objects.filter(userprofile=profile)
+                        .order_by('-pk').values_list('recipe_id', flat=True))
+        page = Paginator(favorite_ids, RECIPES_PER_PAGE).get_page(request.GET.get('favorites_page'))
+        by_id = Recipe.objects.for_cards().in_bulk(list(page.object_list))
+        page.object_list = [by_id[pk] for pk in page.object_list if pk in by_id]
+    viewer.prime(request, page)
+    return page
+
+
+def _profile_tab_context(request, profile, tab):
+    return {
+        'profile': profile,
+        'is_own': profile.user_id == request.user.pk,
+        'tab': tab,
+        'tab_page': _profile_tab(request, profile, tab),
+        'page_param': f'{tab}_page',
+        'pagination_query': f'tab={tab}',
+    }
+
+
 @login_required
 def profile_view(request, username=None):
     # If username is provided, show that user's profile; otherwise show current user's profile
     if username:
-        profile = get_object_or_404(UserProfile, user__username=username)
+        profile = get_object_or_404(UserProfile.objects.select_related('user'), user__username=username)
     else:
         profile = request.user.profile
 
@@ -427,42 +645,84 @@ def profile_view(request, username=None):
     else:
         form = None
 
-    user_recipes = Recipe.objects.filter(author=profile.user)
-    favorite_recipes = profile.favorite_recipes.all()
+    # Only the selected tab is rendered; the other loads from profile_tab when opened
+    tab = request.GET.get('tab')
+    if tab not in PROFILE_TABS:
+        tab = 'recipes'
+    followers = UserProfile.objects.filter(following=profile).select_related('user').order_by('-pk')
+    following = UserProfile.objects.filter(followers=profile).select_related('user').order_by('-pk')
 
     context = {
-        'profile': profile,
+        **_profile_tab_context(request, profile, tab),
+        'is_following': profile.user_id != request.user.pk and social.is_following(request.user.profile, profile),
         'form': form,
-        'user_recipes': user_recipes,
-        'favorite_recipes': favorite_recipes,
+        'followers': followers[:PROFILE_PEOPLE_SHOWN],
+        'following': following[:PROFILE_PEOPLE_SHOWN],
+        'more_followers': profile.follower_count - PROFILE_PEOPLE_SHOWN,
+        'more_following': profile.following_count - PROFILE_PEOPLE_SHOWN,
+        'tabs': [(name, label, reverse('profile_tab', args=[profile.user.username, name]))
+                 for name, label in PROFILE_TABS.items()],
+        'fragment_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'pages/profile.html', context)
 
 
 @login_required
-def toggle_favorite(request, slug):
-    recipe = get_object_or_404(Recipe, slug=slug)
-    profile = request.user.profile
+def profile_tab(request, username, tab):
+    """A profile tab's recipe grid and pagination, as an HTML fragment for lazy loading."""
+    if tab not in PROFILE_TABS:
+        raise Http404
+    profile = get_object_or_404(UserProfile.objects.select_related('user'), user__username=username)
+    return render(request, 'organisms/profile_tab.html', _profile_tab_context(request, profile, tab))
 
-    if recipe in profile.favorite_recipes.all():
-        profile.favorite_recipes.remove(recipe)
-        messages.success(request, f'{recipe.title} removed from favorites.')
-    else:
-        profile.favorite_recipes.add(recipe)
-        messages.success(request, f'{recipe.title} added to favorites!')
 
+@login_required
+def toggle_favorite(request, slug):
+    recipe = get_object_or_404(Recipe.objects.only('pk', 'title'), slug=slug)
+    if social.toggle_favorite(request.user.profile, recipe.pk):
+        messages.success(request, f'{recipe.title} added to favorites!')
+    else:
+        messages.success(request, f'{recipe.title} removed from favorites.')
     return redirect('recipe_detail', slug=slug)
 
 @login_required
 def follow_user(request, username):
-    target_user = get_object_or_404(User, username=username)
-    target_profile = target_user.profile
+    target_profile = get_object_or_404(UserProfile.objects.select_related('user'), user__username=username)
     my_profile = request.user.profile
     if target_profile != my_profile:
-        if my_profile in target_profile.followers.all():
-            target_profile.followers.remove(my_profile)
-            messages.info(request, f"You unfollowed {target_user.username}.")
+        if social.toggle_follow(my_profile, target_profile):
+            messages.success(request, f"You are now following {username}!")
         else:
-            target_profile.followers.add(my_profile)
-            messages.success(request, f"You are now following {target_user.username}!")
+            messages.info(request, f"You unfollowed {username}.")
     return redirect('profile_detail', username=username)
+
+
+def _json_login_required(view):
+    """Like login_required, but answers anonymous requests with a 401 instead of a login redirect."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Log in first.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_POST
+@_json_login_required
+def toggle_favorite_json(request, slug):
+    recipe_id = get_object_or_404(Recipe.objects.values_list('pk', flat=True), slug=slug)
+    favorited = social.toggle_favorite(request.user.profile, recipe_id)
+    favorite_count = Recipe.objects.values_list('favorite_count', flat=True).get(pk=recipe_id)
+    return JsonResponse({'favorited': favorited, 'favorite_count': favorite_count})
+
+
+@require_POST
+@_json_login_required
+def follow_user_json(request, username):
+    target_profile = get_object_or_404(UserProfile, user__username=username)
+    my_profile = request.user.profile
+    if target_profile == my_profile:
+        return JsonResponse({'error': 'You cannot follow yourself.'}, status=400)
+    following = social.toggle_follow(my_profile, target_profile)
+    follower_count = UserProfile.objects.values_list('follower_count', flat=True).get(pk=target_profile.pk)
+    return JsonResponse({'following': following, 'follower_count': follower_count})
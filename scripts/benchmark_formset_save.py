@@ -0,0 +1,130 @@
+"""Compare query counts and latency of saving the ingredient/instruction formsets.
+
+"Before" is a plain inlineformset_factory formset: one INSERT/UPDATE/DELETE
+per row, and every row fires the Ingredient/Instruction signal handlers.
+"After" is the bulk diff-based IngredientFormSet/InstructionFormSet from
+recipes/forms.py.
+
+Each edit of a 50-ingredient, 20-step recipe changes 10 ingredients, deletes
+5, adds 5 (filling the extra forms) and leaves the rest untouched. Everything
+runs inside a transaction that is rolled back, so it is safe to run against
+a development database:
+
+    python scripts/benchmark_formset_save.py [ingredient_count]
+"""
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.forms import inlineformset_factory  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from recipes.forms import IngredientForm, IngredientFormSet, InstructionForm, InstructionFormSet  # noqa: E402
+from recipes.models import Ingredient, Instruction, Recipe  # noqa: E402
+
+RUNS = 20
+STEPS = 20
+
+PlainIngredientFormSet = inlineformset_factory(Recipe, Ingredient, form=IngredientForm, extra=5, can_delete=True)
+PlainInstructionFormSet = inlineformset_factory(Recipe, Instruction, form=InstructionForm, extra=5, can_delete=True)
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(count):
+    user = User.objects.create_user('benchmark-user', 'benchmark@example.com', 'unused')
+    recipe = Recipe.objects.create(
+        title='Benchmark recipe', slug='benchmark-recipe', author=user, description='Synthetic recipe.',
+        prep_time=10, cook_time=20, difficulty='easy',
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(recipe=recipe, name=f'ingredient {chr(97 + i % 26)}{chr(97 + i // 26)}', quantity='1 cup', order=i)
+        for i in range(count)
+    )
+    Instruction.objects.bulk_create(
+        Instruction(recipe=recipe, step_number=i, description=f'Step {i}') for i in range(1, STEPS + 1)
+    )
+    return recipe
+
+
+def management(prefix, total, initial):
+    return {
+        f'{prefix}-TOTAL_FORMS': str(total), f'{prefix}-INITIAL_FORMS': str(initial),
+        f'{prefix}-MIN_NUM_FORMS': '0', f'{prefix}-MAX_NUM_FORMS': '1000',
+    }
+
+
+def post_data(recipe):
+    ingredients = list(recipe.ingredients.order_by('order', 'pk'))
+    data = management('ingredients', len(ingredients) + 5, len(ingredients))
+    for i, ingredient in enumerate(ingredients):
+        name = f'{ingredient.name} fresh' if i < 10 else ingredient.name
+        data.update({
+            f'ingredients-{i}-id': str(ingredient.pk), f'ingredients-{i}-recipe': str(recipe.pk),
+            f'ingredients-{i}-name': name, f'ingredients-{i}-quantity': ingredient.quantity,
+            f'ingredients-{i}-order': str(ingredient.order),
+        })
+        if 10 <= i < 15:
+            data[f'ingredients-{i}-DELETE'] = 'on'
+    for j in range(5):
+        i = len(ingredients) + j
+        data.update({f'ingredients-{i}-name': f'new thing {j}', f'ingredients-{i}-quantity': '2',
+                     f'ingredients-{i}-order': str(i)})
+
+    steps = list(recipe.instructions.order_by('step_number'))
+    data.update(management('instructions', len(steps) + 5, len(steps)))
+    for i, step in enumerate(steps):
+        data.update({
+            f'instructions-{i}-id': str(step.pk), f'instructions-{i}-recipe': str(recipe.pk),
+            f'instructions-{i}-step_number': str(step.step_number),
+            f'instructions-{i}-description': f'{step.description} carefully' if i < 3 else step.description,
+        })
+    return data
+
+
+def save(recipe, data, ingredient_formset, instruction_formset):
+    ingredients = ingredient_formset(data, instance=recipe, prefix='ingredients')
+    instructions = instruction_formset(data, instance=recipe, prefix='instructions')
+    assert ingredients.is_valid() and instructions.is_valid(), (ingredients.errors, instructions.errors)
+    ingredients.save()
+    instructions.save()
+
+
+def report(label, recipe, data, ingredient_formset, instruction_formset):
+    timings = []
+    for _ in range(RUNS):
+        sid = transaction.savepoint()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            save(recipe, data, ingredient_formset, instruction_formset)
+            timings.append(time.perf_counter() - start)
+        transaction.savepoint_rollback(sid)
+    timings.sort()
+    print(f'{label}: {len(queries)} queries, median {timings[len(timings) // 2] * 1000:.1f} ms')
+
+
+def main(count):
+    with transaction.atomic():
+        recipe = seed(count)
+        data = post_data(recipe)
+        print(f'{count} ingredients, {STEPS} steps: 10 + 3 edited, 5 deleted, 5 added')
+        report('before: per-row formset save', recipe, data, PlainIngredientFormSet, PlainInstructionFormSet)
+        report('after:  bulk diff-based save', recipe, data, IngredientFormSet, InstructionFormSet)
+        raise Rollback
+
+
+if __name__ == '__main__':
+    try:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
+    except Rollback:
+        pass
@@ -0,0 +1,109 @@
+"""Compare query plans and timings for the recipe_list time filter and sorts.
+
+"Before" re-creates the old approach: total time approximated by
+prep_time < X AND cook_time < X, and "fastest" sorted by (prep_time, cook_time).
+"After" uses the stored total_time column and the composite indexes.
+
+Seeds synthetic recipes inside a transaction that is rolled back at the end,
+so it is safe to run against a development database:
+
+    python scripts/benchmark_time_queries.py [recipe_count]
+"""
+import os
+import random
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import F  # noqa: E402
+
+from recipes.models import Category, Recipe  # noqa: E402
+
+RUNS = 20
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(count):
+    user = User.objects.create_user('benchmark-user', 'benchmark@example.com', 'unused')
+    categories = [Category.objects.create(name=f'Bench {i}', slug=f'bench-{i}') for i in range(8)]
+    rng = random.Random(0)
+    batch = []
+    for i in range(count):
+        batch.append(Recipe(
+            title=f'Bench recipe {i}', slug=f'bench-recipe-{i}', author=user,
+            description='Synthetic recipe.', category=rng.choice(categories),
+            prep_time=rng.randint(1, 90), cook_time=rng.randint(0, 180),
+            difficulty=rng.choice(['easy', 'medium', 'hard']),
+            dietary_restriction=rng.choice(['vegan', 'keto', 'none', 'none']),
+            view_count=rng.randint(0, 10000),
+        ))
+        if len(batch) == 5000:
+            Recipe.objects.bulk_create(batch)
+            batch = []
+    Recipe.objects.bulk_create(batch)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return categories[0]
+
+
+def report(label, queryset):
+    queryset = queryset[:12]
+    list(queryset)  # warm up
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        rows = list(queryset.values_list('pk', flat=True))
+    elapsed = (time.perf_counter() - start) / RUNS * 1000
+    print(f'--- {label}: {elapsed:.2f} ms, {len(rows)} rows')
+    print(queryset.explain())
+    print()
+
+
+def main(count):
+    with transaction.atomic():
+        category = seed(count)
+        recipes = Recipe.objects.all()
+        print(f'{recipes.count()} recipes')
+        approximated = recipes.filter(prep_time__lt=60, cook_time__lt=60)
+        print(f'old approximation of total <= 60 wrongly includes '
+              f'{approximated.filter(total_time__gt=60).count()} recipes and misses '
+              f'{recipes.filter(total_time__lte=60).exclude(pk__in=approximated).count()}\n')
+
+        report('before: total <= 60 (prep < 60 AND cook < 60), newest',
+               recipes.filter(prep_time__lt=60, cook_time__lt=60).order_by('-created_at', '-id'))
+        report('after:  total_time <= 60, newest',
+               recipes.filter(total_time__lte=60).order_by('-created_at', '-id'))
+
+        report('before: fastest by (prep_time, cook_time)',
+               recipes.order_by('prep_time', 'cook_time', 'id'))
+        report('before: fastest by prep_time + cook_time expression',
+               recipes.order_by(F('prep_time') + F('cook_time'), 'id'))
+        report('after:  fastest by total_time',
+               recipes.order_by('total_time', 'id'))
+
+        report('after:  total_time <= 30, fastest',
+               recipes.filter(total_time__lte=30).order_by('total_time', 'id'))
+
+        report('after:  category, newest',
+               recipes.filter(category=category).order_by('-created_at', '-id'))
+        report('after:  difficulty, most viewed',
+               recipes.filter(difficulty='easy').order_by('-view_count', '-id'))
+        report('after:  dietary, newest',
+               recipes.filter(dietary_restriction='vegan').order_by('-created_at', '-id'))
+        raise Rollback
+
+
+if __name__ == '__main__':
+    try:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
+    except Rollback:
+        pass